@@ -50,5 +50,6 @@ setup(
         "Programming Language :: Python :: 3.6",
     ],
     include_package_data=True,
+    extras_require={"pdf": ["pdfminer.six", "pdf2image"]},
     keywords=["wagtail", "django"],
 )
@@ -22,6 +22,7 @@ class LibraryIndexFactory(PageFactory):
 class LibraryDetailFactory(PageFactory):
     title = Sequence("Library detail {}".format)
     body = Sequence("Library detail {} body.".format)
+    attachment = Sequence("attachments/library-detail-{}.pdf".format)
 
     class Meta(object):
         """Factory properties."""
@@ -20,11 +20,15 @@ INSTALLED_APPS = [
     "modelcluster",
     "taggit",
     "wagtail.core",
+    "wagtail.admin",
+    "wagtail.contrib.redirects",
+    "wagtail.documents",
     "wagtail.images",
     "wagtail.sites",
     "wagtail.users",
     "django.contrib.auth",
     "django.contrib.contenttypes",
+    "django.contrib.messages",
     "django.contrib.sessions",
     "django.contrib.staticfiles",
 ]
@@ -34,12 +38,11 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.auth.middleware.SessionAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "wagtail.core.middleware.SiteMiddleware",
-    "wagtail.redirects.middleware.RedirectMiddleware",
+    "wagtail.contrib.redirects.middleware.RedirectMiddleware",
 ]
 
 ROOT_URLCONF = "tests.urls"
@@ -69,4 +72,6 @@ USE_I18N = True
 USE_L10N = True
 USE_TZ = True
 
+STATIC_URL = "/static/"
+
 SECRET_KEY = "supersecret"
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library archives."""
+
+from __future__ import unicode_literals
+
+import io
+import zipfile
+from datetime import datetime
+
+from django.test import TestCase
+from mock import patch
+
+from wagtail_library.archives import dos_datetime, stream_zip
+
+
+class TestStreamZip(TestCase):
+    """Tests for streamed ZIP archives."""
+
+    def read(self, files):
+        """Streams the files into a ZipFile, checking every CRC."""
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(files))))
+        self.assertIsNone(archive.testzip())
+        return archive
+
+    def test_entries(self):
+        """Entries should be deflated or stored, and readable by zipfile."""
+        text = b"Library " * 1000
+        archive = self.read(
+            [
+                {"name": "report.txt", "chunks": [text[:5], text[5:]], "size": len(text)},
+                {"name": "photo.jpg", "chunks": [b"\xff\xd8 image"], "compress": False},
+                {"name": "résumé.txt", "chunks": [], "modified": datetime(2019, 3, 1, 9, 30)},
+            ]
+        )
+
+        report, photo, resume = archive.infolist()
+        self.assertEqual(archive.read("report.txt"), text)
+        self.assertEqual(report.compress_type, zipfile.ZIP_DEFLATED)
+        self.assertLess(report.compress_size, len(text))
+        self.assertEqual(archive.read("photo.jpg"), b"\xff\xd8 image")
+        self.assertEqual(photo.compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(resume.filename, "résumé.txt")
+        self.assertEqual(resume.date_time, (2019, 3, 1, 9, 30, 0))
+
+    def test_empty(self):
+        """Archives without files should still be valid."""
+        self.assertEqual(self.read([]).namelist(), [])
+
+    def test_lazy(self):
+        """Files should only be read as the archive is streamed."""
+        chunks = iter([b"first", b"second"])
+        stream = stream_zip([{"name": "lazy.txt", "chunks": chunks, "compress": False}])
+
+        next(stream)
+        self.assertEqual(next(chunks), b"first")
+
+    @patch("wagtail_library.archives.ZIP64_COUNT_LIMIT", 2)
+    def test_zip64(self):
+        """Zip64 records should be written for large archives."""
+        archive = self.read(
+            [{"name": "{}.txt".format(number), "chunks": [b"x"]} for number in range(3)]
+        )
+
+        self.assertEqual(archive.namelist(), ["0.txt", "1.txt", "2.txt"])
+
+    def test_dos_datetime(self):
+        """Dates before 1980 can't be represented and should be clamped."""
+        self.assertEqual(dos_datetime(datetime(1970, 1, 1)), (33, 0))
+        self.assertEqual(dos_datetime(datetime(1980, 1, 1, 0, 0, 2)), (33, 1))
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of library index and detail rendering, with query-count budgets.
+
+Indexes are seeded with WAGTAIL_LIBRARY_BENCHMARK_SIZES children (comma separated, 100 by
+default so the suite stays fast), e.g. to benchmark a release:
+
+    WAGTAIL_LIBRARY_BENCHMARK_SIZES=1000,10000,100000 \\
+    WAGTAIL_LIBRARY_BENCHMARK_REPORT=benchmarks.json pytest tests/test_benchmarks.py
+
+The report lists the latency and query count of every measurement.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from wagtail.core.models import Site
+
+from wagtail_library.bulk import bulk_create_children
+from wagtail_library.models import LibraryDetail, LibraryIndex
+from wagtail_library.paginators import CachedCountPaginator, KeysetPaginator
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+SIZES = [int(size) for size in os.environ.get("WAGTAIL_LIBRARY_BENCHMARK_SIZES", "100").split(",")]
+REPEAT = int(os.environ.get("WAGTAIL_LIBRARY_BENCHMARK_REPEAT", "3"))
+REPORT = os.environ.get("WAGTAIL_LIBRARY_BENCHMARK_REPORT")
+PER_PAGE = 20
+BATCH_SIZE = 1000
+
+# Maximum number of queries per measurement, whatever the size of the index
+QUERY_BUDGETS = {
+    # Validators, facet counts, child count and the page of children
+    "index": 4,
+    # The page of children, counts and validators come from the cache
+    "index_cached_counts": 1,
+    # Validators, facet counts and the page of children, keyset pages aren't counted
+    "index_keyset": 3,
+    # The parent, linked back to from the template
+    "detail": 1,
+}
+
+# Querystrings of the listings measured for every size
+SCENARIOS = {
+    "all": {},
+    "filtered": {"type": "pdf"},
+    "searched": {"q": "report"},
+    "sorted": {"sort": "newest"},
+}
+
+
+def seed_index(size):
+    """Creates an index with size children, half of them PDFs, in bulk."""
+    index = LibraryIndexFactory.create(parent=None, paginate_by=PER_PAGE)
+    for start in range(0, size, BATCH_SIZE):
+        pages = []
+        for number in range(start, min(start + BATCH_SIZE, size)):
+            page = LibraryDetailFactory.build(
+                title="Annual report {}".format(number), slug="annual-report-{}".format(number)
+            )
+            page.attachment_extension = "pdf" if number % 2 else "doc"
+            page.search_vector = page.get_search_vector()
+            pages.append(page)
+        bulk_create_children(index, pages)
+    index.refresh_from_db()
+    return index
+
+
+class LibraryBenchmark(TestCase):
+    """Measures the hot paths of library pages against indexes of each size."""
+
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.indexes = {size: seed_index(size) for size in SIZES}
+        cls.site = Site.objects.create(
+            hostname="testserver", root_page=cls.indexes[SIZES[0]], is_default_site=True
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super(LibraryBenchmark, cls).tearDownClass()
+        if REPORT and cls.results:
+            with open(REPORT, "w") as report:
+                json.dump(cls.results, report, indent=2)
+
+    def get_indexes(self):
+        """Returns fresh instances of the seeded indexes, keyed by size."""
+        return {size: LibraryIndex.objects.get(pk=index.pk) for size, index in self.indexes.items()}
+
+    def get_request(self, **params):
+        request = RequestFactory().get("/", params)
+        request.is_preview = False
+        request.site = self.site
+        return request
+
+    def measure(self, name, budget, func, clear_cache=True, **details):
+        """
+        Runs func REPEAT times, recording the fastest run and asserting the query budget.
+
+        :return: Result of the last run
+        """
+        timings = []
+        for _ in range(REPEAT):
+            if clear_cache:
+                cache.clear()
+                # Wagtail keeps these cached between requests, they aren't the library's queries
+                Site.get_site_root_paths()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - started)
+            self.assertLessEqual(
+                len(queries),
+                budget,
+                "{} {} exceeded its query budget: {}".format(
+                    name, details, [query["sql"][:300] for query in queries]
+                ),
+            )
+        self.results.append(
+            dict(details, name=name, ms=round(min(timings) * 1000, 2), queries=len(queries))
+        )
+        return result
+
+    def render_index(self, index, request):
+        response = index.serve(request)
+        response.render()
+        return response
+
+    def test_index_pages(self):
+        """First, middle and last pages of each listing should stay within budget."""
+        for size, index in self.get_indexes().items():
+            for scenario, params in SCENARIOS.items():
+                num_pages = index.get_context(self.get_request(**params))["paginator"].num_pages
+                for page in sorted({1, max(num_pages // 2, 1), num_pages}):
+                    request = self.get_request(page=page, **params)
+                    self.measure(
+                        "index",
+                        QUERY_BUDGETS["index"],
+                        lambda: self.render_index(index, request),
+                        size=size,
+                        scenario=scenario,
+                        page=page,
+                    )
+
+    def test_index_cached_counts(self):
+        """With cached counts, only the page of children should be queried."""
+        for size, index in self.get_indexes().items():
+            index.paginator_class = CachedCountPaginator
+            for scenario, params in SCENARIOS.items():
+                request = self.get_request(page=2, **params)
+                self.render_index(index, request)
+                self.measure(
+                    "index_cached_counts",
+                    QUERY_BUDGETS["index_cached_counts"],
+                    lambda: self.render_index(index, request),
+                    clear_cache=False,
+                    size=size,
+                    scenario=scenario,
+                    page=2,
+                )
+
+    def test_index_keyset_pages(self):
+        """Keyset pages should cost the same deep into the listing as on the first page."""
+        for size, index in self.get_indexes().items():
+            index.paginator_class = KeysetPaginator
+            middle = LibraryDetail.objects.child_of(index).order_by("path")[size // 2]
+            cursor = KeysetPaginator(
+                LibraryDetail.objects.child_of(index).order_by("path"), PER_PAGE
+            ).encode_cursor(middle, True)
+            for page, value in (("first", None), ("middle", cursor)):
+                request = self.get_request(page=value) if value else self.get_request()
+                self.measure(
+                    "index_keyset",
+                    QUERY_BUDGETS["index_keyset"],
+                    lambda: self.render_index(index, request),
+                    size=size,
+                    scenario="all",
+                    page=page,
+                )
+
+    def test_detail(self):
+        """Rendering a library item should only query its parent."""
+        for size, index in self.get_indexes().items():
+            detail = LibraryDetail.objects.child_of(index).last()
+            request = self.get_request()
+            self.measure(
+                "detail", QUERY_BUDGETS["detail"], lambda: detail.serve(request).render(), size=size
+            )
@@ -3,12 +3,19 @@
 
 from __future__ import unicode_literals
 
-from django.test import TestCase
-from wagtail.core.blocks import PageChooserBlock
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from mock import patch
+from wagtail.core.blocks import PageChooserBlock, StreamBlock, StreamValue
+from wagtail.core.models import Site
 
 from wagtail_library.blocks import LibraryDetailBlock
 from wagtail_library.models import LibraryDetail
 
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
 
 class TestLibraryDetailblock(TestCase):
     """Test for the LibraryDetailBlock."""
@@ -28,3 +35,102 @@ class TestLibraryDetailblock(TestCase):
         block = LibraryDetailBlock()
 
         self.assertEqual(block.target_model, LibraryDetail)
+
+
+class TestLibraryDetailBlockBulk(TestCase):
+    """Tests for resolving and rendering LibraryDetailBlocks in bulk."""
+
+    def setUp(self):
+        index = LibraryIndexFactory.create(parent=None)
+        Site.objects.create(hostname="testserver", root_page=index, is_default_site=True)
+        self.details = [LibraryDetailFactory.create(parent=index) for _ in range(5)]
+        self.stream_block = StreamBlock([("item", LibraryDetailBlock())])
+        self.request = RequestFactory().get("/")
+
+    def get_stream(self, pages):
+        raw_data = [{"type": "item", "value": page.pk} for page in pages]
+        return StreamValue(self.stream_block, raw_data, is_lazy=True)
+
+    def count_queries(self, pages):
+        """Returns the number of queries run to resolve and render the stream."""
+        with CaptureQueriesContext(connection) as queries:
+            list(self.get_stream(pages))
+            self.stream_block.render(self.get_stream(pages), {"request": self.request})
+        return len(queries)
+
+    def test_bulk_to_python(self):
+        """Pages should be resolved in order, keeping None for missing pages."""
+        block = LibraryDetailBlock()
+        pages = block.bulk_to_python([self.details[1].pk, None, 0, self.details[0].pk])
+
+        self.assertEqual(pages, [self.details[1], None, None, self.details[0]])
+        self.assertEqual(pages[0].get_deferred_fields(), {"attachment_text", "search_vector"})
+
+    def test_bulk_to_python_generic_pages(self):
+        """Generic page blocks should resolve to specific pages."""
+        block = LibraryDetailBlock(target_model="wagtailcore.Page")
+        pages = block.bulk_to_python([self.details[0].pk])
+
+        self.assertIsInstance(pages[0], LibraryDetail)
+
+    def test_constant_queries(self):
+        """Rendering a stream should cost the same number of queries for any length."""
+        cache.clear()
+        self.count_queries(self.details[:1])
+
+        self.assertEqual(self.count_queries(self.details), self.count_queries(self.details[:1]))
+
+    def test_render(self):
+        """The rendered block should link to the attachment download."""
+        html = self.stream_block.render(
+            self.get_stream(self.details[:1]), {"request": self.request}
+        )
+        url = self.details[0].get_download_url(self.request)
+        self.assertTrue(url.endswith("/{}/download/".format(self.details[0].slug)))
+        self.assertIn('href="{}"'.format(url), html)
+
+
+class TestLibraryDetailBlockRenderCache(TestCase):
+    """Tests for the LibraryDetailBlock render cache."""
+
+    def setUp(self):
+        cache.clear()
+        index = LibraryIndexFactory.create(parent=None)
+        self.detail = LibraryDetailFactory.create(parent=index)
+        self.detail.save_revision().publish()
+        self.block = LibraryDetailBlock(render_cache_timeout=60)
+
+    def render(self):
+        detail = LibraryDetail.objects.get(pk=self.detail.pk)
+        return self.block.render(detail, {"request": RequestFactory().get("/")})
+
+    def test_cache_hit(self):
+        """The template shouldn't be rendered again for an unchanged page."""
+        html = self.render()
+
+        with patch("wagtail.core.blocks.base.render_to_string") as render_to_string:
+            self.assertEqual(self.render(), html)
+        render_to_string.assert_not_called()
+
+    def test_cache_disabled(self):
+        """Blocks should be rendered every time by default."""
+        block = LibraryDetailBlock()
+        with patch("wagtail.core.blocks.base.render_to_string", return_value="") as render:
+            block.render(self.detail)
+            block.render(self.detail)
+        self.assertEqual(render.call_count, 2)
+
+    def test_publish_invalidates_cache(self):
+        """Publishing the page should render the block again."""
+        self.render()
+        self.detail.title = "Changed"
+        self.detail.save_revision().publish()
+
+        self.assertIn("Changed", self.render())
+
+    def test_unpublish_invalidates_cache(self):
+        """Unpublishing the page should render the block again."""
+        key = self.block.get_render_cache_key(self.detail)
+        self.detail.unpublish()
+
+        self.assertNotEqual(self.block.get_render_cache_key(self.detail), key)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library bulk operations."""
+
+from __future__ import unicode_literals
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from mock import patch
+from wagtail.core.models import GroupPagePermission, Page
+
+from wagtail_library.bulk import (
+    allocate_child_paths,
+    bulk_create_children,
+    bulk_move,
+    bulk_publish,
+    bulk_unpublish,
+    run_in_batches,
+)
+from wagtail_library.cache import bump_generation, coalesce_generations, get_generation
+from wagtail_library.forms import BulkActionForm
+from wagtail_library.models import LibraryDetail
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+class TestBulkCreateChildren(TestCase):
+    """Tests for bulk_create_children."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.first = LibraryDetailFactory.create(parent=self.index)
+
+    def build(self, count):
+        return [
+            LibraryDetail(title="Item {}".format(i), slug="item-{}".format(i), body="")
+            for i in range(count)
+        ]
+
+    def test_allocate_child_paths(self):
+        """Paths should follow the last child."""
+        paths = allocate_child_paths(self.index, 2)
+        self.assertEqual(paths, [self.first.path[:-1] + "2", self.first.path[:-1] + "3"])
+
+    def test_bulk_create(self):
+        """Pages should be appended to the tree with a fixed number of queries."""
+        with self.assertNumQueries(11):
+            pages = bulk_create_children(self.index, self.build(5))
+
+        self.index.refresh_from_db()
+        self.assertEqual(self.index.numchild, 6)
+        self.assertEqual(Page.find_problems(), ([], [], [], [], []))
+        self.assertEqual(
+            list(LibraryDetail.objects.child_of(self.index)), [self.first] + list(pages)
+        )
+        self.assertEqual(pages[0].url_path, self.index.url_path + "item-0/")
+        self.assertIsNotNone(pages[0].first_published_at)
+
+        # Regular saves should carry on from the bulk created pages
+        LibraryDetailFactory.create(parent=self.index)
+        self.assertEqual(Page.find_problems(), ([], [], [], [], []))
+
+
+class TestCoalesceGenerations(TestCase):
+    """Tests for coalesce_generations."""
+
+    def test_coalesced(self):
+        """Bumps inside the block should be applied once, when it ends."""
+        cache.clear()
+        generation = get_generation("0001")
+        with coalesce_generations():
+            bump_generation("0001", "00010001")
+            with coalesce_generations():
+                bump_generation("0001")
+            self.assertEqual(get_generation("0001"), generation)
+        self.assertEqual(get_generation("0001"), generation + 1)
+
+
+class TestBulkOperations(TestCase):
+    """Tests for bulk publishing, unpublishing and moving."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.other = LibraryIndexFactory.create(parent=None)
+        self.details = [LibraryDetailFactory.create(parent=self.index) for i in range(3)]
+
+    def test_unpublish_publish(self):
+        """Pages should be unpublished and republished, signalling each page."""
+        generation = get_generation(self.index.path)
+        with patch("wagtail_library.signal_handlers.bump_generation") as bump:
+            self.assertEqual(bulk_unpublish(self.details), 3)
+        self.assertEqual(bump.call_count, 3)
+        self.assertFalse(LibraryDetail.objects.live().exists())
+        self.assertEqual(bulk_unpublish(self.details), 0)
+
+        pages = list(LibraryDetail.objects.order_by("pk"))
+        self.assertEqual(bulk_publish(pages), 3)
+        self.assertEqual(LibraryDetail.objects.live().count(), 3)
+        self.assertEqual(bulk_publish(pages), 0)
+        self.assertNotEqual(get_generation(self.index.path), generation)
+
+    def test_publish_revision(self):
+        """Pages with unpublished revisions should have their latest revision published."""
+        detail = self.details[0]
+        detail.title = "Revised"
+        detail.save_revision()
+        LibraryDetail.objects.filter(pk=detail.pk).update(has_unpublished_changes=True)
+        detail.refresh_from_db()
+
+        self.assertEqual(bulk_publish([detail]), 1)
+        detail.refresh_from_db()
+        self.assertEqual(detail.title, "Revised")
+        self.assertFalse(detail.has_unpublished_changes)
+
+    def test_move(self):
+        """Pages should be moved with valid tree paths, skipping taken slugs."""
+        LibraryDetailFactory.create(parent=self.other, slug=self.details[0].slug)
+        generation = get_generation(self.other.path)
+
+        self.assertEqual(bulk_move(self.details, self.other), 2)
+
+        self.assertEqual(Page.find_problems(), ([], [], [], [], []))
+        self.index.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.index.numchild, 1)
+        self.assertEqual(self.other.numchild, 3)
+        moved = LibraryDetail.objects.get(pk=self.details[1].pk)
+        self.assertEqual(moved.get_parent().pk, self.other.pk)
+        self.assertEqual(moved.url_path, self.other.url_path + moved.slug + "/")
+        self.assertNotEqual(get_generation(self.other.path), generation)
+
+        # Pages already under the target are left alone
+        self.assertEqual(bulk_move([moved], self.other), 0)
+
+    def test_run_in_batches(self):
+        """Operations should be applied batch by batch, in ID order."""
+        batches = list(run_in_batches("unpublish", LibraryDetail.objects.all(), batch_size=2))
+        self.assertEqual(batches, [(2, 2, 0), (1, 1, 0)])
+
+    def test_bulk_children(self):
+        """Bulk operations should select children by listing filters and IDs."""
+        children = self.index.get_bulk_children("q={}".format(self.details[0].title))
+        self.assertEqual(list(children), [self.details[0]])
+
+        bulk_unpublish(self.details)
+        children = self.index.get_bulk_children(ids=[self.details[1].pk])
+        self.assertEqual(list(children), [self.details[1]])
+
+
+class TestBulkActionForm(TestCase):
+    """Tests for the bulk action admin form."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.details = [LibraryDetailFactory.create(parent=self.index) for i in range(2)]
+
+    def get_form(self, data):
+        return BulkActionForm(data, children=self.index.get_bulk_children())
+
+    def test_valid(self):
+        """Selected children and library index targets should be accepted."""
+        form = self.get_form(
+            {"action": "move", "ids": [self.details[0].pk], "target": self.index.pk}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(list(form.cleaned_data["ids"]), [self.details[0]])
+
+    def test_invalid(self):
+        """Items should be chosen, and moves should have a library index target."""
+        self.assertIn("__all__", self.get_form({"action": "publish"}).errors)
+        form = self.get_form({"action": "move", "all_matching": "on"})
+        self.assertIn("target", form.errors)
+        form = self.get_form({"action": "move", "all_matching": "on", "target": self.details[0].pk})
+        self.assertIn("target", form.errors)
+
+
+@override_settings(WAGTAIL_LIBRARY_TASK_RUNNER="tests.test_models.run_now")
+@patch("wagtail_library.tasks.transaction.on_commit", lambda callback: callback())
+class TestBulkActionsView(TestCase):
+    """Tests for the bulk actions admin view and its page listing button."""
+
+    def setUp(self):
+        cache.clear()
+        root = Page.get_first_root_node()
+        self.index = LibraryIndexFactory.create(parent=root)
+        self.target = LibraryIndexFactory.create(parent=root)
+        self.details = [
+            LibraryDetailFactory.create(parent=self.index, title="Item {}".format(number))
+            for number in range(3)
+        ]
+        self.url = reverse("wagtail_library_bulk_actions", args=[self.index.pk])
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(self.user)
+
+    def login_editor(self, *permission_types):
+        """Log in a user with the given permissions on the index."""
+        group = Group.objects.create(name="Library editors")
+        group.permissions.add(Permission.objects.get(codename="access_admin"))
+        for permission_type in permission_types:
+            GroupPagePermission.objects.create(
+                group=group, page=self.index, permission_type=permission_type
+            )
+        editor = get_user_model().objects.create_user("editor", "editor@example.com", "x")
+        editor.groups.add(group)
+        self.client.force_login(editor)
+
+    def post(self, data, query=""):
+        """Submit the form, following the redirect to the explorer."""
+        response = self.client.post(self.url + query, data, follow=True)
+        self.assertRedirects(response, reverse("wagtailadmin_explore", args=[self.index.pk]))
+        return [str(message) for message in response.context["messages"]]
+
+    def test_form(self):
+        """The children matching the filters should be listed for selection."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["children"]), self.details)
+        self.assertContains(response, "Item 0")
+
+        response = self.client.get(self.url, {"q": "Item 1"})
+        self.assertEqual(list(response.context["children"]), [self.details[1]])
+        self.assertEqual(response.context["count"], 1)
+
+    def test_unpublish_selected(self):
+        """Only the selected children should be changed, and the counts reported."""
+        ids = [self.details[0].pk, self.details[2].pk]
+        messages = self.post({"action": "unpublish", "ids": ids})
+
+        self.assertEqual(list(LibraryDetail.objects.live()), [self.details[1]])
+        self.assertIn("2 of 2 items", messages[0])
+
+    def test_publish_all_matching(self):
+        """Every child matching the filters should be changed."""
+        bulk_unpublish(self.details)
+        self.post({"action": "publish", "all_matching": "on"}, query="?q=Item+2")
+
+        self.assertEqual(list(LibraryDetail.objects.live()), [self.details[2]])
+
+    def test_move(self):
+        """Moved children should be appended to the target."""
+        self.post({"action": "move", "ids": [self.details[0].pk], "target": self.target.pk})
+
+        self.assertEqual(list(LibraryDetail.objects.child_of(self.target)), [self.details[0]])
+        self.assertEqual(Page.find_problems(), ([], [], [], [], []))
+
+    def test_move_requires_target(self):
+        """Moves without a target should redisplay the form."""
+        response = self.client.post(self.url, {"action": "move", "all_matching": "on"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("target", response.context["form"].errors)
+
+    def test_skipped_pages(self):
+        """Children the user isn't allowed to change should be skipped and reported."""
+        LibraryDetail.objects.filter(pk=self.details[0].pk).update(locked=True)
+        messages = self.post({"action": "unpublish", "all_matching": "on"})
+
+        self.assertEqual(list(LibraryDetail.objects.live()), [self.details[0]])
+        self.assertIn("2 of 3 items", messages[0])
+        self.assertIn("1 items were skipped", messages[1])
+
+    def test_move_without_target_permission(self):
+        """Editors shouldn't move children to indexes they can't add pages to."""
+        self.login_editor("add", "edit", "publish")
+        messages = self.post({"action": "move", "all_matching": "on", "target": self.target.pk})
+
+        self.assertFalse(LibraryDetail.objects.child_of(self.target).exists())
+        self.assertIn("3 items were skipped", messages[1])
+
+    def test_permission_denied(self):
+        """Users who can't publish the index's children should be turned away."""
+        self.login_editor("add", "edit")
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.post(self.url, {"action": "publish"}).status_code, 403)
+
+    @override_settings(WAGTAIL_LIBRARY_BULK_INLINE_LIMIT=2)
+    def test_background(self):
+        """Large selections should be changed by a background task."""
+        messages = self.post({"action": "unpublish", "all_matching": "on"})
+
+        self.assertFalse(LibraryDetail.objects.live().exists())
+        self.assertIn("3 items will be changed in the background", messages[0])
+
+    def test_button(self):
+        """Library indexes should link to their bulk actions in the page explorer."""
+        response = self.client.get(reverse("wagtailadmin_explore_root"))
+        self.assertContains(response, self.url)
+
+        response = self.client.get(reverse("wagtailadmin_explore", args=[self.index.pk]))
+        detail_url = reverse("wagtail_library_bulk_actions", args=[self.details[0].pk])
+        self.assertNotContains(response, detail_url)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library management commands."""
+
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils.six import StringIO
+from mock import call, patch
+
+from wagtail_library.blobs import is_blob_name
+from wagtail_library.models import LibraryDetail
+from wagtail_library.tasks import extract_attachment_text, generate_attachment_preview
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+BASE_DIR = os.path.join(settings.PROJECT_DIR, "tests/assets")
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR)
+class TestBackfillAttachmentMetadata(TestCase):
+    """Tests for the backfill_attachment_metadata command."""
+
+    def setUp(self):
+        index = LibraryIndexFactory.create(parent=None)
+        self.detail = LibraryDetailFactory.create(
+            parent=index, attachment=SimpleUploadedFile("backfill.txt", b"backfill")
+        )
+        self.missing = LibraryDetailFactory.create(parent=index)
+        LibraryDetail.objects.update(
+            attachment_size=None, attachment_mime_type="", attachment_sha256=""
+        )
+
+    def tearDown(self):
+        self.detail.attachment.delete(save=False)
+
+    def test_backfill(self):
+        """Missing metadata should be stored, unreadable files reported."""
+        stdout, stderr = StringIO(), StringIO()
+        call_command("backfill_attachment_metadata", workers=2, stdout=stdout, stderr=stderr)
+        self.detail.refresh_from_db()
+
+        self.assertEqual(self.detail.attachment_size, 8)
+        self.assertEqual(self.detail.attachment_mime_type, "text/plain")
+        self.assertEqual(self.detail.attachment_sha256, hashlib.sha256(b"backfill").hexdigest())
+        self.assertIn("1 updated, 1 failed", stdout.getvalue())
+        self.assertIn(self.missing.attachment.name, stderr.getvalue())
+
+
+class TestImportLibraryItems(TestCase):
+    """Tests for the import_library_items command."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.source = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+        for name in ("First report.pdf", "second.txt"):
+            with open(os.path.join(self.source, name), "wb") as handle:
+                handle.write(name.encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.media)
+
+    def import_items(self, source, **options):
+        stdout, stderr = StringIO(), StringIO()
+        with override_settings(MEDIA_ROOT=self.media):
+            call_command(
+                "import_library_items",
+                self.index.pk,
+                source,
+                stdout=stdout,
+                stderr=stderr,
+                **options,
+            )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_directory(self):
+        """Every file should become a published item with its attachment metadata."""
+        stdout, _ = self.import_items(self.source, batch_size=1, workers=2)
+        items = LibraryDetail.objects.child_of(self.index)
+
+        self.assertEqual([item.slug for item in items], ["first-report", "second"])
+        self.assertTrue(all(item.live for item in items))
+        self.assertEqual(items[1].attachment_size, 10)
+        self.assertEqual(items[1].attachment_sha256, hashlib.sha256(b"second.txt").hexdigest())
+        self.assertTrue(os.path.exists(os.path.join(self.media, items[1].attachment.name)))
+        self.assertIn("Done: 2 imported, 0 skipped, 0 failed", stdout)
+
+    def test_published_tasks(self):
+        """Items imported as live should have their text extracted and previews rendered."""
+        with patch("wagtail_library.signal_handlers.run_in_background") as run_in_background:
+            self.import_items(self.source)
+        items = LibraryDetail.objects.child_of(self.index)
+
+        self.assertCountEqual(
+            run_in_background.call_args_list,
+            [
+                call(extract_attachment_text, "wagtail_library.LibraryDetail", item.pk)
+                for item in items
+            ]
+            + [call(generate_attachment_preview, "wagtail_library.LibraryDetail", items[0].pk)],
+        )
+
+    def test_draft_tasks(self):
+        """Items imported as drafts should wait to be published."""
+        with patch("wagtail_library.signal_handlers.run_in_background") as run_in_background:
+            self.import_items(self.source, draft=True)
+
+        run_in_background.assert_not_called()
+
+    def test_resume(self):
+        """Items imported by an earlier run should be skipped."""
+        self.import_items(self.source)
+        stdout, _ = self.import_items(self.source)
+
+        self.assertEqual(LibraryDetail.objects.child_of(self.index).count(), 2)
+        self.assertIn("Done: 0 imported, 2 skipped, 0 failed", stdout)
+
+    def test_import_manifest(self):
+        """CSV manifests should set fields and report missing files."""
+        manifest = os.path.join(self.source, "manifest.csv")
+        with open(manifest, "w") as handle:
+            handle.write("title,file,body\nReport,second.txt,<p>Body</p>\nMissing,missing.pdf,\n")
+
+        stdout, stderr = self.import_items(manifest, draft=True)
+        item = LibraryDetail.objects.child_of(self.index).get()
+
+        self.assertEqual(item.body, "<p>Body</p>")
+        self.assertFalse(item.live)
+        self.assertIn("missing.pdf", stderr)
+        self.assertIn("Done: 1 imported, 0 skipped, 1 failed", stdout)
+
+    def test_unknown_fields(self):
+        """Manifests with columns that aren't fields should be rejected."""
+        manifest = os.path.join(self.source, "manifest.json")
+        with open(manifest, "w") as handle:
+            json.dump([{"title": "Report", "colour": "red"}], handle)
+
+        with self.assertRaises(CommandError):
+            self.import_items(manifest)
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR)
+class TestExtractAttachmentText(TestCase):
+    """Tests for the extract_attachment_text command."""
+
+    def setUp(self):
+        index = LibraryIndexFactory.create(parent=None)
+        self.details = [
+            LibraryDetailFactory.create(
+                parent=index, attachment=SimpleUploadedFile("extract.txt", b"Extracted text")
+            )
+            for _ in range(3)
+        ]
+        self.image = LibraryDetailFactory.create(
+            parent=index, attachment=SimpleUploadedFile("extract.jpg", b"\xff\xd8")
+        )
+
+    def tearDown(self):
+        for detail in self.details + [self.image]:
+            detail.attachment.delete(save=False)
+
+    def test_extract(self):
+        """Text should be extracted from supported attachments that need it."""
+        self.details[0].store_attachment_text("Already extracted")
+        stdout = StringIO()
+        call_command("extract_attachment_text", batch_size=1, workers=2, stdout=stdout)
+
+        texts = dict(LibraryDetail.objects.values_list("pk", "attachment_text"))
+        self.assertEqual(texts[self.details[0].pk], "Already extracted")
+        self.assertEqual(texts[self.details[1].pk], "Extracted text")
+        self.assertEqual(texts[self.image.pk], "")
+        self.assertIn("Done: 2 extracted, 0 failed", stdout.getvalue())
+
+        call_command("extract_attachment_text", all=True, stdout=stdout)
+        self.assertEqual(
+            LibraryDetail.objects.get(pk=self.details[0].pk).attachment_text, "Extracted text"
+        )
+
+
+class TestDeduplicateAttachments(TestCase):
+    """Tests for the deduplicate_attachments command."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        index = LibraryIndexFactory.create(parent=None)
+        self.details = [
+            LibraryDetailFactory.create(parent=index, attachment=SimpleUploadedFile(name, content))
+            for name, content in (("a.txt", b"Same"), ("b.txt", b"Same"), ("c.txt", b"Other"))
+        ]
+        self.revision = self.details[0].save_revision()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_dry_run(self):
+        """Dry runs should report the space they'd free without changing anything."""
+        stdout = StringIO()
+        call_command("deduplicate_attachments", dry_run=True, stdout=stdout)
+
+        self.assertIn("Done: 3 moved, 0 failed, 4 bytes freed (dry run)", stdout.getvalue())
+        self.assertEqual(
+            list(LibraryDetail.objects.order_by("pk").values_list("attachment", flat=True)),
+            ["attachments/a.txt", "attachments/b.txt", "attachments/c.txt"],
+        )
+
+    def test_deduplicate(self):
+        """Identical attachments should share a content-addressed file."""
+        stdout = StringIO()
+        call_command("deduplicate_attachments", batch_size=2, stdout=stdout)
+        names = list(LibraryDetail.objects.order_by("pk").values_list("attachment", flat=True))
+        self.revision.refresh_from_db()
+
+        self.assertIn("Done: 3 moved, 0 failed, 4 bytes freed", stdout.getvalue())
+        self.assertTrue(all(is_blob_name(name) for name in names))
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        self.assertIn(names[0], self.revision.content_json)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.media_root, "attachments"))), ["sha256"]
+        )
+
+
+class TestBulkLibraryItems(TestCase):
+    """Tests for the bulk_library_items command."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.target = LibraryIndexFactory.create(parent=None)
+        self.details = [LibraryDetailFactory.create(parent=self.index) for i in range(3)]
+
+    def test_unpublish(self):
+        """Selected children should be changed in batches, with progress reported."""
+        stdout = StringIO()
+        ids = "{},{}".format(self.details[0].pk, self.details[1].pk)
+        call_command(
+            "bulk_library_items", "unpublish", self.index.pk, ids=ids, batch_size=1, stdout=stdout
+        )
+
+        self.assertIn("2 processed, 2 changed", stdout.getvalue())
+        self.assertIn("Done: 2 unpublished, 0 skipped", stdout.getvalue())
+        self.assertEqual(list(LibraryDetail.objects.live()), [self.details[2]])
+
+    def test_move(self):
+        """Children matching the filter should be moved to the target."""
+        stdout = StringIO()
+        call_command(
+            "bulk_library_items",
+            "move",
+            self.index.pk,
+            filter="q={}".format(self.details[0].title),
+            target=self.target.pk,
+            stdout=stdout,
+        )
+
+        self.assertIn("Done: 1 moved, 0 skipped", stdout.getvalue())
+        self.assertEqual(list(LibraryDetail.objects.child_of(self.target)), [self.details[0]])
+
+    def test_errors(self):
+        """Moves without a target and pages that aren't indexes should be rejected."""
+        with self.assertRaises(CommandError):
+            call_command("bulk_library_items", "move", self.index.pk)
+        with self.assertRaises(CommandError):
+            call_command("bulk_library_items", "publish", self.details[0].pk)
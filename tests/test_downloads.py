@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library download counters."""
+
+from __future__ import unicode_literals
+
+import time
+
+from django.test import TestCase, override_settings
+from mock import Mock, patch
+
+from wagtail_library import downloads
+from wagtail_library.downloads import start_flusher
+from wagtail_library.models import LibraryDetail
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+class TestDownloadCounters(TestCase):
+    """Tests for buffering and flushing download counts."""
+
+    def setUp(self):
+        downloads._buffer.clear()
+        downloads._last_flush = time.monotonic()
+        patcher = patch("wagtail_library.downloads.start_flusher")
+        self.start_flusher = patcher.start()
+        self.addCleanup(patcher.stop)
+        index = LibraryIndexFactory.create(parent=None)
+        self.first, self.second = LibraryDetailFactory.create_batch(2, parent=index)
+
+    def tearDown(self):
+        downloads._buffer.clear()
+
+    def get_counts(self):
+        return [
+            LibraryDetail.objects.get(pk=page.pk).download_count
+            for page in (self.first, self.second)
+        ]
+
+    def test_buffered(self):
+        """Downloads should be counted in memory until the next flush."""
+        with self.assertNumQueries(0):
+            for page in (self.first, self.first, self.second):
+                downloads.record_download(page)
+
+        self.assertEqual(self.get_counts(), [0, 0])
+        downloads.flush_buffer()
+        self.assertEqual(self.get_counts(), [2, 1])
+        self.assertFalse(downloads._buffer)
+
+    @override_settings(WAGTAIL_LIBRARY_DOWNLOAD_FLUSH_INTERVAL=0)
+    def test_periodic_flush(self):
+        """Buffered counts should be flushed in the background once the interval elapses."""
+        with patch("wagtail_library.downloads.run_in_background") as run_in_background:
+            downloads.record_download(self.first)
+
+        run_in_background.assert_called_once_with(
+            downloads.flush_download_counts, [["wagtail_library.LibraryDetail", self.first.pk, 1]]
+        )
+        self.assertFalse(downloads._buffer)
+
+    @override_settings(WAGTAIL_LIBRARY_DOWNLOAD_FLUSH_INTERVAL=0)
+    def test_flusher(self):
+        """The flusher thread should flush the buffer without waiting for a download."""
+        downloads._buffer[("wagtail_library.LibraryDetail", self.first.pk)] = 2
+        stopped = Mock()
+        stopped.wait.side_effect = [False, False, True]
+
+        with patch("wagtail_library.downloads.run_in_background") as run_in_background:
+            downloads._flush_periodically(stopped)
+
+        # Empty buffers aren't flushed
+        run_in_background.assert_called_once_with(
+            downloads.flush_download_counts, [["wagtail_library.LibraryDetail", self.first.pk, 2]]
+        )
+
+    @patch("wagtail_library.downloads._flusher_pid", None)
+    def test_flusher_started_once(self):
+        """A flusher thread should be started once per process, on its first download."""
+        downloads.record_download(self.first)
+        self.start_flusher.assert_called_once_with()
+
+        with patch("wagtail_library.downloads.threading.Thread") as thread:
+            start_flusher()
+            start_flusher()
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
+
+    def test_flush_adds_counts(self):
+        """Flushing should add to the stored counts, in batches."""
+        LibraryDetail.objects.filter(pk=self.first.pk).update(download_count=10)
+        label = "wagtail_library.LibraryDetail"
+
+        with patch("wagtail_library.downloads.FLUSH_BATCH_SIZE", 1):
+            downloads.flush_download_counts([[label, self.first.pk, 3], [label, self.second.pk, 4]])
+
+        self.assertEqual(self.get_counts(), [13, 4])
+
+    def test_count_survives_publishing(self):
+        """Publishing a revision saved before a flush should keep the flushed count."""
+        revision = self.first.save_revision()
+        downloads.flush_download_counts([["wagtail_library.LibraryDetail", self.first.pk, 42]])
+
+        revision.publish()
+
+        self.assertEqual(self.get_counts(), [42, 0])
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library attachment text extraction."""
+
+from __future__ import unicode_literals
+
+from django.test import SimpleTestCase, override_settings
+
+from wagtail_library.extraction import can_extract_text, extract_text
+
+
+class TestExtractText(SimpleTestCase):
+    """Tests for extract_text."""
+
+    def test_plain_text(self):
+        """Whitespace should be collapsed and invalid bytes replaced."""
+        text = extract_text(b"Annual\n\n  report\x00\xff", "text/plain")
+        self.assertEqual(text, "Annual report �")
+
+    def test_html(self):
+        """Markup should be stripped and entities decoded."""
+        text = extract_text(b"<p>Fish &amp; chips</p><p>menu</p>", "text/html")
+        self.assertEqual(text, "Fish & chips menu")
+
+    def test_unsupported_type(self):
+        """Nothing should be extracted from unsupported types."""
+        self.assertFalse(can_extract_text("image/jpeg"))
+        self.assertEqual(extract_text(b"\xff\xd8", "image/jpeg"), "")
+
+    @override_settings(WAGTAIL_LIBRARY_ATTACHMENT_TEXT_MAX_LENGTH=6)
+    def test_truncated(self):
+        """The text should be truncated to the configured length."""
+        self.assertEqual(extract_text(b"Annual report", "text/plain"), "Annual")
+        self.assertEqual(extract_text(b"Annual report", "text/plain", max_length=3), "Ann")
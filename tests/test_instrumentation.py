@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library instrumentation."""
+
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from wagtail_library.instrumentation import (
+    NULL_STAGE,
+    Stage,
+    instrumentation_enabled,
+    measure_stage,
+    stage_finished,
+)
+from wagtail_library.models import LibraryIndex
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+class TestInstrumentation(TestCase):
+    """Tests for measuring the stages of serving a listing."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(paginate_by=10, parent=None)
+        LibraryDetailFactory.create_batch(3, parent=self.index)
+        self.request = RequestFactory().get("")
+        self.request.is_preview = False
+        self.stages = []
+
+    def receiver(self, sender, page, stage, duration, queries, request, **kwargs):
+        self.stages.append((stage, queries))
+
+    def serve(self):
+        stage_finished.connect(self.receiver, sender=LibraryIndex)
+        try:
+            self.index.serve(self.request).render()
+        finally:
+            stage_finished.disconnect(self.receiver, sender=LibraryIndex)
+
+    def test_disabled(self):
+        """Nothing should be measured without receivers or a slow stage threshold."""
+        self.assertFalse(instrumentation_enabled())
+        self.assertIs(measure_stage(self.index, "render"), NULL_STAGE)
+
+    def test_stages(self):
+        """Each stage should be sent with the queries it ran."""
+        self.serve()
+
+        self.assertEqual(
+            [stage for stage, queries in self.stages],
+            ["queryset", "count", "paginate", "children", "facets", "render"],
+        )
+        # The count, the children and the facet counts
+        self.assertEqual([queries for stage, queries in self.stages][:5], [0, 1, 0, 1, 1])
+
+    def test_stages_from_render_cache(self):
+        """Cached listings should still be measured when they're rendered."""
+        self.index.render_cache_timeout = 60
+        self.serve()
+
+        self.assertEqual([stage for stage, queries in self.stages][-1], "render")
+        self.assertIsNotNone(cache.get(self.index.get_render_cache_key(self.request)))
+
+    @override_settings(WAGTAIL_LIBRARY_SLOW_STAGE_THRESHOLD=0)
+    def test_slow_stage(self):
+        """Stages slower than the threshold should be logged."""
+        with self.assertLogs("wagtail_library.instrumentation", "WARNING") as logs:
+            with measure_stage(self.index, "count") as stage:
+                LibraryIndex.objects.count()
+
+        self.assertIsInstance(stage, Stage)
+        self.assertEqual(stage.queries, 1)
+        self.assertIn("Slow count stage", logs.output[0])
+
+    def test_nested_stages(self):
+        """Nested stages should be left out of the enclosing stage and share its request."""
+        stage_finished.connect(self.receiver, sender=LibraryIndex)
+        try:
+            with measure_stage(self.index, "paginate", self.request) as outer:
+                with measure_stage(self.index, "count") as inner:
+                    LibraryIndex.objects.count()
+                LibraryIndex.objects.exists()
+        finally:
+            stage_finished.disconnect(self.receiver, sender=LibraryIndex)
+
+        self.assertEqual(self.stages, [("count", 1), ("paginate", 1)])
+        self.assertIs(inner.request, self.request)
+        self.assertGreaterEqual(outer.duration, 0)
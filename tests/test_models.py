@@ -3,21 +3,34 @@
 
 from __future__ import unicode_literals
 
+import hashlib
 import os
+import shutil
+import tempfile
+from datetime import datetime
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Paginator, Page as PaginatorPage
-from django.db import models
+from django.db import connection, models, transaction
+from django.template.loader import render_to_string
 from django.test import RequestFactory, TestCase, override_settings
+from django.utils.timezone import utc
 from mock import Mock, patch
+from PIL import Image
 from wagtail.core.models import Page
 from wagtail.core.fields import RichTextField
 
 from wagtail_library import abstract_models
+from wagtail_library.blobs import PendingDeletions, blob_name
+from wagtail_library.bulk import bulk_create_children
+from wagtail_library.cache import get_generation
 from wagtail_library.models import LibraryIndex, LibraryDetail
+from wagtail_library.paginators import CachedCountPaginator
 
 from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+from tests.test_previews import make_png
 
 
 BASE_DIR = os.path.join(settings.PROJECT_DIR, "tests/assets")
@@ -167,6 +180,221 @@ class TestLibraryIndex(TestCase):
         self.assertEqual(len(children), 1)
         self.assertEqual(children[0], self.detail_one)
 
+    def test_get_children_listing_fields(self):
+        """Only the listing fields should be loaded when listing_fields is set."""
+        self.index.listing_fields = ["attachment"]
+        children = list(self.index._get_children(self.request))
+
+        self.assertEqual(children, [self.detail_one])
+        self.assertIn("body", children[0].get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(children[0].title, self.detail_one.title)
+            self.assertEqual(children[0].attachment, self.detail_one.attachment)
+            self.assertEqual(children[0].url_path, self.detail_one.url_path)
+
+    def test_get_child_models(self):
+        """get_child_models should return the allowed subpage models, cached per class."""
+        self.assertEqual(self.model.get_child_models(), (LibraryDetail,))
+
+        with patch.object(self.model, "allowed_subpage_models") as allowed_subpage_models:
+            self.model.get_child_models()
+        allowed_subpage_models.assert_not_called()
+
+    def test_get_children_multiple_models(self):
+        """Children of every child model should be listed as specific instances."""
+        nested_index = LibraryIndexFactory.create(parent=self.index)
+        self.request.is_preview = True
+
+        with patch.object(
+            self.model, "get_child_models", Mock(return_value=(LibraryDetail, LibraryIndex))
+        ):
+            children = self.index._get_children(self.request)
+            with self.assertNumQueries(3):
+                children = list(children)
+
+        self.assertEqual(children, [self.detail_one, self.detail_two, nested_index])
+        self.assertIsInstance(children[0], LibraryDetail)
+        self.assertIsInstance(children[2], LibraryIndex)
+
+    def test_get_children_multiple_models_listing_fields(self):
+        """Listing fields should apply to the specific instances of every child model."""
+        self.index.listing_fields = ["attachment"]
+
+        with patch.object(
+            self.model, "get_child_models", Mock(return_value=(LibraryDetail, LibraryIndex))
+        ):
+            children = list(self.index._get_children(self.request))
+
+        self.assertEqual(children, [self.detail_one])
+        self.assertIn("body", children[0].get_deferred_fields())
+        self.assertNotIn("attachment", children[0].get_deferred_fields())
+
+    def test_get_listing_fields(self):
+        """get_listing_fields should include the fields required for URLs."""
+        self.assertIsNone(self.index.get_listing_fields())
+
+        self.index.listing_fields = ["attachment", "title"]
+        fields = self.index.get_listing_fields()
+
+        self.assertIn("attachment", fields)
+        self.assertIn("url_path", fields)
+        self.assertEqual(fields.count("title"), 1)
+
+
+class TestLibraryIndexDescendants(TestCase):
+    """Tests for indexes listing the items of their descendant indexes."""
+
+    def setUp(self):
+        cache.clear()
+        self.library = LibraryIndexFactory.create(parent=None, list_descendants=True)
+        self.reports = LibraryIndexFactory.create(parent=self.library, list_descendants=True)
+        self.minutes = LibraryIndexFactory.create(parent=self.library)
+        self.annual = LibraryIndexFactory.create(parent=self.reports)
+        self.own = LibraryDetailFactory.create(parent=self.library)
+        self.report = LibraryDetailFactory.create(parent=self.reports)
+        self.annual_report = LibraryDetailFactory.create(parent=self.annual)
+        self.minute = LibraryDetailFactory.create(parent=self.minutes)
+        self.request = RequestFactory().get("/")
+        self.request.is_preview = False
+
+    def get_children(self, index):
+        return set(index._get_children(self.request))
+
+    def test_descendants(self):
+        """Indexes listing their descendants should list the items of every index below."""
+        self.assertEqual(
+            self.get_children(self.library),
+            {self.own, self.report, self.annual_report, self.minute},
+        )
+        self.assertEqual(self.get_children(self.reports), {self.report, self.annual_report})
+        self.assertEqual(self.get_children(self.minutes), {self.minute})
+
+    def test_single_query(self):
+        """The items of every index should be listed with a single query."""
+        with self.assertNumQueries(1):
+            list(self.library._get_children(self.request))
+
+    def test_selected_indexes(self):
+        """get_listed_index_paths should select the indexes whose items are listed."""
+        paths = [self.annual.path, self.minutes.path]
+        with patch.object(self.library, "get_listed_index_paths", return_value=paths):
+            self.assertEqual(self.get_children(self.library), {self.annual_report, self.minute})
+        with patch.object(self.library, "get_listed_index_paths", return_value=[]):
+            self.assertEqual(self.get_children(self.library), set())
+
+    def test_selected_indexes_invalidation(self):
+        """Cached listings of selected indexes should be invalidated when their items change."""
+        other = LibraryIndexFactory.create(parent=None)
+        LibraryDetailFactory.create(parent=other)
+        self.library.paginate_by = 10
+        self.library.paginator_class = CachedCountPaginator
+
+        with patch.object(self.library, "get_listed_index_paths", return_value=[other.path]):
+            etag = self.library.get_validators(self.request)[0]
+            self.assertEqual(self.library.get_context(self.request)["paginator"].count, 1)
+            LibraryDetailFactory.create(parent=other)
+
+            self.assertEqual(self.library.get_context(self.request)["paginator"].count, 2)
+            self.assertNotEqual(self.library.get_validators(self.request)[0], etag)
+
+    def test_context(self):
+        """Pagination and facets should cover the items of every index."""
+        self.library.paginate_by = 2
+        context = self.library.get_context(self.request)
+
+        self.assertEqual(context["paginator"].count, 4)
+        self.assertEqual(len(context["children"]), 2)
+
+    def test_invalidation(self):
+        """Changing an item should invalidate the cached listings of every ancestor."""
+        generations = [get_generation(index.path) for index in (self.library, self.reports)]
+        self.annual_report.save_revision().publish()
+
+        self.assertNotEqual(
+            [get_generation(index.path) for index in (self.library, self.reports)], generations
+        )
+
+    def test_move_invalidation(self):
+        """Moving a section should invalidate the cached listings of its old and new ancestors."""
+        other = LibraryIndexFactory.create(parent=None)
+        generations = [get_generation(index.path) for index in (self.library, self.reports, other)]
+        self.annual.move(other, pos="last-child")
+
+        for index, generation in zip((self.library, self.reports, other), generations):
+            self.assertNotEqual(get_generation(index.path), generation)
+        self.assertEqual(self.get_children(self.library), {self.own, self.report, self.minute})
+
+    def test_uses_index(self):
+        """Descendants should be found by path prefix with an index."""
+        sql, params = self.library._get_children(self.request).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        # Either index on the path, depending on the database's collation
+        self.assertNotIn("Seq Scan on wagtailcore_page", plan)
+
+
+class TestLibraryIndexRenderCache(TestCase):
+    """Tests for the LibraryIndex render cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(paginate_by=10, parent=None)
+        self.index.render_cache_timeout = 60
+        LibraryDetailFactory.create(parent=self.index)
+        self.factory = RequestFactory()
+
+    def serve(self, path="", **kwargs):
+        """Serve and render the index for a GET request."""
+        request = self.factory.get(path, **kwargs)
+        response = self.index.serve(request)
+        response.render()
+        return response
+
+    def test_cache_hit(self):
+        """A second identical request should be served without queries."""
+        response = self.serve()
+
+        with self.assertNumQueries(0):
+            cached = self.serve()
+        self.assertEqual(cached.content, response.content)
+
+    def test_cache_disabled(self):
+        """Nothing should be cached unless render_cache_timeout is set."""
+        self.index.render_cache_timeout = None
+        self.serve()
+
+        with self.assertNumQueries(2):
+            self.serve()
+
+    def test_varies_on_querystring(self):
+        """Different querystrings should be cached separately."""
+        self.serve()
+        self.assertNotEqual(
+            self.index.get_render_cache_key(self.factory.get("")),
+            self.index.get_render_cache_key(self.factory.get("", {"page": 2})),
+        )
+
+    def test_preview_bypasses_cache(self):
+        """Preview requests should never be served from or stored in the cache."""
+        self.serve()
+        request = self.factory.get("")
+        request.is_preview = True
+
+        self.assertFalse(self.index.is_cacheable_request(request))
+        # Facet counts, the child count and the children
+        with self.assertNumQueries(3):
+            self.index.serve(request).render()
+
+    def test_publish_invalidates_cache(self):
+        """Adding a child should invalidate the cached listing."""
+        self.serve()
+        detail = LibraryDetailFactory.create(parent=self.index)
+
+        self.assertIn(detail.title, self.serve().content.decode())
+
 
 class TestLibraryDetail(TestCase):
     """Test for the LibraryDetail."""
@@ -190,3 +418,562 @@ class TestLibraryDetail(TestCase):
         """The content_panels should include the body & attachment fields."""
         self.assertIn("attachment", [panel.field_name for panel in self.model.content_panels])
         self.assertIn("body", [panel.field_name for panel in self.model.content_panels])
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR)
+class TestLibraryDetailAttachmentMetadata(TestCase):
+    """Tests for the denormalised attachment metadata."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.content = open(os.path.join(BASE_DIR, "image.jpg"), "rb").read()
+        self.detail = LibraryDetailFactory.create(
+            parent=self.index,
+            attachment=SimpleUploadedFile("metadata.jpg", self.content, "image/jpeg"),
+        )
+
+    def tearDown(self):
+        self.detail.attachment.delete(save=False)
+
+    def test_metadata_on_upload(self):
+        """The metadata should be stored when the attachment is uploaded."""
+        self.detail.refresh_from_db()
+
+        self.assertEqual(self.detail.attachment_size, len(self.content))
+        self.assertEqual(self.detail.attachment_mime_type, "image/jpeg")
+        self.assertEqual(self.detail.attachment_extension, "jpg")
+        self.assertEqual(self.detail.attachment_sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(self.detail.get_attachment_etag(), self.detail.attachment_sha256)
+
+    def test_metadata_not_recalculated(self):
+        """Saving without changing the attachment shouldn't read the file again."""
+        detail = LibraryDetail.objects.get(pk=self.detail.pk)
+
+        with patch("wagtail_library.abstract_models.get_file_metadata") as get_file_metadata:
+            detail.title = "Changed"
+            detail.save()
+        get_file_metadata.assert_not_called()
+
+    def test_metadata_in_revision(self):
+        """The metadata should be calculated before a revision is serialised."""
+        detail = LibraryDetail.objects.get(pk=self.detail.pk)
+        detail.attachment = SimpleUploadedFile("revision.txt", b"revision", "text/plain")
+        revision = detail.save_revision()
+        page = revision.as_page_object()
+        detail.attachment.delete(save=False)
+
+        self.assertEqual(page.attachment_size, 8)
+        self.assertEqual(page.attachment_mime_type, "text/plain")
+        self.assertEqual(page.attachment_sha256, hashlib.sha256(b"revision").hexdigest())
+
+
+class TestLibrarySearch(TestCase):
+    """Tests for full-text search of library items."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(paginate_by=10, parent=None)
+        self.annual = LibraryDetailFactory.create(
+            parent=self.index, title="Annual report", body="<p>Yearly figures</p>"
+        )
+        self.guide = LibraryDetailFactory.create(
+            parent=self.index, title="Style guide", body="<p>How to write</p><p>reports</p>"
+        )
+        self.request = RequestFactory().get("/", {"q": "reports"})
+        self.request.is_preview = False
+
+    def test_search_vector_on_save(self):
+        """The search vector should hold the weighted title and plain body text."""
+        vector = LibraryDetail.objects.values_list("search_vector", flat=True).get(pk=self.guide.pk)
+        self.assertIn("'style':1A", vector)
+        self.assertIn("'write':5B", vector)
+        self.assertIn("'report':6B", vector)
+        self.assertNotIn("p", vector.split("'"))
+
+    def test_search_vector_not_updated_for_drafts(self):
+        """Draft revisions shouldn't change the search vector of the live page."""
+        self.guide.title = "Draft title"
+        self.guide.save_revision()
+
+        vector = LibraryDetail.objects.values_list("search_vector", flat=True).get(pk=self.guide.pk)
+        self.assertNotIn("draft", vector)
+
+        self.guide.get_latest_revision().publish()
+        vector = LibraryDetail.objects.values_list("search_vector", flat=True).get(pk=self.guide.pk)
+        self.assertIn("'draft':1A", vector)
+
+    def test_search(self):
+        """Matching children should be ranked, with title matches first."""
+        children = list(self.index._get_children(self.request))
+
+        self.assertEqual(children, [self.annual, self.guide])
+        self.assertGreater(children[0].search_rank, children[1].search_rank)
+
+    def test_search_no_match(self):
+        """No children should be listed when nothing matches."""
+        request = RequestFactory().get("/", {"q": "missing"})
+        request.is_preview = False
+
+        self.assertEqual(list(self.index._get_children(request)), [])
+
+    def test_search_multiple_models(self):
+        """Searching should work across child models, skipping models without vectors."""
+        LibraryIndexFactory.create(parent=self.index, title="Reports")
+
+        with patch.object(
+            LibraryIndex, "get_child_models", Mock(return_value=(LibraryDetail, LibraryIndex))
+        ):
+            self.assertEqual(
+                self.index.get_search_vector_lookups(), ["librarydetail__search_vector"]
+            )
+            children = list(self.index._get_children(self.request))
+
+        self.assertEqual(children, [self.annual, self.guide])
+        self.assertIsNotNone(children[0].search_rank)
+
+    def test_search_context(self):
+        """The search terms should be available in the context and paginated."""
+        self.index.paginate_by = 1
+        context = self.index.get_context(self.request)
+
+        self.assertEqual(context["search_query"], "reports")
+        self.assertEqual(list(context["children"]), [self.annual])
+        self.assertEqual(context["paginator"].count, 2)
+
+
+def run_now(task, *args):
+    """Task runner running tasks synchronously."""
+    task(*args)
+
+
+@patch("wagtail_library.blobs.transaction.on_commit", lambda callback: callback())
+class TestLibraryDetailContentAddressedStorage(TestCase):
+    """Tests for storing attachments under the digest of their content."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root, WAGTAIL_LIBRARY_CONTENT_ADDRESSED_STORAGE=True
+        )
+        self.settings.enable()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.digest = hashlib.sha256(b"Shared report").hexdigest()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def create(self, name="report.pdf", content=b"Shared report"):
+        return LibraryDetailFactory.create(
+            parent=self.index, attachment=SimpleUploadedFile(name, content)
+        )
+
+    def test_shared_files(self):
+        """Identical attachments should be stored once, under their digest."""
+        first = self.create()
+        second = self.create(name="copy.pdf")
+        other = self.create(content=b"Other report")
+
+        self.assertEqual(
+            first.attachment.name,
+            "attachments/sha256/{}/{}.pdf".format(self.digest[:2], self.digest),
+        )
+        self.assertEqual(second.attachment.name, first.attachment.name)
+        self.assertNotEqual(other.attachment.name, first.attachment.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.attachment.path))), 1)
+        self.assertEqual(second.get_attachment_filename(), second.slug + ".pdf")
+
+    def test_publish_shared_upload(self):
+        """Uploading a file that's already stored should save and publish, sharing it."""
+        first = self.create()
+        second = LibraryDetail.objects.get(pk=self.create(content=b"Other report").pk)
+        second.attachment = SimpleUploadedFile("copy.pdf", b"Shared report")
+        second.full_clean()
+        second.save_revision().publish()
+        second.refresh_from_db()
+
+        self.assertEqual(second.attachment.name, first.attachment.name)
+        self.assertEqual(second.attachment_sha256, self.digest)
+        self.assertTrue(second.live)
+
+    def test_revision(self):
+        """Revisions should reference the stored file, not the uploaded one."""
+        detail = self.create()
+        detail.attachment = SimpleUploadedFile("new.pdf", b"New report")
+        revision = detail.save_revision()
+
+        self.assertIn(detail.attachment.name, revision.content_json)
+        self.assertTrue(detail.attachment.storage.exists(detail.attachment.name))
+
+    def test_delete(self):
+        """Shared files should be deleted with the last item referencing them."""
+        first = self.create()
+        second = self.create()
+        storage, name = first.attachment.storage, first.attachment.name
+
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_delete_referenced_by_revision(self):
+        """Files still referenced by revisions of other items should be kept."""
+        first = self.create()
+        second = self.create(content=b"Other report")
+        second.attachment = first.attachment.name
+        second.save_revision()
+        second.refresh_from_db()
+
+        first.delete()
+        self.assertTrue(first.attachment.storage.exists(first.attachment.name))
+
+    def test_delete_referenced_by_published_revision(self):
+        """Revisions older than the published one shouldn't keep files."""
+        first = self.create()
+        second = self.create(content=b"Other report")
+        second.attachment = first.attachment.name
+        second.save_revision()
+        second.refresh_from_db()
+        second.save_revision().publish()
+
+        first.delete()
+        self.assertFalse(first.attachment.storage.exists(first.attachment.name))
+
+    def test_delete_batched(self):
+        """The files of the items deleted in a transaction should be checked at once."""
+        kept = self.create()
+        child = LibraryIndexFactory.create(parent=self.index)
+        details = [
+            LibraryDetailFactory.create(
+                parent=child, attachment=SimpleUploadedFile("report.pdf", content)
+            )
+            for content in (b"Shared report", b"Other report", b"Third report")
+        ]
+        storage = kept.attachment.storage
+
+        with patch("wagtail_library.blobs.transaction.on_commit", connection.on_commit):
+            with transaction.atomic():
+                child.delete()
+            pending = [
+                func
+                for sids, func in connection.run_on_commit
+                if isinstance(func, PendingDeletions)
+            ]
+        self.assertEqual(len(pending), 1)
+        # The items referencing the files, then the pending revisions for the others
+        with self.assertNumQueries(2):
+            pending[0]()
+
+        self.assertTrue(storage.exists(kept.attachment.name))
+        for detail in details[1:]:
+            self.assertFalse(storage.exists(detail.attachment.name))
+
+    def test_disabled(self):
+        """Attachments should keep their names unless the setting is enabled."""
+        with override_settings(WAGTAIL_LIBRARY_CONTENT_ADDRESSED_STORAGE=False):
+            detail = self.create()
+
+        self.assertEqual(detail.attachment.name, "attachments/report.pdf")
+        detail.delete()
+        self.assertTrue(detail.attachment.storage.exists(detail.attachment.name))
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR, WAGTAIL_LIBRARY_TASK_RUNNER="tests.test_models.run_now")
+@patch("wagtail_library.tasks.transaction.on_commit", lambda callback: callback())
+class TestLibraryDetailAttachmentText(TestCase):
+    """Tests for attachment text extraction."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.detail = LibraryDetailFactory.create(
+            parent=self.index,
+            title="Minutes",
+            attachment=SimpleUploadedFile("minutes.txt", b"Quarterly budget discussion"),
+        )
+        self.request = RequestFactory().get("/", {"q": "budget"})
+        self.request.is_preview = False
+
+    def tearDown(self):
+        self.detail.attachment.delete(save=False)
+
+    def test_extracted_on_publish(self):
+        """The text should be extracted when the page is published, and be searchable."""
+        self.assertEqual(list(self.index._get_children(self.request)), [])
+
+        self.detail.save_revision().publish()
+        self.detail.refresh_from_db()
+
+        self.assertEqual(self.detail.attachment_text, "Quarterly budget discussion")
+        self.assertFalse(self.detail.attachment_text_outdated())
+        self.assertEqual(list(self.index._get_children(self.request)), [self.detail])
+
+    def test_not_extracted_again(self):
+        """Republishing with the same attachment shouldn't extract the text again."""
+        self.detail.save_revision().publish()
+
+        with patch("wagtail_library.abstract_models.extract_text") as extract_text:
+            self.detail.save_revision().publish()
+        extract_text.assert_not_called()
+
+    def test_attachment_text_survives_save(self):
+        """Saving the page should keep the attachment text in the search vector."""
+        self.detail.update_attachment_text()
+        self.detail.title = "Renamed"
+        self.detail.save()
+
+        self.assertEqual(list(self.index._get_children(self.request)), [self.detail])
+
+
+@override_settings(WAGTAIL_LIBRARY_TASK_RUNNER="tests.test_models.run_now")
+@patch("wagtail_library.tasks.transaction.on_commit", lambda callback: callback())
+class TestLibraryDetailAttachmentPreview(TestCase):
+    """Tests for attachment previews rendered in the background."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.index = LibraryIndexFactory.create(parent=None)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def create(self, content=None, name="chart.png"):
+        return LibraryDetailFactory.create(
+            parent=self.index, attachment=SimpleUploadedFile(name, content or make_png(800, 400))
+        )
+
+    def publish(self, detail):
+        detail.save_revision().publish()
+        detail.refresh_from_db()
+        return detail
+
+    def test_rendered_on_publish(self):
+        """A preview should be stored once the page is published, not before."""
+        detail = self.create()
+        self.assertIsNone(detail.get_attachment_preview())
+
+        self.publish(detail)
+
+        preview = detail.get_attachment_preview()
+        self.assertEqual(
+            preview.name, "previews/{}.jpg".format(blob_name(detail.attachment_sha256))
+        )
+        self.assertEqual(Image.open(preview.path).size, (320, 160))
+        self.assertFalse(detail.attachment_preview_outdated())
+
+    def test_reused_for_same_file(self):
+        """Attachments with the same content should share a preview without rendering."""
+        first = self.publish(self.create())
+
+        with patch("wagtail_library.abstract_models.render_preview") as render_preview:
+            second = self.publish(self.create(name="copy.png"))
+        render_preview.assert_not_called()
+        self.assertEqual(second.attachment_preview.name, first.attachment_preview.name)
+
+    def test_replaced_attachment(self):
+        """The preview of a replaced attachment should never be shown."""
+        detail = self.publish(self.create())
+        detail.attachment = SimpleUploadedFile("other.png", make_png(10, 10))
+        detail.save()
+
+        self.assertIsNone(detail.get_attachment_preview())
+        self.assertTrue(detail.attachment_preview_outdated())
+
+    def test_unsupported_type(self):
+        """No preview should be rendered for attachments of other types."""
+        detail = self.publish(self.create(b"Minutes", name="minutes.txt"))
+
+        self.assertFalse(detail.attachment_preview_outdated())
+        self.assertIsNone(detail.get_attachment_preview())
+
+    def test_invalidates_listing(self):
+        """Storing a preview should invalidate the cached listings of the parent."""
+        detail = self.create()
+        generation = get_generation(self.index.path)
+        self.publish(detail)
+
+        self.assertNotEqual(get_generation(self.index.path), generation)
+
+    def test_placeholder(self):
+        """Templates should show a placeholder until a preview is stored."""
+        detail = self.create()
+        template = "wagtail_library/attachment_preview.html"
+
+        self.assertIn("placeholder", render_to_string(template, {"page": detail}))
+        self.publish(detail)
+        html = render_to_string(template, {"page": detail})
+        self.assertIn(detail.attachment_preview.url, html)
+
+
+class TestLibraryIndexFacets(TestCase):
+    """Tests for faceted filtering of library index pages."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(paginate_by=10, parent=None)
+        self.pdf = self.create_detail("report.pdf", 2018, ["finance", "annual"])
+        self.doc = self.create_detail("minutes.doc", 2019, ["finance"])
+        self.pdf_2019 = self.create_detail("budget.pdf", 2019, [])
+
+    def create_detail(self, attachment, year, tags):
+        detail = LibraryDetailFactory.create(parent=self.index, attachment=attachment)
+        detail.tags.add(*tags)
+        detail.save()
+        LibraryDetail.objects.filter(pk=detail.pk).update(
+            first_published_at=datetime(year, 6, 1, tzinfo=utc),
+            attachment_extension=attachment.split(".")[1],
+        )
+        return detail
+
+    def get_request(self, **params):
+        request = RequestFactory().get("/", params)
+        request.is_preview = False
+        return request
+
+    def test_facet_counts(self):
+        """Every facet should be counted in a single query."""
+        with self.assertNumQueries(1):
+            counts = self.index.get_facet_counts(self.get_request())
+
+        self.assertEqual(sorted(counts["year"]), [("2018", 1), ("2019", 2)])
+        self.assertEqual(sorted(counts["type"]), [("doc", 1), ("pdf", 2)])
+        self.assertEqual(sorted(counts["tag"]), [("annual", 1), ("finance", 2)])
+
+    def test_facet_counts_cached(self):
+        """Counts should be cached until a child is published."""
+        self.index.get_facet_counts(self.get_request())
+        with self.assertNumQueries(0):
+            self.index.get_facet_counts(self.get_request())
+
+        self.pdf.save_revision().publish()
+        with self.assertNumQueries(1):
+            self.index.get_facet_counts(self.get_request())
+
+    def test_selected_facets(self):
+        """Selections should filter the children and the counts of other facets."""
+        request = self.get_request(type="pdf", tag="finance")
+
+        self.assertEqual(list(self.index._get_children(request)), [self.pdf])
+        counts = self.index.get_facet_counts(request)
+        self.assertEqual(sorted(counts["type"]), [("doc", 1), ("pdf", 1)])
+        self.assertEqual(counts["year"], [("2018", 1)])
+        self.assertEqual(sorted(counts["tag"]), [("annual", 1), ("finance", 1)])
+
+    def test_many_values(self):
+        """Children matching several selected values should be listed once."""
+        request = self.get_request(tag=["finance", "annual"])
+
+        self.assertEqual(list(self.index._get_children(request)), [self.pdf, self.doc])
+
+    def test_facet_context(self):
+        """Options should be ordered, and link to the listing with them toggled."""
+        context = self.index.get_context(self.get_request(year="2019", page="2"))
+        year = context["facets"][0]
+
+        self.assertEqual(year["label"], "Year")
+        self.assertEqual(
+            [(option["value"], option["selected"]) for option in year["options"]],
+            [("2019", True), ("2018", False)],
+        )
+        self.assertEqual(year["options"][0]["querystring"], "")
+        self.assertEqual(year["options"][1]["querystring"], "year=2019&year=2018")
+        self.assertEqual(context["querystring"], "year=2019")
+
+
+class TestLibraryIndexSorting(TestCase):
+    """Tests for sorting library index listings."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(paginate_by=10, parent=None)
+        self.details = [
+            LibraryDetailFactory.create(parent=self.index, title=title) for title in "BCA"
+        ]
+        for year, detail in zip((2019, 2017, 2018), self.details):
+            LibraryDetail.objects.filter(pk=detail.pk).update(
+                first_published_at=datetime(year, 1, 1, tzinfo=utc)
+            )
+
+    def get_children(self, **params):
+        request = RequestFactory().get("/", params)
+        request.is_preview = False
+        return [child.title for child in self.index._get_children(request)]
+
+    def test_sort(self):
+        """Children should be sorted by the selected option."""
+        self.assertEqual(self.get_children(), ["B", "C", "A"])
+        self.assertEqual(self.get_children(sort="newest"), ["B", "A", "C"])
+        self.assertEqual(self.get_children(sort="oldest"), ["C", "A", "B"])
+        self.assertEqual(self.get_children(sort="title"), ["A", "B", "C"])
+
+    def test_sort_popular(self):
+        """Children should be sortable by their flushed download counts."""
+        for count, detail in zip((1, 5, 3), self.details):
+            LibraryDetail.objects.filter(pk=detail.pk).update(download_count=count)
+
+        self.assertEqual(self.get_children(sort="popular"), ["C", "A", "B"])
+
+    def test_unknown_sort(self):
+        """Orderings that aren't sort options should be ignored."""
+        self.assertEqual(self.get_children(sort="-body"), ["B", "C", "A"])
+
+    def test_get_ordering(self):
+        """The path should be added in the direction of the last field."""
+        self.assertEqual(self.index.get_ordering("newest"), ["-first_published_at", "-path"])
+        self.assertEqual(self.index.get_ordering("title"), ["title", "path"])
+
+    def test_sort_context(self):
+        """Sort options should link to the first page of the sorted listing."""
+        request = RequestFactory().get("/", {"sort": "title", "page": 2, "type": "pdf"})
+        request.is_preview = False
+        options = self.index.get_context(request)["sort_options"]
+
+        self.assertEqual(
+            [option["key"] for option in options], ["newest", "oldest", "title", "popular"]
+        )
+        self.assertTrue(options[2]["selected"])
+        self.assertEqual(options[0]["querystring"], "sort=newest&type=pdf")
+
+    def analyze(self):
+        """Updates the planner's statistics of the page tables."""
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE wagtailcore_page, wagtail_library_librarydetail")
+
+    def get_plan(self, sort):
+        """Returns the query plan of the first page of the listing."""
+        request = RequestFactory().get("/", {"sort": sort} if sort else {})
+        request.is_preview = False
+        sql, params = self.index._get_children(request)[:10].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + sql, params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def test_sort_uses_index(self):
+        """Each sort option should be read in order from a listing index."""
+        plans = {}
+        # ANALYZE updates row estimates even when the transaction is rolled back, so they're
+        # updated again once the children are gone, not to slow down the following tests
+        self.addCleanup(self.analyze)
+        with transaction.atomic():
+            # Enough children, here and in another index, for the planner to prefer reading
+            # the listing indexes to scanning and sorting, as it would in production
+            for parent in (self.index, LibraryIndexFactory.create(parent=None)):
+                bulk_create_children(
+                    parent,
+                    [
+                        LibraryDetail(title="Item {}".format(number), slug="item-{}".format(number))
+                        for number in range(2000)
+                    ],
+                )
+            self.analyze()
+            for sort in ("newest", "title", None):
+                plans[sort] = self.get_plan(sort)
+            transaction.set_rollback(True)
+
+        for sort, index in (
+            ("newest", "wagtail_library_listing_published"),
+            ("title", "wagtail_library_listing_title"),
+            (None, "wagtail_library_listing_path"),
+        ):
+            self.assertIn(index, plans[sort])
+            self.assertNotIn("Sort", plans[sort])
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library paginators."""
+
+from __future__ import unicode_literals
+
+import base64
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.paginator import PageNotAnInteger
+from django.db.models import FloatField, Value
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from wagtail_library.models import LibraryDetail
+from wagtail_library.paginators import (
+    CachedCountPaginator,
+    EstimatedCountPaginator,
+    KeysetPage,
+    KeysetPaginator,
+)
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+class TestKeysetPaginator(TestCase):
+    """Tests for the KeysetPaginator."""
+
+    def setUp(self):
+        self.index = LibraryIndexFactory.create(paginate_by=2, parent=None)
+        self.details = [LibraryDetailFactory.create(parent=self.index) for _ in range(5)]
+        self.queryset = LibraryDetail.objects.child_of(self.index)
+
+    def test_first_page(self):
+        """The first page should be returned when no cursor is given."""
+        page = KeysetPaginator(self.queryset, 2).page()
+
+        self.assertIsInstance(page, KeysetPage)
+        self.assertEqual(list(page), self.details[:2])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+        self.assertIsNone(page.previous_cursor)
+
+    def test_walk_forwards_and_backwards(self):
+        """Following the cursors should visit every item exactly once, in order."""
+        paginator = KeysetPaginator(self.queryset, 2)
+        pages = [paginator.page(1)]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([item for page in pages for item in page], self.details)
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), self.details[2:4])
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+
+        first = paginator.page(previous.previous_cursor)
+        self.assertEqual(list(first), self.details[:2])
+        self.assertFalse(first.has_previous())
+
+    def test_custom_ordering_with_nulls(self):
+        """Explicit orderings over nullable columns should not skip or repeat items."""
+        now = timezone.now()
+        for offset, detail in enumerate(self.details[:3]):
+            detail.first_published_at = now - timedelta(days=offset)
+            detail.save()
+
+        paginator = KeysetPaginator(self.queryset, 2, ordering=["-first_published_at"])
+        expected = list(self.queryset.order_by("-first_published_at", "-pk"))
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        """Invalid cursors should raise PageNotAnInteger."""
+        paginator = KeysetPaginator(self.queryset, 2)
+
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page("not-a-cursor")
+
+    def test_cursor_of_wrong_types(self):
+        """Well-formed cursors holding values of the wrong types should be invalid too."""
+        paginator = KeysetPaginator(self.queryset, 2, ordering=["-first_published_at"])
+        cursor = base64.urlsafe_b64encode(json.dumps([1, ["garbage", "x"]]).encode()).decode()
+
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page(cursor)
+
+    def test_annotation_cursor_of_wrong_types(self):
+        """Values of annotations should be converted to their type, or the cursor rejected."""
+        queryset = self.queryset.annotate(rank=Value(0.5, output_field=FloatField()))
+        paginator = KeysetPaginator(queryset, 2, ordering=["-rank", "pk"])
+
+        for value in ("abc", [1, 2]):
+            cursor = base64.urlsafe_b64encode(json.dumps([1, [value, 5]]).encode()).decode()
+            with self.assertRaises(PageNotAnInteger):
+                paginator.page(cursor)
+        cursor = base64.urlsafe_b64encode(json.dumps([1, ["0.5", self.details[1].pk]]).encode())
+        self.assertEqual(list(paginator.page(cursor.decode())), self.details[2:4])
+
+    def test_constant_queries(self):
+        """Deep pages should cost a single query."""
+        paginator = KeysetPaginator(self.queryset, 2)
+        cursor = paginator.page(paginator.page().next_cursor).next_cursor
+
+        with self.assertNumQueries(1):
+            paginator.page(cursor)
+
+    def test_index_context(self):
+        """get_context should expose the cursors when using the keyset paginator."""
+        self.index.paginator_class = KeysetPaginator
+        request = RequestFactory().get("")
+        request.is_preview = False
+        context = self.index.get_context(request)
+
+        self.assertEqual(list(context["children"]), self.details[:2])
+        self.assertIsNotNone(context["next_cursor"])
+        self.assertIsNone(context["previous_cursor"])
+
+        request = RequestFactory().get("", {"page": context["next_cursor"]})
+        request.is_preview = False
+        context = self.index.get_context(request)
+
+        self.assertEqual(list(context["children"]), self.details[2:4])
+        self.assertIsNotNone(context["previous_cursor"])
+
+        # Tampered cursors fall back to the first page
+        self.index.sort_options = [("newest", "Newest", ["-first_published_at"])]
+        cursor = base64.urlsafe_b64encode(json.dumps([1, ["garbage", "x"]]).encode()).decode()
+        request = RequestFactory().get("", {"sort": "newest", "page": cursor})
+        request.is_preview = False
+        context = self.index.get_context(request)
+
+        self.assertEqual(len(context["children"]), 2)
+        self.assertIsNone(context["previous_cursor"])
+
+
+class TestCachedCountPaginator(TestCase):
+    """Tests for the CachedCountPaginator."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(paginate_by=2, parent=None)
+        self.index.paginator_class = CachedCountPaginator
+        for _ in range(3):
+            LibraryDetailFactory.create(parent=self.index)
+        self.request = RequestFactory().get("")
+        self.request.is_preview = False
+
+    def test_count_is_cached(self):
+        """The count query should only run on the first request."""
+        children = self.index._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 3)
+
+        with self.assertNumQueries(0):
+            paginator = self.index.get_paginator(children, 2, **self.index.get_paginator_kwargs())
+            self.assertEqual(paginator.count, 3)
+
+    def test_count_per_filter(self):
+        """Different filters should be counted separately."""
+        children = self.index._get_children(self.request)
+        kwargs = self.index.get_paginator_kwargs()
+
+        self.assertEqual(CachedCountPaginator(children, 2, **kwargs).count, 3)
+        self.assertEqual(CachedCountPaginator(children.filter(pk=0), 2, **kwargs).count, 0)
+
+    def test_publish_invalidates_count(self):
+        """Adding or unpublishing a child should invalidate the cached count."""
+        children = self.index._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 3)
+
+        detail = LibraryDetailFactory.create(parent=self.index)
+        children = self.index._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 4)
+
+        detail.unpublish()
+        children = self.index._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 3)
+
+    def test_move_invalidates_count(self):
+        """Moving a child to another index should invalidate both counts."""
+        other = LibraryIndexFactory.create(paginate_by=2, parent=None)
+        other.paginator_class = CachedCountPaginator
+        children = self.index._get_children(self.request)
+        other_children = other._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 3)
+        self.assertEqual(other.paginate_queryset(other_children, 1)[1].count, 0)
+
+        detail = LibraryDetail.objects.child_of(self.index).first()
+        detail.move(other, pos="last-child")
+
+        children = self.index._get_children(self.request)
+        other_children = other._get_children(self.request)
+        self.assertEqual(self.index.paginate_queryset(children, 1)[1].count, 2)
+        self.assertEqual(other.paginate_queryset(other_children, 1)[1].count, 1)
+
+    def test_estimated_count(self):
+        """EstimatedCountPaginator should use the planner estimate above its threshold."""
+        children = self.index._get_children(self.request)
+        paginator = EstimatedCountPaginator(children, 2)
+
+        self.assertIsInstance(paginator.get_estimated_count(), int)
+        paginator.estimate_threshold = 0
+        self.assertEqual(paginator.count, paginator.get_estimated_count())
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library attachment previews."""
+
+from __future__ import unicode_literals
+
+import io
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from wagtail_library.previews import can_render_preview, render_preview
+
+
+def make_png(width, height):
+    """Returns the bytes of a PNG image of the given size."""
+    output = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 255)).save(output, "PNG")
+    return output.getvalue()
+
+
+class TestRenderPreview(SimpleTestCase):
+    """Tests for render_preview."""
+
+    def test_image(self):
+        """Images should be scaled down to fit the preview size, as JPEG."""
+        preview = Image.open(io.BytesIO(render_preview(make_png(800, 400), "image/png", 100)))
+
+        self.assertEqual(preview.format, "JPEG")
+        self.assertEqual(preview.size, (100, 50))
+
+    def test_unsupported(self):
+        """Types without a renderer should get no preview."""
+        self.assertFalse(can_render_preview("text/plain"))
+        self.assertIsNone(render_preview(b"Minutes", "text/plain"))
+
+    def test_broken_file(self):
+        """Files that can't be read should get no preview rather than an error."""
+        self.assertIsNone(render_preview(b"Not a PNG", "image/png"))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library sitemaps."""
+
+from __future__ import unicode_literals
+
+from django.contrib.sites.requests import RequestSite
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.test import RequestFactory, TestCase, override_settings
+from wagtail.core.models import Site
+
+from wagtail_library.sitemaps import LibrarySitemap
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+@override_settings(WAGTAIL_LIBRARY_SITEMAP_CHUNK_SIZE=2)
+class TestLibrarySitemap(TestCase):
+    """Tests for the chunked library sitemap."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.details = LibraryDetailFactory.create_batch(4, parent=self.index)
+        self.draft = LibraryDetailFactory.create(parent=self.index, live=False)
+        self.site = Site.objects.create(
+            hostname="testserver", root_page=self.index, is_default_site=True
+        )
+        self.request = RequestFactory().get("/sitemap.xml")
+        self.request.site = self.site
+
+    def get_urls(self, page):
+        sitemap = LibrarySitemap(self.request)
+        return sitemap.get_urls(page=page, site=RequestSite(self.request))
+
+    def get_all_urls(self):
+        num_pages = LibrarySitemap(self.request).paginator.num_pages
+        return {
+            url["location"]: url for page in range(1, num_pages + 1) for url in self.get_urls(page)
+        }
+
+    def test_chunks(self):
+        """Live library pages should be listed once, in chunks of page ID ranges."""
+        sitemap = LibrarySitemap(self.request)
+
+        self.assertEqual(
+            sitemap.paginator.num_pages, len({page.pk // 2 for page in [self.index] + self.details})
+        )
+        self.assertEqual(
+            sorted(self.get_all_urls()),
+            sorted(page.get_full_url() for page in [self.index] + self.details),
+        )
+        for page in range(1, sitemap.paginator.num_pages + 1):
+            self.assertLessEqual(len(self.get_urls(page)), 2)
+
+    def test_lastmod(self):
+        """Entries should be last modified when their page was last published."""
+        detail = self.details[0]
+        detail.save_revision().publish()
+        detail.refresh_from_db()
+
+        url = self.get_all_urls()[detail.get_full_url()]
+        self.assertEqual(url["lastmod"], detail.last_published_at)
+
+    def get_page(self, detail):
+        """Returns the number of the sitemap page listing the detail page."""
+        for page in range(1, LibrarySitemap(self.request).paginator.num_pages + 1):
+            if detail.get_full_url() in [url["location"] for url in self.get_urls(page)]:
+                return page
+
+    def test_cache(self):
+        """Chunks should be cached until a page in their range changes."""
+        page = self.get_page(self.details[0])
+
+        with self.assertNumQueries(0):
+            self.get_urls(page)
+
+        self.details[0].unpublish()
+        locations = [url["location"] for url in self.get_urls(page)]
+        self.assertNotIn(self.details[0].get_full_url(), locations)
+
+    def test_empty_chunks(self):
+        """Chunks without live library pages should be left out of the sitemap index."""
+        LibraryDetailFactory.create_batch(6, parent=self.index, live=False)
+        added = LibraryDetailFactory.create(parent=self.index)
+        num_pages = LibrarySitemap(self.request).paginator.num_pages
+
+        self.assertTrue(all(self.get_urls(page) for page in range(1, num_pages + 1)))
+        self.assertEqual(self.get_page(added), num_pages)
+
+        added.unpublish()
+        self.assertEqual(LibrarySitemap(self.request).paginator.num_pages, num_pages - 1)
+
+    def test_empty_page(self):
+        """Chunks past the last page should not exist."""
+        with self.assertRaises(EmptyPage):
+            self.get_urls(LibrarySitemap(self.request).paginator.num_pages + 1)
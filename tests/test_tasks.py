@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library background tasks."""
+
+from __future__ import unicode_literals
+
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+from mock import patch
+
+from wagtail_library.tasks import close_pool, run_in_background
+
+
+def write_pid(path):
+    """Task writing the ID of the process running it."""
+    with open(path + ".tmp", "w") as pid_file:
+        pid_file.write(str(os.getpid()))
+    os.rename(path + ".tmp", path)
+
+
+@patch("wagtail_library.tasks.transaction.on_commit", lambda callback: callback())
+class TestRunInBackground(SimpleTestCase):
+    """Tests for run_in_background."""
+
+    def test_thread_pool(self):
+        """Tasks should run in a background thread by default."""
+        done = threading.Event()
+        threads = []
+
+        def task(value):
+            threads.append((threading.current_thread(), value))
+            done.set()
+
+        run_in_background(task, 1)
+
+        self.assertTrue(done.wait(5))
+        self.assertIsNot(threads[0][0], threading.current_thread())
+        self.assertEqual(threads[0][1], 1)
+
+    @override_settings(WAGTAIL_LIBRARY_TASK_RUNNER="wagtail_library.tasks.run_in_process_pool")
+    def test_process_pool(self):
+        """Tasks should run in a background worker process with run_in_process_pool."""
+        self.addCleanup(close_pool)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pid")
+            run_in_background(write_pid, path)
+
+            for attempt in range(100):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.1)
+            with open(path) as pid_file:
+                pid = int(pid_file.read())
+
+        self.assertNotEqual(pid, os.getpid())
+
+    @override_settings(WAGTAIL_LIBRARY_TASK_RUNNER="tasks.run")
+    def test_task_runner(self):
+        """Tasks should be handed to the configured runner."""
+        with patch("wagtail_library.tasks.import_string") as import_string:
+            run_in_background(len, "abc")
+        import_string.assert_called_once_with("tasks.run")
+        import_string.return_value.assert_called_once_with(len, "abc")
+
+    def test_after_commit(self):
+        """Tasks should only be started once the transaction commits."""
+        with patch("wagtail_library.tasks.transaction.on_commit") as on_commit:
+            with patch("wagtail_library.tasks.get_executor") as get_executor:
+                run_in_background(len, "abc")
+        get_executor.assert_not_called()
+        on_commit.assert_called_once()
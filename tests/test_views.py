@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""Tests for wagtail_library views."""
+
+from __future__ import unicode_literals
+
+import base64
+import io
+import json
+import os
+import zipfile
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from mock import patch
+from wagtail.core.models import PageViewRestriction, Site
+
+from wagtail_library.views import RangeNotSatisfiable, parse_range
+
+from tests.factories import LibraryIndexFactory, LibraryDetailFactory
+
+
+BASE_DIR = os.path.join(settings.PROJECT_DIR, "tests/assets")
+
+
+class TestParseRange(TestCase):
+    """Tests for the Range header parser."""
+
+    def test_ranges(self):
+        """Single byte ranges should be parsed and clamped to the file."""
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+
+    def test_ignored_ranges(self):
+        """Malformed and multiple ranges should be ignored."""
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(parse_range("items=0-1", 100))
+        self.assertIsNone(parse_range("bytes=9-0", 100))
+
+    def test_unsatisfiable_ranges(self):
+        """Ranges beyond the end of the file should not be satisfiable."""
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=100-", 100)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=-0", 100)
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR)
+class TestAttachmentDownload(TestCase):
+    """Tests for the LibraryDetail download route."""
+
+    def setUp(self):
+        with open(os.path.join(BASE_DIR, "image.jpg"), "rb") as image:
+            self.content = image.read()
+        index = LibraryIndexFactory.create(parent=None)
+        self.detail = LibraryDetailFactory.create(
+            parent=index, attachment=SimpleUploadedFile("download.jpg", self.content, "image/jpeg")
+        )
+        self.factory = RequestFactory()
+        # Keep downloads out of the process-wide buffer, which is flushed at exit
+        patcher = patch("wagtail_library.abstract_models.record_download")
+        self.record_download = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.detail.attachment.delete(save=False)
+
+    def download(self, **headers):
+        """Call the download route with the given request headers."""
+        request = self.factory.get("/download/", **headers)
+        view, args, kwargs = self.detail.resolve_subpage("/download/")
+        return self.detail.serve(request, view, args, kwargs)
+
+    def test_download(self):
+        """The whole attachment should be streamed by default."""
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Content-Length"], str(len(self.content)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("download", response["Content-Disposition"])
+        self.assertIn("ETag", response)
+
+    def test_download_counted(self):
+        """Whole downloads should be counted, resumed and revalidated ones shouldn't."""
+        etag = self.download()["ETag"]
+        self.download(HTTP_RANGE="bytes=10-19")
+        self.download(HTTP_IF_NONE_MATCH=etag)
+
+        self.record_download.assert_called_once_with(self.detail)
+
+    def test_range(self):
+        """Range requests should get the requested bytes only."""
+        response = self.download(HTTP_RANGE="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/{}".format(len(self.content)))
+
+    def test_range_not_satisfiable(self):
+        """Ranges beyond the end of the file should get a 416."""
+        response = self.download(HTTP_RANGE="bytes={}-".format(len(self.content)))
+
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range_mismatch(self):
+        """A stale If-Range validator should get the whole file."""
+        response = self.download(HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        """Matching validators should get a 304."""
+        etag = self.download()["ETag"]
+
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_not_modified_since(self):
+        """Requests with If-Modified-Since should get a 304 if nothing changed."""
+        self.detail.save_revision().publish()
+        self.detail.refresh_from_db()
+        since = http_date(self.detail.last_published_at.timestamp())
+
+        self.assertEqual(self.download(HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+
+    @override_settings(
+        WAGTAIL_LIBRARY_SENDFILE_BACKEND="x-accel-redirect",
+        WAGTAIL_LIBRARY_SENDFILE_URL_PREFIX="/protected/",
+    )
+    def test_x_accel_redirect(self):
+        """Downloads should be handed off to nginx when configured."""
+        response = self.download()
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/" + self.detail.attachment.name)
+        self.assertEqual(response.content, b"")
+
+    @override_settings(WAGTAIL_LIBRARY_SENDFILE_BACKEND="x-sendfile")
+    def test_x_sendfile(self):
+        """Downloads should be handed off with X-Sendfile when configured."""
+        response = self.download()
+
+        self.assertEqual(response["X-Sendfile"], self.detail.attachment.path)
+
+
+class TestLibraryIndexApi(TestCase):
+    """Tests for the LibraryIndex JSON listing and export routes."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.index.api_page_size = 2
+        self.details = [
+            LibraryDetailFactory.create(parent=self.index, title="Item {}".format(number))
+            for number in range(3)
+        ]
+        self.site = Site.objects.create(
+            hostname="testserver", root_page=self.index, is_default_site=True
+        )
+        self.factory = RequestFactory()
+
+    def get(self, path, **params):
+        """Call the route of the path, with the given querystring."""
+        request = self.factory.get(path, params)
+        request.site = self.site
+        request.session = {}
+        request.user = AnonymousUser()
+        view, args, kwargs = self.index.resolve_subpage(path)
+        return self.index.serve(request, view, args, kwargs)
+
+    def test_routes(self):
+        """The JSON routes should be resolved, without hiding children."""
+        request = self.factory.get("/")
+
+        self.assertEqual(self.index.route(request, ["json"]).args[0].__name__, "listing_json")
+        self.assertEqual(self.index.route(request, ["json", "export"]).page, self.index)
+        self.assertEqual(
+            self.index.route(request, [self.details[0].slug]).page, self.details[0].specific
+        )
+
+    def test_listing(self):
+        """Pages of children should be linked by cursors."""
+        # The view restrictions, the children and the site root paths
+        with self.assertNumQueries(3):
+            first = json.loads(self.get("/json/").content.decode())
+        cursor = first["next"].split("cursor=")[1]
+        second = json.loads(self.get("/json/", cursor=cursor).content.decode())
+
+        self.assertEqual([child["title"] for child in first["results"]], ["Item 0", "Item 1"])
+        self.assertEqual([child["title"] for child in second["results"]], ["Item 2"])
+        self.assertIsNone(first["previous"])
+        self.assertIsNone(second["next"])
+        self.assertEqual(first["results"][0]["download_url"], self.details[0].get_download_url())
+        self.assertIn("attachment_size", first["results"][0])
+
+    def test_listing_filters(self):
+        """The listing should be searched, filtered and sorted like the HTML listing."""
+        self.index.sort_options = [("title", "Title", ["-title"])]
+        data = json.loads(self.get("/json/", sort="title").content.decode())
+
+        self.assertEqual([child["title"] for child in data["results"]], ["Item 2", "Item 1"])
+        self.assertIn("sort=title", data["next"])
+
+    def test_invalid_cursor(self):
+        """Invalid cursors should be rejected."""
+        self.assertEqual(self.get("/json/", cursor="nonsense").status_code, 400)
+
+        # Well-formed cursors whose values can't be converted to the sort fields' types
+        self.index.sort_options = [("newest", "Newest", ["-first_published_at"])]
+        cursor = base64.urlsafe_b64encode(json.dumps([1, ["garbage", "x"]]).encode()).decode()
+        response = self.get("/json/", sort="newest", cursor=cursor)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content.decode()), {"error": "Invalid cursor"})
+
+    def test_restricted(self):
+        """Items below a view restriction the visitor hasn't passed should be left out."""
+        self.index.list_descendants = True
+        section = LibraryIndexFactory.create(parent=self.index)
+        secret = LibraryDetailFactory.create(parent=section, title="Secret")
+        PageViewRestriction.objects.create(page=section, restriction_type=PageViewRestriction.LOGIN)
+        self.index.api_page_size = 10
+        listing = json.loads(self.get("/json/").content.decode())
+        export = json.loads(b"".join(self.get("/json/export/").streaming_content).decode())
+
+        self.assertEqual(len(listing["results"]), 3)
+        self.assertNotIn(secret.pk, [child["id"] for child in listing["results"]])
+        self.assertEqual([child["id"] for child in export], [detail.pk for detail in self.details])
+
+    def test_tampered_search_cursor(self):
+        """Cursors of searches whose rank isn't a number should be rejected."""
+        data = json.loads(self.get("/json/", q="item").content.decode())
+        cursor = data["next"].split("cursor=")[1].split("&")[0]
+        forward, values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+        for rank in ("abc", [1, 2]):
+            tampered = json.dumps([forward, [rank] + values[1:]]).encode()
+            response = self.get("/json/", q="item", cursor=base64.urlsafe_b64encode(tampered))
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(WAGTAIL_LIBRARY_EXPORT_CHUNK_SIZE=2)
+    def test_export(self):
+        """Exports should stream every child as a JSON array."""
+        response = self.get("/json/export/")
+        data = json.loads(b"".join(response.streaming_content).decode())
+
+        self.assertEqual([child["id"] for child in data], [detail.pk for detail in self.details])
+
+    def test_empty_export(self):
+        """Exports of empty listings should be empty arrays."""
+        response = self.get("/json/export/", q="nothing matches this")
+
+        self.assertEqual(b"".join(response.streaming_content), b"[]")
+
+
+@override_settings(MEDIA_ROOT=BASE_DIR)
+class TestLibraryIndexDownloadAll(TestCase):
+    """Tests for the LibraryIndex download all route."""
+
+    def setUp(self):
+        with open(os.path.join(BASE_DIR, "image.jpg"), "rb") as image:
+            self.content = image.read()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.image = LibraryDetailFactory.create(
+            parent=self.index,
+            title="Photo",
+            attachment=SimpleUploadedFile("photo.jpg", self.content, "image/jpeg"),
+        )
+        self.text = LibraryDetailFactory.create(
+            parent=self.index,
+            title="Notes",
+            attachment=SimpleUploadedFile("notes.txt", b"Notes " * 100, "text/plain"),
+        )
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.image.attachment.delete(save=False)
+        self.text.attachment.delete(save=False)
+
+    def download_all(self, session=None, **params):
+        """Call the download all route and read the archive."""
+        request = self.factory.get("/download/", params)
+        request.session = session or {}
+        request.user = AnonymousUser()
+        view, args, kwargs = self.index.resolve_subpage("/download/")
+        response = self.index.serve(request, view, args, kwargs)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_download_all(self):
+        """Every attachment should be archived under its page's slug."""
+        archive = self.download_all()
+        photo = archive.getinfo(self.image.slug + ".jpg")
+
+        self.assertEqual(archive.read(photo), self.content)
+        self.assertEqual(photo.compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.read(self.text.slug + ".txt"), b"Notes " * 100)
+        self.assertEqual(archive.getinfo(self.text.slug + ".txt").compress_type, 8)
+
+    def test_download_filtered(self):
+        """Only the attachments of the listed children should be archived."""
+        archive = self.download_all(q="notes")
+
+        self.assertEqual(archive.namelist(), [self.text.slug + ".txt"])
+
+    def test_duplicate_slugs(self):
+        """Items of several indexes sharing a slug should get entries of their own."""
+        self.index.list_descendants = True
+        section = LibraryIndexFactory.create(parent=self.index)
+        duplicate = LibraryDetailFactory.create(
+            parent=section,
+            slug=self.text.slug,
+            attachment=SimpleUploadedFile("other.txt", b"Other notes", "text/plain"),
+        )
+        self.addCleanup(duplicate.attachment.delete, save=False)
+
+        archive = self.download_all()
+
+        self.assertEqual(
+            archive.namelist(),
+            [self.image.slug + ".jpg", self.text.slug + ".txt", self.text.slug + "-2.txt"],
+        )
+        self.assertEqual(archive.read(self.text.slug + "-2.txt"), b"Other notes")
+
+    def test_restricted(self):
+        """Items below a view restriction the visitor hasn't passed should be left out."""
+        self.index.list_descendants = True
+        section = LibraryIndexFactory.create(parent=self.index)
+        secret = LibraryDetailFactory.create(
+            parent=section, attachment=SimpleUploadedFile("secret.txt", b"TOP SECRET")
+        )
+        self.addCleanup(secret.attachment.delete, save=False)
+        restriction = PageViewRestriction.objects.create(
+            page=section, restriction_type=PageViewRestriction.PASSWORD, password="secret"
+        )
+
+        self.assertNotIn(secret.slug + ".txt", self.download_all().namelist())
+        session = {restriction.passed_view_restrictions_session_key: [restriction.pk]}
+        self.assertIn(secret.slug + ".txt", self.download_all(session).namelist())
+
+    def test_missing_attachment(self):
+        """Attachments that can't be read should be left out."""
+        self.image.attachment.storage.delete(self.image.attachment.name)
+
+        with self.assertLogs("wagtail_library.abstract_models", "WARNING"):
+            archive = self.download_all()
+
+        self.assertEqual(archive.namelist(), [self.text.slug + ".txt"])
+
+
+class TestConditionalRequests(TestCase):
+    """Tests for the validators of library index and detail pages."""
+
+    def setUp(self):
+        cache.clear()
+        self.index = LibraryIndexFactory.create(parent=None)
+        self.detail = LibraryDetailFactory.create(parent=self.index)
+        self.site = Site.objects.create(
+            hostname="testserver", root_page=self.index, is_default_site=True
+        )
+        self.factory = RequestFactory()
+
+    def serve(self, page, **headers):
+        """Serve the page for an anonymous GET request with the given headers."""
+        request = self.factory.get("/", **headers)
+        request.site = self.site
+        request.is_preview = False
+        response = page.serve(request)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def test_index_validators(self):
+        """Index listings should carry an ETag, but no modification date."""
+        self.detail.save_revision().publish()
+        self.detail.refresh_from_db()
+        response = self.serve(self.index)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_index_child_removed_since(self):
+        """Removing a child should never get If-Modified-Since requests a 304."""
+        since = http_date(timezone.now().timestamp() + 60)
+        for detail in (self.detail, LibraryDetailFactory.create(parent=self.index)):
+            detail.save_revision().publish()
+        self.serve(self.index)
+        self.detail.unpublish()
+
+        self.assertEqual(self.serve(self.index, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_index_not_modified(self):
+        """An unchanged index should get a 304 without loading its children."""
+        etag = self.serve(self.index)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.serve(self.index, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_index_child_changes(self):
+        """Adding or unpublishing a child should change the index's ETag."""
+        etag = self.serve(self.index)["ETag"]
+        detail = LibraryDetailFactory.create(parent=self.index)
+        added = self.serve(self.index, HTTP_IF_NONE_MATCH=etag)
+        detail.unpublish()
+        removed = self.serve(self.index, HTTP_IF_NONE_MATCH=added["ETag"])
+
+        self.assertEqual(added.status_code, 200)
+        self.assertEqual(removed.status_code, 200)
+        self.assertNotEqual(removed["ETag"], etag)
+
+    def test_index_section_moved(self):
+        """Moving a section out of an index listing its descendants should change its ETag."""
+        self.index.list_descendants = True
+        self.index.save()
+        section = LibraryIndexFactory.create(parent=self.index)
+        LibraryDetailFactory.create(parent=section)
+        etag = self.serve(self.index)["ETag"]
+        section.move(LibraryIndexFactory.create(parent=None), pos="last-child")
+        self.index.refresh_from_db()
+
+        self.assertEqual(self.serve(self.index, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_not_modified(self):
+        """An unchanged detail page should get a 304 without rendering."""
+        self.detail.save_revision().publish()
+        self.detail.refresh_from_db()
+        since = http_date(self.detail.last_published_at.timestamp())
+        etag = self.serve(self.detail)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.serve(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.serve(self.detail, HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+
+    def test_detail_attachment_change(self):
+        """Replacing the attachment should change the detail page's ETag."""
+        etag = self.serve(self.detail)["ETag"]
+        self.detail.attachment_sha256 = "0" * 64
+
+        self.assertNotEqual(self.serve(self.detail)["ETag"], etag)
+
+    def test_uncacheable_requests(self):
+        """Requests that aren't cacheable should never get validators or a 304."""
+        request = self.factory.get("/", HTTP_IF_NONE_MATCH=self.serve(self.index)["ETag"])
+        request.site = self.site
+        request.is_preview = True
+        response = self.index.serve(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
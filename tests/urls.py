@@ -6,6 +6,7 @@ from __future__ import absolute_import, unicode_literals
 
 from django.conf.urls import include, url
 
+from wagtail.admin import urls as wagtailadmin_urls
 from wagtail.core import urls as wagtail_urls
 
-urlpatterns = [url(r"", include(wagtail_urls))]
+urlpatterns = [url(r"^admin/", include(wagtailadmin_urls)), url(r"", include(wagtail_urls))]
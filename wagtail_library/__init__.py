@@ -4,3 +4,5 @@ from __future__ import unicode_literals
 
 
 __version__ = "2.0.0"
+
+default_app_config = "wagtail_library.apps.WagtailLibraryConfig"
@@ -3,19 +3,129 @@
 
 from __future__ import unicode_literals
 
+import logging
+import operator
+import os
+from functools import reduce
+from html import unescape
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.core.files.base import ContentFile
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpRequest, JsonResponse, QueryDict, StreamingHttpResponse
+from django.utils.html import strip_tags
 from wagtail.admin.edit_handlers import FieldPanel
-from wagtail.core.models import Page
+from wagtail.contrib.routable_page.models import RoutablePageMixin, route
+from wagtail.core.models import Page, PageViewRestriction
+
+from wagtail_library.archives import COMPRESSED_EXTENSIONS, stream_zip
+from wagtail_library.attachments import get_file_metadata, read_chunks
+from wagtail_library.blobs import blob_name, is_blob_name
+from wagtail_library.cache import (
+    bump_generation,
+    get_ancestor_paths,
+    get_cache,
+    get_generation,
+    hash_value,
+    make_key,
+)
+from wagtail_library.conf import get_setting
+from wagtail_library.downloads import record_download
+from wagtail_library.extraction import can_extract_text, extract_text, read_attachment
+from wagtail_library.facets import count_facets
+from wagtail_library.instrumentation import instrumentation_enabled, measure_stage
+from wagtail_library.paginators import CachedCountPaginator, KeysetPaginator
+from wagtail_library.previews import can_render_preview, render_preview
+from wagtail_library.query import children_of, descendants_of, existing_fields, specific_listing
+from wagtail_library.sitemaps import get_sitemap_keys
+from wagtail_library.views import (
+    content_disposition,
+    is_cacheable_request,
+    serve_attachment,
+    serve_conditionally,
+)
+
 
+logger = logging.getLogger(__name__)
 
-class AbstractLibraryIndex(Page):
+
+class LibraryPageMixin(object):
+    """Behaviour shared by library index and detail pages."""
+
+    def is_cacheable_request(self, request):
+        """
+        See wagtail_library.views.is_cacheable_request.
+
+        :param request: HttpRequest instance
+        :return: Boolean
+        """
+        return is_cacheable_request(request)
+
+    def move(self, target, pos=None):
+        """
+        Moves the page, invalidating cached listings of both the old and new parent and
+        their ancestors, e.g. indexes listing the descendants of a moved section, and
+        its sitemap chunk.
+
+        :param target: Page to move relative to
+        :param pos: Treebeard position
+        """
+        old_path = self.path
+        super(LibraryPageMixin, self).move(target, pos=pos)
+        new_path = Page.objects.values_list("path", flat=True).get(pk=self.pk)
+        bump_generation(
+            *get_sitemap_keys(self.pk)
+            + get_ancestor_paths(old_path[: -self.steplen], self.steplen)
+            + get_ancestor_paths(new_path[: -self.steplen], self.steplen)
+        )
+
+
+class AbstractLibraryIndex(LibraryPageMixin, RoutablePageMixin, Page):
     """Abstract library index page."""
 
     paginate_by = models.PositiveIntegerField(blank=True, null=True)
+    list_descendants = models.BooleanField(
+        default=False,
+        help_text="List the items of every library index below this one, not only its own.",
+    )
 
-    content_panels = Page.content_panels + [FieldPanel("paginate_by")]
+    content_panels = Page.content_panels + [
+        FieldPanel("paginate_by"),
+        FieldPanel("list_descendants"),
+    ]
     paginator_class = Paginator
+    # Resolved child models, keyed by index class
+    _child_models = {}
+    # Seconds to cache rendered listing pages for anonymous visitors; None disables it
+    render_cache_timeout = None
+    # Child fields loaded for the listing, all other columns are deferred; None loads all
+    listing_fields = None
+    # Page fields always loaded alongside listing_fields, needed for titles and URLs
+    required_listing_fields = ("title", "slug", "url_path", "live", "path", "depth", "content_type")
+    # Querystring parameter holding the search terms
+    search_query_param = "q"
+    # Facets the children can be narrowed by, as wagtail_library.facets.Facet instances
+    facets = []
+    # Querystring parameter selecting the sort order
+    sort_param = "sort"
+    # Orderings the children can be sorted by, as (key, label, fields) tuples
+    sort_options = []
+    # Child fields included in the JSON listing, besides the ID, title and URLs
+    api_fields = (
+        "first_published_at",
+        "last_published_at",
+        "attachment_size",
+        "attachment_mime_type",
+        "attachment_extension",
+    )
+    # Number of children per page of the JSON listing
+    api_page_size = 50
+    # Child fields needed to add their attachments to archives
+    archive_fields = ("attachment", "attachment_size", "last_published_at")
 
     class Meta(object):
         """Django model meta options."""
@@ -29,11 +139,321 @@ class AbstractLibraryIndex(Page):
         :param request: django request
         :return: Queryset of child model instances
         """
-        model_class = self.__class__.allowed_subpage_models()[0]
-        children = model_class.objects.child_of(self)
+        children = self.get_child_queryset(fields=self.get_listing_fields())
+        return self._list_children(children, request, *args, **kwargs)
+
+    def _list_children(self, children, request, *args, **kwargs):
+        """
+        Applies the filters, selected facets and sort order of the request to the children.
+
+        :param children: Queryset of child pages
+        :param request: django request
+        :return: Queryset of child pages
+        """
+        children = self._filter_children(children, request, *args, **kwargs)
+        children = self.filter_facets(children, self.get_selected_facets(request))
+        sort = self.get_sort(request)
+        if sort is not None:
+            children = children.order_by(*self.get_ordering(sort))
+        return children
+
+    def _filter_children(self, children, request, *args, **kwargs):
+        """
+        Applies the live, additional and search filters to the children.
+
+        :param children: Queryset of child pages
+        :param request: django request
+        :return: Queryset of child pages
+        """
         if not request.is_preview:
             children = children.filter(live=True)
-        return children.filter(**self.get_additional_filter_kwargs(*args, **kwargs))
+        children = children.filter(**self.get_additional_filter_kwargs(*args, **kwargs))
+        query = self.get_search_query(request)
+        if query:
+            children = self.search_children(children, query)
+        return children
+
+    @classmethod
+    def get_child_models(cls):
+        """
+        Returns the page models listed by the index: its allowed subpage models, except
+        nested library indexes. They are resolved once per class.
+
+        :return: Tuple of page model classes
+        """
+        try:
+            return cls._child_models[cls]
+        except KeyError:
+            child_models = cls._child_models[cls] = tuple(
+                model
+                for model in cls.allowed_subpage_models()
+                if not issubclass(model, AbstractLibraryIndex)
+            )
+            return child_models
+
+    def get_listed_index_paths(self):
+        """
+        Returns the paths of the pages whose descendants are listed when list_descendants
+        is set: the index itself, so it lists the items of every index below it. Override
+        it to list the items of selected indexes instead.
+
+        :return: List of treebeard paths
+        """
+        return [self.path]
+
+    def get_listing_generation(self):
+        """
+        Returns the generation of the listing, included in the cache keys of its counts,
+        facets and rendered pages and in its entity tag. Changing an item bumps the
+        generations of its ancestors, so this is the index's generation, combined with
+        list_descendants with those of any listed index that isn't below it.
+
+        :return: Generation
+        """
+        paths = []
+        if self.list_descendants:
+            paths = [
+                path for path in self.get_listed_index_paths() if not path.startswith(self.path)
+            ]
+        if not paths:
+            return get_generation(self.path)
+        return hash_value([get_generation(path) for path in [self.path] + sorted(paths)])
+
+    def scope_children(self, queryset):
+        """
+        Narrows a queryset of pages to the ones listed by the index: its children, or with
+        list_descendants the pages below its listed indexes, in a single query either way.
+
+        :param queryset: Queryset of pages
+        :return: Queryset
+        """
+        if self.list_descendants:
+            return descendants_of(queryset, self.get_listed_index_paths(), self.steplen)
+        return children_of(queryset, self)
+
+    def get_child_queryset(self, fields=None):
+        """
+        Returns a queryset of all children of the listed page models, or with
+        list_descendants all the items below the listed indexes.
+
+        With a single child model the queryset is of that model. With several, generic
+        pages are queried and converted to their specific models with one query per
+        content type, so only Page fields can be used in filters.
+
+        :param fields: Names of the fields to load, None loads every field
+        :return: Queryset of child pages
+        """
+        child_models = self.get_child_models()
+        if len(child_models) == 1:
+            children = self.scope_children(child_models[0].objects.all())
+            if fields is None:
+                return children
+            return children.only(*existing_fields(child_models[0], fields))
+        content_types = ContentType.objects.get_for_models(*child_models).values()
+        children = self.scope_children(Page.objects.filter(content_type__in=content_types))
+        return specific_listing(children, fields=fields)
+
+    def get_listing_fields(self):
+        """
+        Returns the names of the fields to load for each child in the listing.
+        Accessing any other field on a child will cost an extra query.
+
+        :return: List of field names, or None to load every field
+        """
+        if self.listing_fields is None:
+            return None
+        fields = list(self.required_listing_fields)
+        fields.extend(field for field in self.listing_fields if field not in fields)
+        return fields
+
+    def get_search_query(self, request):
+        """
+        Returns the search terms given in the querystring.
+
+        :param request: HttpRequest instance
+        :return: Search terms, empty if there are none
+        """
+        return request.GET.get(self.search_query_param, "").strip()
+
+    def get_search_vector_lookups(self):
+        """
+        Returns the lookups of the search vectors of the child models, relative to the
+        child queryset.
+
+        :return: List of lookups
+        """
+        child_models = [
+            model
+            for model in self.get_child_models()
+            if any(field.name == "search_vector" for field in model._meta.concrete_fields)
+        ]
+        if len(self.get_child_models()) == 1:
+            return ["search_vector"] if child_models else []
+        return ["{}__search_vector".format(model._meta.model_name) for model in child_models]
+
+    def search_children(self, children, query):
+        """
+        Filters the children to those matching the search terms, best matches first.
+        The search runs against the children's stored search vectors, using their GIN
+        index, and each child is annotated with its search_rank.
+
+        :param children: Queryset of child pages
+        :param query: Search terms
+        :return: Queryset of child pages
+        """
+        lookups = self.get_search_vector_lookups()
+        if not lookups:
+            return children.none()
+        search_query = SearchQuery(query, config=get_setting("SEARCH_CONFIG"))
+        vectors = [models.F(lookup) for lookup in lookups]
+        vector = vectors[0] if len(vectors) == 1 else Coalesce(*vectors)
+        matches = reduce(operator.or_, (models.Q(**{lookup: search_query}) for lookup in lookups))
+        return (
+            children.filter(matches)
+            .annotate(search_rank=SearchRank(vector, search_query))
+            .order_by("-search_rank", "path")
+        )
+
+    def get_selected_facets(self, request):
+        """
+        Returns the facet values selected in the querystring.
+
+        :param request: HttpRequest instance
+        :return: Dict of facet name to a list of values
+        """
+        selected = {}
+        for facet in self.facets:
+            values = [value for value in request.GET.getlist(facet.name) if value]
+            if values:
+                selected[facet.name] = values
+        return selected
+
+    def filter_facets(self, children, selected, exclude=None):
+        """
+        Filters the children by the selected facet values.
+
+        :param children: Queryset of child pages
+        :param selected: Dict of facet name to a list of values
+        :param exclude: Name of a facet whose selection is ignored
+        :return: Queryset of child pages
+        """
+        for facet in self.facets:
+            if facet.name in selected and facet.name != exclude:
+                children = facet.filter(children, selected[facet.name])
+        return children
+
+    def get_facet_counts(self, request, *args, **kwargs):
+        """
+        Returns the number of children for each value of every facet, counted with a
+        single query. The counts of a facet take the selections of the other facets into
+        account, but not its own. They are cached until a child is published, unpublished,
+        moved or deleted.
+
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: Dict of facet name to a list of (value, count) tuples
+        """
+        selected = self.get_selected_facets(request)
+        variant = (
+            sorted(selected.items()),
+            self.get_search_query(request),
+            sorted(self.get_additional_filter_kwargs(*args, **kwargs).items()),
+            request.is_preview,
+        )
+        cache = get_cache()
+        key = make_key("facets", self.pk, self.get_listing_generation(), hash_value(variant))
+        counts = cache.get(key)
+        if counts is None:
+            children = self._filter_children(self.get_child_queryset(), request, *args, **kwargs)
+            counts = count_facets(
+                self.facets,
+                lambda facet: self.filter_facets(children, selected, exclude=facet.name),
+            )
+            cache.set(key, counts, get_setting("COUNT_CACHE_TIMEOUT"))
+        return counts
+
+    def get_facet_context(self, request, *args, **kwargs):
+        """
+        Returns the facets for the template, with each option's count, whether it's
+        selected, and the querystring toggling it.
+
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: List of dicts with name, label and options keys
+        """
+        counts = self.get_facet_counts(request, *args, **kwargs)
+        selected = self.get_selected_facets(request)
+        facets = []
+        for facet in self.facets:
+            chosen = selected.get(facet.name, [])
+            options = []
+            for value, count in facet.sort_options(counts.get(facet.name, [])):
+                querydict = request.GET.copy()
+                querydict.pop("page", None)
+                if value in chosen:
+                    querydict.setlist(facet.name, [other for other in chosen if other != value])
+                else:
+                    querydict.setlist(facet.name, chosen + [value])
+                options.append(
+                    {
+                        "value": value,
+                        "count": count,
+                        "selected": value in chosen,
+                        "querystring": querydict.urlencode(),
+                    }
+                )
+            facets.append({"name": facet.name, "label": facet.label, "options": options})
+        return facets
+
+    def get_sort(self, request):
+        """
+        Returns the key of the sort option selected in the querystring.
+
+        :param request: HttpRequest instance
+        :return: Key of a sort option, or None to keep the default order
+        """
+        sort = request.GET.get(self.sort_param)
+        if sort in {key for key, label, fields in self.sort_options}:
+            return sort
+        return None
+
+    def get_ordering(self, sort):
+        """
+        Returns the order_by fields of a sort option. The path is added to give a stable
+        order, in the same direction as the last field so an index can provide it.
+
+        :param sort: Key of the sort option
+        :return: List of field names
+        """
+        fields = list(dict((key, fields) for key, label, fields in self.sort_options)[sort])
+        fields.append("-path" if fields[-1].startswith("-") else "path")
+        return fields
+
+    def get_sort_context(self, request):
+        """
+        Returns the sort options for the template, with whether each is selected and the
+        querystring selecting it.
+
+        :param request: HttpRequest instance
+        :return: List of dicts with key, label, selected and querystring keys
+        """
+        sort = self.get_sort(request)
+        options = []
+        for key, label, fields in self.sort_options:
+            querydict = request.GET.copy()
+            querydict.pop("page", None)
+            querydict[self.sort_param] = key
+            options.append(
+                {
+                    "key": key,
+                    "label": label,
+                    "selected": key == sort,
+                    "querystring": querydict.urlencode(),
+                }
+            )
+        return options
 
     def get_additional_filter_kwargs(self, *args, **kwargs):
         """
@@ -59,8 +479,20 @@ class AbstractLibraryIndex(Page):
         :param request: HttpRequest instance
         :return: Dict of keyword arguments to pass to the paginator class constructor
         """
+        paginator_class = self.get_paginator_class()
+        if isinstance(paginator_class, type) and issubclass(paginator_class, CachedCountPaginator):
+            return {"cache_prefix": self.get_count_cache_prefix()}
         return {}
 
+    def get_count_cache_prefix(self):
+        """
+        Returns the prefix for cached child counts. It includes the listing's generation,
+        which changes whenever a listed item is published, unpublished, moved or deleted.
+
+        :return: Cache key prefix
+        """
+        return make_key("count", self.pk, self.get_listing_generation())
+
     def get_paginator(self, *args, **kwargs):
         """
         Returns a paginator instance
@@ -79,6 +511,10 @@ class AbstractLibraryIndex(Page):
         :return: Queryset of child model instances
         """
         paginator = self.get_paginator(queryset, self.paginate_by, **self.get_paginator_kwargs())
+        if instrumentation_enabled() and not getattr(paginator, "cursor_based", False):
+            # Count now rather than while picking the page, so the count is measured apart
+            with self.measure_stage("count"):
+                paginator.count
         try:
             queryset = paginator.page(page)
         except PageNotAnInteger:
@@ -97,7 +533,8 @@ class AbstractLibraryIndex(Page):
         :return: Context data to use when rendering the template
         """
         context = super(AbstractLibraryIndex, self).get_context(request, *args, **kwargs)
-        queryset = children = self._get_children(request, *args, **kwargs)
+        with self.measure_stage("queryset", request):
+            queryset = children = self._get_children(request, *args, **kwargs)
         is_paginated = False
         paginator = None
 
@@ -105,21 +542,831 @@ class AbstractLibraryIndex(Page):
         if self.paginate_by:
             is_paginated = True
             page_num = request.GET.get("page", 1) or 1
-            children, paginator = self.paginate_queryset(children, page_num)
+            with self.measure_stage("paginate", request):
+                children, paginator = self.paginate_queryset(children, page_num)
+
+        if instrumentation_enabled():
+            # Fetch the children now rather than while rendering, so they're measured apart
+            with self.measure_stage("children", request):
+                len(children)
+
+        with self.measure_stage("facets", request):
+            facets = self.get_facet_context(request, *args, **kwargs) if self.facets else []
+
+        querydict = request.GET.copy()
+        querydict.pop("page", None)
 
         context.update(
-            queryset=queryset, children=children, paginator=paginator, is_paginated=is_paginated
+            queryset=queryset,
+            children=children,
+            paginator=paginator,
+            is_paginated=is_paginated,
+            next_cursor=getattr(children, "next_cursor", None),
+            previous_cursor=getattr(children, "previous_cursor", None),
+            search_query=self.get_search_query(request),
+            facets=facets,
+            sort=self.get_sort(request),
+            sort_options=self.get_sort_context(request),
+            # Querystring of the current filters, for pagination links
+            querystring=querydict.urlencode(),
         )
         return context
 
+    def measure_stage(self, name, request=None):
+        """
+        Returns a context manager measuring the wall time and queries of a stage of
+        serving the listing, sent with the stage_finished signal. It does nothing unless
+        instrumentation is enabled (see wagtail_library.instrumentation).
+
+        :param name: Stage name: "queryset", "count", "paginate", "children", "facets" or
+            "render"
+        :param request: HttpRequest instance, defaults to that of the enclosing stage
+        :return: Context manager
+        """
+        return measure_stage(self, name, request=request)
+
+    def serve_listing(self, request, *args, **kwargs):
+        """
+        Serves the listing. The response is rendered straight away when instrumentation is
+        enabled, so the template rendering can be measured.
+
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: HttpResponse instance
+        """
+        response = super(AbstractLibraryIndex, self).serve(request, args=args, kwargs=kwargs)
+        if instrumentation_enabled() and callable(getattr(response, "render", None)):
+            with self.measure_stage("render", request):
+                response.render()
+        return response
+
+    def get_api_fields(self):
+        """
+        Returns the names of the fields to load for each child in the JSON listing.
+
+        :return: List of field names
+        """
+        fields = list(self.required_listing_fields)
+        fields.extend(field for field in self.api_fields if field not in fields)
+        return fields
+
+    def get_api_children(self, request, *args, **kwargs):
+        """
+        Returns the children for the JSON listing, with the filters, facets and sort order
+        of the HTML listing, leaving out those the request isn't allowed to view.
+
+        :param request: HttpRequest instance
+        :return: Queryset of child model instances
+        """
+        request.is_preview = getattr(request, "is_preview", False)
+        children = self.get_child_queryset(fields=self.get_api_fields())
+        children = self.exclude_restricted(children, request)
+        return self._list_children(children, request, *args, **kwargs)
+
+    def serialize_child(self, child, request):
+        """
+        Returns the JSON listing data of a child, with absolute URLs.
+
+        :param child: Child page
+        :param request: HttpRequest instance
+        :return: Dict
+        """
+        data = {
+            "id": child.pk,
+            "title": child.title,
+            "url": self.absolute_url(child.get_url(request), request),
+        }
+        get_download_url = getattr(child, "get_download_url", None)
+        if get_download_url is not None:
+            data["download_url"] = self.absolute_url(get_download_url(request), request)
+        deferred = child.get_deferred_fields()
+        for name in self.api_fields:
+            if name not in deferred and hasattr(child, name):
+                data[name] = getattr(child, name)
+        return data
+
+    @staticmethod
+    def absolute_url(url, request):
+        """
+        Returns the URL made absolute, as API clients can't resolve relative URLs.
+
+        :param url: URL string or None
+        :param request: HttpRequest instance
+        :return: URL string or None
+        """
+        return None if url is None else request.build_absolute_uri(url)
+
+    def get_api_url(self, request, **params):
+        """
+        Returns the absolute URL of the JSON listing with the querystring of the request,
+        updated with params.
+
+        :param request: HttpRequest instance
+        :param params: Querystring parameters to set
+        :return: URL string
+        """
+        querydict = request.GET.copy()
+        for name, value in params.items():
+            querydict[name] = value
+        return request.build_absolute_uri("?" + querydict.urlencode())
+
+    @route(r"^json/$")
+    def listing_json(self, request, *args, **kwargs):
+        """
+        Serves a page of the listing as JSON. Pages are addressed by the cursor parameter,
+        so every page costs the same however deep into the listing it is.
+
+        :param request: HttpRequest instance
+        :return: JsonResponse instance
+        """
+        children = self.get_api_children(request, *args, **kwargs)
+        paginator = KeysetPaginator(children, self.api_page_size)
+        try:
+            page = paginator.page(request.GET.get("cursor"))
+        except PageNotAnInteger:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+        data = {
+            "results": [self.serialize_child(child, request) for child in page],
+            "next": None,
+            "previous": None,
+        }
+        if page.next_cursor is not None:
+            data["next"] = self.get_api_url(request, cursor=page.next_cursor)
+        if page.previous_cursor is not None:
+            data["previous"] = self.get_api_url(request, cursor=page.previous_cursor)
+        return JsonResponse(data)
+
+    def stream_export(self, children, request):
+        """
+        Yields the children as a JSON array, fetching them from the database in chunks.
+
+        :param children: Queryset of child pages
+        :param request: HttpRequest instance
+        """
+        encoder = DjangoJSONEncoder()
+        separator = "["
+        for child in children.iterator(chunk_size=get_setting("EXPORT_CHUNK_SIZE")):
+            yield separator + encoder.encode(self.serialize_child(child, request))
+            separator = ",\n"
+        yield "[]" if separator == "[" else "]"
+
+    @route(r"^json/export/$")
+    def export_json(self, request, *args, **kwargs):
+        """
+        Streams every child of the listing as a JSON array. Memory use doesn't depend on the
+        size of the listing, and the response starts before all children are fetched.
+
+        :param request: HttpRequest instance
+        :return: StreamingHttpResponse instance
+        """
+        children = self.get_api_children(request, *args, **kwargs)
+        response = StreamingHttpResponse(
+            self.stream_export(children, request), content_type="application/json"
+        )
+        response["Content-Disposition"] = 'attachment; filename="{}.json"'.format(self.slug)
+        return response
+
+    def get_archive_fields(self):
+        """
+        Returns the names of the fields to load for each child in attachment archives.
+
+        :return: List of field names
+        """
+        fields = list(self.required_listing_fields)
+        fields.extend(field for field in self.archive_fields if field not in fields)
+        return fields
+
+    def get_archive_children(self, request, *args, **kwargs):
+        """
+        Returns the children whose attachments are archived, with the filters and facets of
+        the HTML listing, leaving out those the request isn't allowed to view.
+
+        :param request: HttpRequest instance
+        :return: Queryset of child model instances
+        """
+        request.is_preview = getattr(request, "is_preview", False)
+        children = self.get_child_queryset(fields=self.get_archive_fields())
+        children = self.exclude_restricted(children, request)
+        return self._list_children(children, request, *args, **kwargs)
+
+    def exclude_restricted(self, children, request):
+        """
+        Leaves out the children below a page whose view restriction (a password, login or
+        group) the request hasn't passed, e.g. a protected section listed with
+        list_descendants, so routes serving their content don't expose them.
+
+        :param children: Queryset of child pages
+        :param request: HttpRequest instance
+        :return: Queryset of child pages
+        """
+        conditions = [
+            models.Q(page__path__startswith=path)
+            | models.Q(page__path__in=get_ancestor_paths(path, self.steplen))
+            for path in self.get_listed_index_paths()
+        ]
+        restrictions = PageViewRestriction.objects.filter(
+            reduce(operator.or_, conditions)
+        ).select_related("page")
+        for restriction in restrictions:
+            if not restriction.accept_request(request):
+                children = children.exclude(path__startswith=restriction.page.path)
+        return children
+
+    def get_bulk_children(self, query="", ids=None):
+        """
+        Returns the children a bulk operation applies to, drafts included: those matching
+        a querystring of the listing's filters, facets and search terms, and among them
+        the given IDs if any.
+
+        :param query: Querystring, e.g. "type=pdf&q=report"
+        :param ids: IDs of the selected children, None selects every match
+        :return: Queryset of child pages
+        """
+        request = HttpRequest()
+        request.GET = QueryDict(query)
+        request.is_preview = True
+        children = self._list_children(self.get_child_queryset(), request)
+        if ids is not None:
+            children = children.filter(pk__in=ids)
+        return children
+
+    def get_archive_files(self, children):
+        """
+        Yields the archive entries of the children's attachments, named after the children's
+        slugs. Slugs are only unique among siblings, so a numbered suffix is added to the
+        names of children listed from several indexes sharing a slug. Already compressed
+        formats are stored as they are. Attachments that can't be opened are left out.
+
+        :param children: Queryset of child pages
+        :return: Iterator of dicts of ZipStream.write keyword arguments
+        """
+        chunk_size = get_setting("DOWNLOAD_CHUNK_SIZE")
+        names = set()
+        for child in children.iterator(chunk_size=get_setting("EXPORT_CHUNK_SIZE")):
+            attachment = getattr(child, "attachment", None)
+            if not attachment:
+                continue
+            try:
+                attachment.open("rb")
+            except (IOError, OSError):
+                logger.warning("Unable to read attachment %s", attachment.name, exc_info=True)
+                continue
+            extension = os.path.splitext(attachment.name)[1].lower()
+            name, suffix = child.slug + extension, 1
+            while name in names:
+                suffix += 1
+                name = "{}-{}{}".format(child.slug, suffix, extension)
+            names.add(name)
+            yield {
+                "name": name,
+                "chunks": read_chunks(attachment, chunk_size),
+                "size": getattr(child, "attachment_size", None),
+                "modified": child.last_published_at,
+                "compress": extension.lstrip(".") not in COMPRESSED_EXTENSIONS,
+            }
+
+    @route(r"^download/$")
+    def download_all(self, request, *args, **kwargs):
+        """
+        Streams a ZIP archive of the attachments of the listed children, built as it's sent
+        so memory use doesn't depend on the size of the archive.
+
+        :param request: HttpRequest instance
+        :return: StreamingHttpResponse instance
+        """
+        children = self.get_archive_children(request, *args, **kwargs)
+        response = StreamingHttpResponse(
+            stream_zip(self.get_archive_files(children)), content_type="application/zip"
+        )
+        response["Content-Disposition"] = content_disposition("{}.zip".format(self.slug))
+        return response
+
+    def get_children_state(self):
+        """
+        Returns the number of live children and when one was last published, cached
+        under the listing's generation so it's only recalculated after a child changes.
+
+        :return: Tuple of (count, last published datetime or None)
+        """
+        cache = get_cache()
+        key = make_key("children-state", self.pk, self.get_listing_generation())
+        state = cache.get(key)
+        if state is None:
+            aggregate = self.scope_children(Page.objects.live()).aggregate(
+                count=models.Count("pk"), last_published_at=models.Max("last_published_at")
+            )
+            state = (aggregate["count"], aggregate["last_published_at"])
+            cache.set(key, state, get_setting("COUNT_CACHE_TIMEOUT"))
+        return state
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        Returns the validators of the listing, for conditional requests. They change when
+        the index is published or edited, or a child is added, published, unpublished,
+        moved or deleted. There's no last modification date, as removing a child doesn't
+        change any, so clients only sending If-Modified-Since would keep a stale listing.
+
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: Tuple of (unquoted entity tag, last modified datetime or None)
+        """
+        count, children_published_at = self.get_children_state()
+        etag = hash_value(
+            (
+                self.pk,
+                self.latest_revision_created_at,
+                self.last_published_at,
+                self.get_listing_generation(),
+                count,
+                children_published_at,
+            )
+        )
+        return etag, None
+
+    def get_render_cache_key(self, request, *args, **kwargs):
+        """
+        Returns the cache key for a rendered listing page. It varies on the host, the
+        querystring (page number, filters) and the additional filter kwargs, and includes
+        the listing's generation so publishing, unpublishing or moving a child invalidates it.
 
-class AbstractLibraryDetail(Page):
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: Cache key
+        """
+        variant = (
+            request.get_host(),
+            sorted(request.GET.lists()),
+            sorted(self.get_additional_filter_kwargs(*args, **kwargs).items()),
+        )
+        return make_key("render", self.pk, self.get_listing_generation(), hash_value(variant))
+
+    def serve(self, request, view=None, args=None, kwargs=None):
+        """
+        Serves the listing, or the view of another route. Cacheable requests are answered
+        with 304 Not Modified if the listing hasn't changed, before any child is loaded.
+
+        :param request: HttpRequest instance
+        :param view: View of the route, None for the listing
+        :param args: positional args of the route
+        :param kwargs: keyword args of the route
+        :return: HttpResponse instance
+        """
+        if view is not None and view.__name__ != "index_route":
+            return view(request, *(args or []), **(kwargs or {}))
+        args = args or []
+        kwargs = kwargs or {}
+        if not self.is_cacheable_request(request):
+            return self.serve_listing(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        return serve_conditionally(
+            request,
+            lambda: self.serve_cached(request, *args, **kwargs),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def serve_cached(self, request, *args, **kwargs):
+        """
+        Serves the listing from the render cache if render_cache_timeout is set.
+
+        :param request: HttpRequest instance
+        :param args: default positional args
+        :param kwargs: default keyword args
+        :return: HttpResponse instance
+        """
+        if self.render_cache_timeout is None:
+            return self.serve_listing(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_render_cache_key(request, *args, **kwargs)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = self.serve_listing(request, *args, **kwargs)
+        if response.status_code == 200:
+            if callable(getattr(response, "add_post_render_callback", None)):
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, rendered, self.render_cache_timeout)
+                )
+            else:
+                cache.set(key, response, self.render_cache_timeout)
+        return response
+
+
+class AbstractLibraryDetail(LibraryPageMixin, RoutablePageMixin, Page):
     """Abstract library item detail page."""
 
     attachment = models.FileField(upload_to="attachments")
+    # Denormalised attachment metadata, so listings never need to touch the storage
+    attachment_size = models.BigIntegerField(blank=True, null=True, editable=False)
+    attachment_mime_type = models.CharField(max_length=255, blank=True, editable=False)
+    attachment_extension = models.CharField(max_length=32, blank=True, editable=False)
+    # Indexed to find the items sharing a content-addressed file
+    attachment_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    # Text extracted from the attachment in the background, and the digest of its source
+    attachment_text = models.TextField(blank=True, editable=False)
+    attachment_text_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    # Preview image of the attachment rendered in the background, and the digest of its source
+    attachment_preview = models.FileField(upload_to="previews", blank=True, editable=False)
+    attachment_preview_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    # Weighted title, body and attachment text lexemes of the live page, for full-text search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Downloads of the attachment, flushed from wagtail_library.downloads' buffers
+    download_count = models.PositiveIntegerField(default=0, editable=False, db_index=True)
     content_panels = Page.content_panels + [FieldPanel("attachment")]
 
+    attachment_metadata_fields = [
+        "attachment_size",
+        "attachment_mime_type",
+        "attachment_extension",
+        "attachment_sha256",
+    ]
+    # Fields making up the search vector, with their weights
+    search_vector_fields = [("title", "A"), ("attachment_text", "C")]
+
     class Meta(object):
         """Django properties."""
 
         abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remembers the stored attachment name, to detect when it changes."""
+        instance = super(AbstractLibraryDetail, cls).from_db(db, field_names, values)
+        if "attachment" in instance.__dict__:
+            instance._loaded_attachment_name = instance.attachment.name
+        return instance
+
+    def attachment_metadata_outdated(self):
+        """
+        Whether the attachment metadata needs to be recalculated: the attachment has
+        just been uploaded, was replaced, or has no metadata yet.
+
+        :return: Boolean
+        """
+        if not self.attachment:
+            return bool(self.attachment_sha256)
+        if not self.attachment._committed or not self.attachment_sha256:
+            return True
+        loaded_name = getattr(self, "_loaded_attachment_name", self.attachment.name)
+        return loaded_name != self.attachment.name
+
+    def update_attachment_metadata(self):
+        """Recalculates the attachment metadata fields, reading the file once."""
+        if not self.attachment:
+            self.attachment_size = None
+            self.attachment_mime_type = self.attachment_extension = self.attachment_sha256 = ""
+            return
+
+        try:
+            metadata = get_file_metadata(self.attachment)
+        except (IOError, OSError):
+            logger.warning("Unable to read attachment %s", self.attachment.name, exc_info=True)
+            return
+        self.attachment_size = metadata["size"]
+        self.attachment_mime_type = metadata["mime_type"]
+        self.attachment_extension = metadata["extension"]
+        self.attachment_sha256 = metadata["sha256"]
+
+    def store_attachment_blob(self):
+        """
+        Stores a newly uploaded attachment under the SHA-256 digest of its content, reusing
+        the stored file if the same content was uploaded before. Only used with the
+        WAGTAIL_LIBRARY_CONTENT_ADDRESSED_STORAGE setting, after the metadata is updated,
+        which then describes the stored file so it isn't read again.
+        """
+        attachment = self.attachment
+        if not get_setting("CONTENT_ADDRESSED_STORAGE") or not attachment:
+            return
+        if attachment._committed or not self.attachment_sha256:
+            return
+        name = blob_name(self.attachment_sha256, self.attachment_extension)
+        stored_name = attachment.field.generate_filename(self, name)
+        if attachment.storage.exists(stored_name):
+            attachment.name = stored_name
+            attachment._committed = True
+            # Reads open the stored file rather than the upload, which may be closed
+            attachment._file = None
+        else:
+            attachment.save(name, attachment.file, save=False)
+        self._loaded_attachment_name = attachment.name
+
+    def attachment_text_outdated(self):
+        """
+        Whether the attachment text needs to be extracted: it was extracted from another
+        file, or not at all.
+
+        :return: Boolean
+        """
+        return self.attachment_text_sha256 != self.attachment_sha256
+
+    def _load_stored_value(self, field_name, **filters):
+        """
+        Returns the value of a field stored since the page (or the revision it was restored
+        from) was loaded, e.g. by a background task.
+
+        :param field_name: Name of the field
+        :param filters: Lookups the stored page must match, e.g. on the attachment checksum
+        :return: Stored value, or None if the stored page doesn't match
+        """
+        return (
+            type(self)
+            ._default_manager.filter(pk=self.pk, **filters)
+            .values_list(field_name, flat=True)
+            .first()
+        )
+
+    def load_attachment_text(self):
+        """Loads text extracted from the current attachment in the background."""
+        text = self._load_stored_value(
+            "attachment_text", attachment_text_sha256=self.attachment_sha256
+        )
+        if text is not None:
+            self.attachment_text = text
+            self.attachment_text_sha256 = self.attachment_sha256
+
+    def update_attachment_text(self):
+        """Extracts and stores the text of the attachment. This reads the whole file."""
+        text = ""
+        if self.attachment and can_extract_text(self.attachment_mime_type):
+            try:
+                data = read_attachment(self.attachment)
+            except (IOError, OSError):
+                logger.warning("Unable to read attachment %s", self.attachment.name, exc_info=True)
+                return
+            text = extract_text(data, self.attachment_mime_type)
+        self.store_attachment_text(text)
+
+    def store_attachment_text(self, text):
+        """
+        Stores text extracted from the current attachment, updating the search vector.
+
+        :param text: Extracted text
+        """
+        self.attachment_text = text
+        self.attachment_text_sha256 = self.attachment_sha256
+        type(self)._default_manager.filter(pk=self.pk).update(
+            attachment_text=self.attachment_text,
+            attachment_text_sha256=self.attachment_text_sha256,
+            search_vector=self.get_search_vector(),
+        )
+
+    def load_download_count(self):
+        """Loads the flushed download count, so saving doesn't write an older count back."""
+        count = self._load_stored_value("download_count")
+        if count is not None:
+            self.download_count = count
+
+    def attachment_preview_outdated(self):
+        """
+        Whether a preview of the attachment needs to be stored: the stored one shows
+        another file, or there is none, and one can be rendered for the attachment's type.
+
+        :return: Boolean
+        """
+        return (
+            bool(self.attachment_sha256)
+            and self.attachment_preview_sha256 != self.attachment_sha256
+            and can_render_preview(self.attachment_mime_type)
+        )
+
+    def get_attachment_preview(self):
+        """
+        Returns the preview image of the current attachment, without touching the storage.
+
+        :return: FieldFile, or None until a preview has been stored
+        """
+        if not self.attachment_preview or self.attachment_preview_sha256 != self.attachment_sha256:
+            return None
+        return self.attachment_preview
+
+    def load_attachment_preview(self):
+        """Loads a preview of the current attachment stored in the background."""
+        name = self._load_stored_value(
+            "attachment_preview", attachment_preview_sha256=self.attachment_sha256
+        )
+        if name:
+            self.attachment_preview = name
+            self.attachment_preview_sha256 = self.attachment_sha256
+
+    def update_attachment_preview(self):
+        """
+        Stores a preview of the attachment. Previews are named after the checksum of the
+        attachment, so an existing preview of the same file is reused rather than rendered
+        again; rendering one reads the whole file.
+        """
+        field = self._meta.get_field("attachment_preview")
+        name = field.generate_filename(self, blob_name(self.attachment_sha256, "jpg"))
+        storage = self.attachment_preview.storage
+        if not storage.exists(name):
+            try:
+                data = read_attachment(self.attachment)
+            except (IOError, OSError):
+                logger.warning("Unable to read attachment %s", self.attachment.name, exc_info=True)
+                return
+            preview = render_preview(data, self.attachment_mime_type)
+            if preview is None:
+                return
+            name = storage.save(name, ContentFile(preview))
+        self.store_attachment_preview(name)
+
+    def store_attachment_preview(self, name):
+        """
+        Stores the name of a preview of the current attachment, invalidating the cached
+        listings showing a placeholder instead.
+
+        :param name: Stored file name of the preview
+        """
+        self.attachment_preview = name
+        self.attachment_preview_sha256 = self.attachment_sha256
+        type(self)._default_manager.filter(pk=self.pk).update(
+            attachment_preview=name, attachment_preview_sha256=self.attachment_preview_sha256
+        )
+        bump_generation(*get_ancestor_paths(self.path, self.steplen))
+
+    def clean(self):
+        """Calculates the attachment metadata before Wagtail serialises a revision."""
+        super(AbstractLibraryDetail, self).clean()
+        if self.attachment_metadata_outdated():
+            self.update_attachment_metadata()
+            self.store_attachment_blob()
+
+    def save(self, *args, **kwargs):
+        """
+        Keeps the attachment metadata up to date when the attachment is saved, and
+        the search vector when the fields it's built from are. Values stored in the
+        background, and download counts, aren't overwritten by those of older revisions.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "attachment" in update_fields:
+            if self.attachment_metadata_outdated():
+                self.update_attachment_metadata()
+                self.store_attachment_blob()
+                if update_fields is not None:
+                    kwargs["update_fields"] = set(update_fields).union(
+                        self.attachment_metadata_fields
+                    )
+        if update_fields is None and self.pk and self.attachment_text_outdated():
+            self.load_attachment_text()
+        if update_fields is None and self.pk and self.attachment_preview_outdated():
+            self.load_attachment_preview()
+        if update_fields is None and self.pk:
+            self.load_download_count()
+        result = super(AbstractLibraryDetail, self).save(*args, **kwargs)
+        self._loaded_attachment_name = self.attachment.name
+
+        search_fields = {name for name, weight in self.search_vector_fields}
+        if update_fields is None or search_fields.intersection(update_fields):
+            self.update_search_vector()
+        return result
+
+    def get_search_text(self, field_name):
+        """
+        Returns the text of a field to index, without any HTML markup.
+
+        :param field_name: Name of the field
+        :return: Plain text
+        """
+        value = "{}".format(getattr(self, field_name) or "")
+        # Tags are replaced with spaces so words in adjacent elements aren't run together
+        return unescape(strip_tags(value.replace("<", " <")))
+
+    def get_search_vector(self):
+        """
+        Returns an expression building the search vector from the search_vector_fields.
+
+        :return: SearchVector expression
+        """
+        config = get_setting("SEARCH_CONFIG")
+        vectors = [
+            SearchVector(
+                models.Value(self.get_search_text(name), output_field=models.TextField()),
+                weight=weight,
+                config=config,
+            )
+            for name, weight in self.search_vector_fields
+        ]
+        return reduce(operator.add, vectors)
+
+    def update_search_vector(self):
+        """Stores the search vector of the page."""
+        type(self)._default_manager.filter(pk=self.pk).update(
+            search_vector=self.get_search_vector()
+        )
+
+    def get_attachment_etag(self):
+        """
+        Returns the entity tag of the attachment, used for conditional downloads.
+
+        :return: Unquoted entity tag
+        """
+        return self.attachment_sha256 or hash_value((self.attachment.name, self.last_published_at))
+
+    def get_download_url(self, request=None):
+        """
+        Returns the URL of the attachment download view.
+
+        :param request: HttpRequest instance
+        :return: URL string or None if the page isn't routable
+        """
+        url = self.get_url(request)
+        if url is None:
+            return None
+        return url + self.reverse_subpage("download").lstrip("/")
+
+    def get_attachment_filename(self):
+        """
+        Returns the file name suggested to visitors downloading the attachment: the stored
+        name, or the page's slug for content-addressed files named by their digest.
+
+        :return: File name
+        """
+        filename = os.path.basename(self.attachment.name)
+        if is_blob_name(self.attachment.name):
+            return self.slug + os.path.splitext(filename)[1]
+        return filename
+
+    @route(r"^download/$")
+    def download(self, request):
+        """
+        Serves the attachment, supporting range and conditional requests.
+
+        :param request: HttpRequest instance
+        :return: HttpResponse instance
+        """
+        if not self.attachment:
+            raise Http404("This library item has no attachment")
+        response = serve_attachment(
+            request,
+            self.attachment,
+            size=self.attachment_size,
+            etag=self.get_attachment_etag(),
+            last_modified=self.last_published_at,
+            filename=self.get_attachment_filename(),
+        )
+        if self.is_download(request, response):
+            record_download(self)
+        return response
+
+    def is_download(self, request, response):
+        """
+        Whether serving the attachment counts as a download. Range requests resuming a
+        download, HEAD requests, previews and revalidations aren't counted.
+
+        :param request: HttpRequest instance
+        :param response: HttpResponse instance
+        :return: Boolean
+        """
+        return (
+            request.method == "GET"
+            and response.status_code == 200
+            and not getattr(request, "is_preview", False)
+        )
+
+    def get_validators(self, request):
+        """
+        Returns the validators of the page, for conditional requests. They change when the
+        page is published, its attachment replaced or a preview of it stored.
+
+        :param request: HttpRequest instance
+        :return: Tuple of (unquoted entity tag, last modified datetime or None)
+        """
+        etag = hash_value(
+            (
+                self.pk,
+                self.last_published_at,
+                self.get_attachment_etag(),
+                self.attachment_preview_sha256,
+            )
+        )
+        return etag, self.last_published_at
+
+    def serve(self, request, view=None, args=None, kwargs=None):
+        """
+        Serves the page, or the view of another route. Cacheable requests are answered
+        with 304 Not Modified if the page hasn't changed, before the template is rendered.
+
+        :param request: HttpRequest instance
+        :param view: View of the route, None for the page
+        :param args: positional args of the route
+        :param kwargs: keyword args of the route
+        :return: HttpResponse instance
+        """
+        serve = super(AbstractLibraryDetail, self).serve
+        is_page = view is None or view.__name__ == "index_route"
+        if not is_page or not self.is_cacheable_request(request):
+            return serve(request, view, args, kwargs)
+
+        etag, last_modified = self.get_validators(request)
+        return serve_conditionally(
+            request,
+            lambda: serve(request, view, args, kwargs),
+            etag=etag,
+            last_modified=last_modified,
+        )
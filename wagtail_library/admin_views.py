@@ -0,0 +1,118 @@
+# -*- coding:utf8 -*-
+"""wagtail_library admin views"""
+
+from __future__ import unicode_literals
+
+import time
+
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.translation import ugettext as _
+from wagtail.core.models import Page
+
+from wagtail_library.abstract_models import AbstractLibraryIndex
+from wagtail_library.bulk import run_in_batches
+from wagtail_library.conf import get_setting
+from wagtail_library.forms import BulkActionForm
+from wagtail_library.tasks import apply_bulk_action, run_in_background
+
+
+# Number of matching children listed for selection
+BULK_SELECTION_SIZE = 100
+
+
+def bulk_actions(request, index_id):
+    """
+    Publishes, unpublishes or moves selected children of a library index, or all those
+    matching the listing filters in the querystring, in batched transactions. Children the
+    user isn't allowed to change are skipped. Selections of more than
+    WAGTAIL_LIBRARY_BULK_INLINE_LIMIT children are changed by a background task.
+
+    :param request: HttpRequest instance
+    :param index_id: ID of the index
+    :return: HttpResponse instance
+    """
+    index = get_object_or_404(Page, pk=index_id).specific
+    if not isinstance(index, AbstractLibraryIndex):
+        raise Http404("This page isn't a library index")
+    if not index.permissions_for_user(request.user).can_publish_subpage():
+        raise PermissionDenied
+
+    query = request.GET.urlencode()
+    children = index.get_bulk_children(query)
+    form = BulkActionForm(request.POST or None, children=children)
+
+    if request.method == "POST" and form.is_valid():
+        action = form.cleaned_data["action"]
+        label = dict(form.fields["action"].choices)[action]
+        target = form.cleaned_data["target"]
+        ids = None
+        if not form.cleaned_data["all_matching"]:
+            ids = [page.pk for page in form.cleaned_data["ids"]]
+            children = children.filter(pk__in=ids)
+
+        count = children.count()
+        if count > get_setting("BULK_INLINE_LIMIT"):
+            run_in_background(
+                apply_bulk_action,
+                action,
+                index.pk,
+                request.user.pk,
+                query,
+                ids,
+                target.pk if action == "move" else None,
+            )
+            messages.success(
+                request,
+                _("%(action)s: %(count)d items will be changed in the background.")
+                % {"action": label, "count": count},
+            )
+            return redirect("wagtailadmin_explore", index.pk)
+
+        kwargs = {"target": target.specific} if action == "move" else {}
+        started = time.time()
+        processed = changed = denied = 0
+        for batch_size, batch_changed, batch_denied in run_in_batches(
+            action, children, user=request.user, **kwargs
+        ):
+            processed += batch_size
+            changed += batch_changed
+            denied += batch_denied
+        elapsed = max(time.time() - started, 0.001)
+
+        messages.success(
+            request,
+            _(
+                "%(action)s: %(changed)d of %(processed)d items "
+                "in %(elapsed).1fs (%(rate).1f items/s)"
+            )
+            % {
+                "action": label,
+                "changed": changed,
+                "processed": processed,
+                "elapsed": elapsed,
+                "rate": processed / elapsed,
+            },
+        )
+        if denied:
+            messages.warning(
+                request,
+                _("%(denied)d items were skipped as you aren't allowed to change them.")
+                % {"denied": denied},
+            )
+        return redirect("wagtailadmin_explore", index.pk)
+
+    return render(
+        request,
+        "wagtail_library/admin/bulk_actions.html",
+        {
+            "index": index,
+            "form": form,
+            "query": query,
+            "search_query": index.get_search_query(request),
+            "children": children.order_by("path")[:BULK_SELECTION_SIZE],
+            "count": children.count(),
+        },
+    )
@@ -0,0 +1,18 @@
+# -*- coding:utf8 -*-
+"""wagtail_library app config"""
+
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+
+
+class WagtailLibraryConfig(AppConfig):
+    """App config for wagtail_library."""
+
+    name = "wagtail_library"
+    verbose_name = "Wagtail library"
+
+    def ready(self):
+        from wagtail_library.signal_handlers import register_signal_handlers
+
+        register_signal_handlers()
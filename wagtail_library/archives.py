@@ -0,0 +1,241 @@
+# -*- coding:utf8 -*-
+"""Streaming ZIP archives"""
+
+from __future__ import unicode_literals
+
+import struct
+import zlib
+
+from django.utils import timezone
+
+
+STORED = 0
+DEFLATED = 8
+
+# Sizes and offsets at least this large need Zip64 records
+ZIP64_LIMIT = 0xFFFFFFFF
+# Entries with more than this many bytes are written as Zip64, leaving room for deflate
+# to grow incompressible data
+ZIP64_ENTRY_LIMIT = (1 << 31) - 1
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+# General purpose flags: sizes and CRC follow the data, names are UTF-8
+FLAGS = 0x08 | 0x800
+VERSION = 20
+VERSION_ZIP64 = 45
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+DATA_DESCRIPTOR = struct.Struct("<IIII")
+DATA_DESCRIPTOR_ZIP64 = struct.Struct("<IIQQ")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+END_RECORD_ZIP64 = struct.Struct("<IQHHIIQQQQ")
+END_LOCATOR_ZIP64 = struct.Struct("<IIQI")
+
+# Extensions of files that are already compressed, which are stored as they are
+COMPRESSED_EXTENSIONS = {
+    "7z",
+    "avi",
+    "bz2",
+    "docx",
+    "epub",
+    "gif",
+    "gz",
+    "jpeg",
+    "jpg",
+    "m4a",
+    "mkv",
+    "mov",
+    "mp3",
+    "mp4",
+    "odp",
+    "ods",
+    "odt",
+    "png",
+    "pptx",
+    "rar",
+    "webp",
+    "xlsx",
+    "xz",
+    "zip",
+}
+
+
+def dos_datetime(value):
+    """
+    Returns the MS-DOS date and time of a datetime, as stored in ZIP headers.
+
+    :param value: Datetime, aware datetimes are converted to the current time zone
+    :return: Tuple of (date, time) integers
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    if value.year < 1980:
+        return (1 << 5) | 1, 0
+    date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    return date, time
+
+
+class ZipEntry(object):
+    """A file in a streamed ZIP archive, its offset and what was learned writing it."""
+
+    def __init__(self, name, offset, method, date, time, zip64):
+        self.name = name.encode("utf-8")
+        self.offset = offset
+        self.method = method
+        self.date = date
+        self.time = time
+        self.zip64 = zip64
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+
+class ZipStream(object):
+    """
+    Writes a ZIP archive as it's streamed, without seeking or temporary files.
+
+    Each entry's CRC and sizes follow its data in a data descriptor, so files are read
+    once, a chunk at a time. Only the central directory, a few dozen bytes per entry,
+    is kept in memory. Zip64 records are written when entries or the archive are too
+    large for the original format.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.offset = 0
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def write(self, name, chunks, size=None, modified=None, compress=True):
+        """
+        Yields the bytes of an entry.
+
+        :param name: Path of the entry in the archive
+        :param chunks: Iterable of the bytes of the file
+        :param size: Expected size of the file, None if unknown
+        :param modified: Modification datetime, defaults to now
+        :param compress: Whether to deflate the file, or store it as it is
+        """
+        date, time = dos_datetime(modified or timezone.now())
+        zip64 = size is None or size > ZIP64_ENTRY_LIMIT
+        entry = ZipEntry(name, self.offset, DEFLATED if compress else STORED, date, time, zip64)
+        self.entries.append(entry)
+
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if zip64 else b""
+        yield self._emit(
+            LOCAL_HEADER.pack(
+                0x04034B50,
+                VERSION_ZIP64 if zip64 else VERSION,
+                FLAGS,
+                entry.method,
+                entry.time,
+                entry.date,
+                0,
+                ZIP64_LIMIT if zip64 else 0,
+                ZIP64_LIMIT if zip64 else 0,
+                len(entry.name),
+                len(extra),
+            )
+            + entry.name
+            + extra
+        )
+
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        for chunk in chunks:
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            entry.size += len(chunk)
+            if compress:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                entry.compressed_size += len(chunk)
+                yield self._emit(chunk)
+        if compress:
+            chunk = compressor.flush()
+            entry.compressed_size += len(chunk)
+            yield self._emit(chunk)
+
+        if not zip64 and max(entry.size, entry.compressed_size) >= ZIP64_LIMIT:
+            raise ValueError("{} is larger than its expected size".format(name))
+        descriptor = DATA_DESCRIPTOR_ZIP64 if zip64 else DATA_DESCRIPTOR
+        yield self._emit(descriptor.pack(0x08074B50, entry.crc, entry.compressed_size, entry.size))
+
+    def _central_header(self, entry):
+        """Returns the central directory header of an entry."""
+        values = []
+        size, compressed_size, offset = entry.size, entry.compressed_size, entry.offset
+        if entry.zip64 or size >= ZIP64_LIMIT:
+            values.append(size)
+            size = ZIP64_LIMIT
+        if entry.zip64 or compressed_size >= ZIP64_LIMIT:
+            values.append(compressed_size)
+            compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = b""
+        if values:
+            extra = struct.pack("<HH{}Q".format(len(values)), 1, 8 * len(values), *values)
+        version = VERSION_ZIP64 if extra else VERSION
+        return (
+            CENTRAL_HEADER.pack(
+                0x02014B50,
+                version,
+                version,
+                FLAGS,
+                entry.method,
+                entry.time,
+                entry.date,
+                entry.crc,
+                compressed_size,
+                size,
+                len(entry.name),
+                len(extra),
+                0,
+                0,
+                0,
+                # Regular file readable by everyone, in the Unix mode bits
+                0o100644 << 16,
+                offset,
+            )
+            + entry.name
+            + extra
+        )
+
+    def close(self):
+        """Yields the central directory and end records, completing the archive."""
+        start = self.offset
+        for entry in self.entries:
+            yield self._emit(self._central_header(entry))
+        size = self.offset - start
+        count = len(self.entries)
+
+        if count >= ZIP64_COUNT_LIMIT or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+            end = self.offset
+            yield self._emit(
+                END_RECORD_ZIP64.pack(
+                    0x06064B50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0, count, count, size, start
+                )
+            )
+            yield self._emit(END_LOCATOR_ZIP64.pack(0x07064B50, 0, end, 1))
+            count = min(count, ZIP64_COUNT_LIMIT)
+            size = min(size, ZIP64_LIMIT)
+            start = min(start, ZIP64_LIMIT)
+        yield self._emit(END_RECORD.pack(0x06054B50, 0, 0, count, count, size, start, 0))
+
+
+def stream_zip(files):
+    """
+    Yields the bytes of a ZIP archive of the files.
+
+    :param files: Iterable of dicts of ZipStream.write keyword arguments
+    """
+    archive = ZipStream()
+    for kwargs in files:
+        for data in archive.write(**kwargs):
+            yield data
+    for data in archive.close():
+        yield data
@@ -0,0 +1,54 @@
+# -*- coding:utf8 -*-
+"""Attachment helpers"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import mimetypes
+import os
+
+from wagtail_library.conf import get_setting
+
+
+def get_file_metadata(field_file):
+    """
+    Reads the file once to work out its size, MIME type, extension and SHA-256 digest.
+
+    :param field_file: FieldFile, committed to storage or freshly uploaded
+    :return: Dict with size, mime_type, extension and sha256 keys
+    """
+    digest = hashlib.sha256()
+    size = 0
+    committed = getattr(field_file, "_committed", True)
+    field_file.open("rb")
+    try:
+        for chunk in field_file.chunks(get_setting("HASH_CHUNK_SIZE")):
+            digest.update(chunk)
+            size += len(chunk)
+    finally:
+        # Uploaded files are still needed to save them to storage
+        if committed:
+            field_file.close()
+
+    mime_type, _ = mimetypes.guess_type(field_file.name)
+    extension = os.path.splitext(field_file.name)[1].lstrip(".").lower()
+    return {
+        "size": size,
+        "mime_type": mime_type or "",
+        "extension": extension,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def read_chunks(field_file, chunk_size):
+    """
+    Yields the bytes of an open file chunk_size bytes at a time, then closes it.
+
+    :param field_file: Open FieldFile
+    :param chunk_size: Number of bytes to read at a time
+    """
+    try:
+        for chunk in field_file.chunks(chunk_size):
+            yield chunk
+    finally:
+        field_file.close()
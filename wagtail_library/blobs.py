@@ -0,0 +1,171 @@
+# -*- coding:utf8 -*-
+"""Content-addressed attachment storage"""
+
+from __future__ import unicode_literals
+
+import json
+import operator
+import posixpath
+import re
+import threading
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import F, Func, Q, Value
+from wagtail.core.models import PageRevision
+
+from wagtail_library.utils import get_detail_models
+
+
+BLOB_NAME_RE = re.compile(r"(^|/)sha256/[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$")
+
+# Files whose deletion is pending until the current transaction commits, per thread
+_pending = threading.local()
+
+
+def blob_name(sha256, extension=""):
+    """
+    Returns the name of a file stored by its content, relative to the field's upload_to.
+
+    :param sha256: Hex SHA-256 digest of the content
+    :param extension: Extension of the file, without the dot
+    :return: File name
+    """
+    filename = "{}.{}".format(sha256, extension) if extension else sha256
+    return posixpath.join("sha256", sha256[:2], filename)
+
+
+def is_blob_name(name):
+    """
+    Whether the stored file name is content-addressed, so it may be shared.
+
+    :param name: Stored file name
+    :return: Boolean
+    """
+    return bool(BLOB_NAME_RE.search(name or ""))
+
+
+def get_attachment_models():
+    """
+    Returns the detail models storing an attachment column, leaving out models
+    inheriting the column of another.
+
+    :return: List of models
+    """
+    return [
+        model
+        for model in get_detail_models()
+        if model._meta.get_field("attachment").model is model and not model._meta.proxy
+    ]
+
+
+def get_pending_revisions():
+    """
+    Returns the revisions that may still be published: those of pages with unpublished
+    changes, created since the page was last published.
+
+    :return: Queryset of PageRevision instances
+    """
+    return PageRevision.objects.filter(page__has_unpublished_changes=True).filter(
+        Q(page__last_published_at__isnull=True) | Q(created_at__gt=F("page__last_published_at"))
+    )
+
+
+def get_referenced_names(files):
+    """
+    Returns which of the stored files library items or pending revisions (drafts, and
+    revisions scheduled or awaiting moderation) reference. Items are looked up by the
+    digests of the files, through the indexed attachment_sha256 column; only the files no
+    item references are looked for in the pending revisions. Older revisions don't keep
+    a file.
+
+    :param files: Dict of stored file names to the SHA-256 digests of their content
+    :return: Set of referenced file names
+    """
+    referenced = set()
+    if not files:
+        return referenced
+    for model in get_attachment_models():
+        referenced.update(
+            model._default_manager.filter(
+                attachment_sha256__in=set(files.values()), attachment__in=list(files)
+            )
+            .order_by()
+            .values_list("attachment", flat=True)
+        )
+
+    names = [json.dumps(name) for name in sorted(set(files) - referenced)]
+    if names:
+        revisions = get_pending_revisions().filter(
+            reduce(operator.or_, [Q(content_json__contains=name) for name in names])
+        )
+        for content_json in revisions.values_list("content_json", flat=True):
+            referenced.update(json.loads(name) for name in names if name in content_json)
+    return referenced
+
+
+def delete_unreferenced(storage, files):
+    """
+    Deletes the stored files no library item references anymore.
+
+    :param storage: Storage of the files
+    :param files: Dict of stored file names to the SHA-256 digests of their content
+    :return: Set of deleted file names
+    """
+    deleted = set(files) - get_referenced_names(files)
+    for name in sorted(deleted):
+        storage.delete(name)
+    return deleted
+
+
+class PendingDeletions(object):
+    """Stored files to delete once the transaction commits, unless referenced by then."""
+
+    def __init__(self):
+        # Dict of storages to dicts of file names and digests
+        self.files = {}
+
+    def add(self, storage, name, sha256):
+        """Adds a file to check and delete."""
+        self.files.setdefault(storage, {})[name] = sha256
+
+    def __call__(self):
+        """Deletes the files nothing references, called once the transaction commits."""
+        for storage, files in self.files.items():
+            delete_unreferenced(storage, files)
+
+
+def delete_unreferenced_on_commit(storage, name, sha256):
+    """
+    Deletes a stored file once the transaction commits, unless library items reference it
+    by then. The files of a transaction are checked together, e.g. those of the children
+    of a deleted index.
+
+    :param storage: Storage of the file
+    :param name: Stored file name
+    :param sha256: Hex SHA-256 digest of the file's content
+    """
+    pending = getattr(_pending, "deletions", None)
+    connection = transaction.get_connection()
+    # The deletions are dropped with their transaction if it's rolled back
+    if pending is not None and any(func is pending for sids, func in connection.run_on_commit):
+        pending.add(storage, name, sha256)
+        return
+    pending = _pending.deletions = PendingDeletions()
+    pending.add(storage, name, sha256)
+    transaction.on_commit(pending)
+
+
+def replace_references(old_name, new_name):
+    """
+    Points the library items and page revisions referencing a stored file to another.
+
+    :param old_name: Stored file name to replace
+    :param new_name: Stored file name to reference instead
+    """
+    for model in get_attachment_models():
+        model._default_manager.filter(attachment=old_name).update(attachment=new_name)
+    old_json, new_json = json.dumps(old_name), json.dumps(new_name)
+    PageRevision.objects.filter(content_json__contains=old_json).update(
+        content_json=Func(F("content_json"), Value(old_json), Value(new_json), function="REPLACE")
+    )
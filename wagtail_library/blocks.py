@@ -1,4 +1,10 @@
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from wagtail.core.blocks import PageChooserBlock
+from wagtail.core.models import Page
+
+from wagtail_library.cache import get_cache, hash_value, make_key
+from wagtail_library.query import specific_listing
 
 
 class LibraryDetailBlock(PageChooserBlock):
@@ -17,3 +23,100 @@ class LibraryDetailBlock(PageChooserBlock):
         """Block meta."""
 
         template = "wagtail_library/library_detail_block.html"
+        # Large columns the template doesn't need, left out when resolving pages in bulk
+        deferred_fields = ("attachment_text", "search_vector")
+        # Seconds to cache rendered blocks for; None disables it
+        render_cache_timeout = None
+
+    def get_queryset(self):
+        """
+        Returns the queryset used to resolve block values in bulk.
+
+        :return: Queryset of specific pages
+        """
+        if self.target_model is Page:
+            return specific_listing(Page.objects.all())
+        fields = [
+            name
+            for name in self.meta.deferred_fields
+            if name in {field.name for field in self.target_model._meta.concrete_fields}
+        ]
+        return self.target_model.objects.defer(*fields)
+
+    def bulk_to_python(self, values):
+        """
+        Resolves the pages of every block of this type in a stream with one query per
+        page model, keeping the order of the values and None for missing pages.
+
+        :param values: Page IDs
+        :return: List of pages
+        """
+        values = list(values)
+        pages = self.get_queryset().in_bulk([value for value in values if value is not None])
+        return [pages.get(value) for value in values]
+
+    def get_download_url(self, value, context=None):
+        """
+        Returns the download URL of the page, using the request's cached site root paths.
+
+        :param value: Page
+        :param context: Context of the template rendering the stream
+        :return: URL string or None
+        """
+        get_download_url = getattr(value, "get_download_url", None)
+        if get_download_url is None:
+            return None
+        return get_download_url((context or {}).get("request"))
+
+    def get_context(self, value, parent_context=None):
+        """
+        Adds the download URL of the page to the block context.
+
+        :param value: Page
+        :param parent_context: Context of the template rendering the stream
+        :return: Context data to use when rendering the template
+        """
+        context = super(LibraryDetailBlock, self).get_context(value, parent_context=parent_context)
+        context["download_url"] = self.get_download_url(value, parent_context)
+        return context
+
+    def get_render_cache_key(self, value, context=None):
+        """
+        Returns the cache key for the rendered block. It changes whenever the page is
+        published (its last_published_at and latest revision) or unpublished, or a preview
+        of its attachment is stored, and varies on the template, the language and the
+        download URL.
+
+        :param value: Page
+        :param context: Context of the template rendering the stream
+        :return: Cache key
+        """
+        variant = (
+            self.meta.template,
+            get_language(),
+            self.get_download_url(value, context),
+            value.live,
+            value.last_published_at,
+            value.latest_revision_created_at,
+            getattr(value, "attachment_preview_sha256", None),
+        )
+        return make_key("block", value.pk, hash_value(variant))
+
+    def render(self, value, context=None):
+        """
+        Renders the block, from the render cache if render_cache_timeout is set.
+
+        :param value: Page
+        :param context: Context of the template rendering the stream
+        :return: Rendered HTML
+        """
+        if self.meta.render_cache_timeout is None or value is None:
+            return super(LibraryDetailBlock, self).render(value, context=context)
+
+        cache = get_cache()
+        key = self.get_render_cache_key(value, context)
+        html = cache.get(key)
+        if html is None:
+            html = super(LibraryDetailBlock, self).render(value, context=context)
+            cache.set(key, html, self.meta.render_cache_timeout)
+        return mark_safe(html)
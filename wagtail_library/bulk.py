@@ -0,0 +1,294 @@
+# -*- coding:utf8 -*-
+"""Bulk page operations"""
+
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from wagtail.core.models import Page, PageRevision, UserPagePermissionsProxy
+from wagtail.core.signals import page_published, page_unpublished
+
+from wagtail_library.cache import bump_generation, coalesce_generations, get_ancestor_paths
+from wagtail_library.sitemaps import get_sitemap_keys
+
+
+def allocate_child_paths(parent, count):
+    """
+    Returns tree paths for count new children appended after the parent's last child.
+    The caller should hold a lock on the parent row until the paths are used.
+
+    :param parent: Parent page
+    :param count: Number of paths to allocate
+    :return: List of treebeard paths
+    """
+    depth = parent.depth + 1
+    last_path = (
+        Page.objects.filter(path__startswith=parent.path, depth=depth)
+        .order_by("-path")
+        .values_list("path", flat=True)
+        .first()
+    )
+    offset = len(parent.path)
+    step = Page._str2int(last_path[offset:]) + 1 if last_path else 1
+    return [Page._get_path(parent.path, depth, step + index) for index in range(count)]
+
+
+def _check_bulk_model(page):
+    """Bulk inserts only support pages that inherit directly from Page."""
+    if type(page) is not Page and page._meta.get_parent_list() != [Page]:
+        raise ValueError("{} must inherit directly from Page".format(type(page).__name__))
+
+
+def bulk_create_children(parent, pages):
+    """
+    Inserts unsaved pages as the last children of parent in a single transaction.
+
+    Tree paths are allocated for the whole batch at once and the Page rows are created
+    with one INSERT, skipping treebeard's per-node locking and Wagtail's per-page
+    validation. Slugs must already be set and unique among the parent's children; no
+    revisions are created and the search index isn't updated. page_published is sent
+    for each live page once they're inserted, e.g. to extract their attachments' text.
+
+    :param parent: Parent page
+    :param pages: Unsaved page instances of models inheriting directly from Page
+    :return: List of created pages
+    """
+    if not pages:
+        return []
+    for page in pages:
+        _check_bulk_model(page)
+
+    using = router.db_for_write(Page)
+    base_fields = [field for field in Page._meta.concrete_fields if not field.primary_key]
+    now = timezone.now()
+
+    with transaction.atomic(using=using):
+        parent = Page.objects.select_for_update().get(pk=parent.pk)
+        paths = allocate_child_paths(parent, len(pages))
+
+        rows = []
+        for page, path in zip(pages, paths):
+            page.path = path
+            page.depth = parent.depth + 1
+            page.numchild = 0
+            page.url_path = "{}{}/".format(parent.url_path, page.slug)
+            page.draft_title = page.draft_title or page.title
+            if page.live:
+                page.first_published_at = page.first_published_at or now
+                page.last_published_at = page.last_published_at or now
+            rows.append(
+                Page(**{field.attname: getattr(page, field.attname) for field in base_fields})
+            )
+
+        if connections[using].features.can_return_ids_from_bulk_insert:
+            Page.objects.using(using).bulk_create(rows)
+        else:
+            for row in rows:
+                row.save_base(raw=True, force_insert=True, using=using)
+
+        for page, row in zip(pages, rows):
+            page.pk = page.id = row.pk
+            if type(page) is not Page:
+                setattr(page, page._meta.pk.attname, row.pk)
+                # raw saves only insert the model's own table, the Page row already exists
+                page.save_base(raw=True, force_insert=True, using=using)
+
+        Page.objects.filter(pk=parent.pk).update(numchild=F("numchild") + len(pages))
+
+    with coalesce_generations():
+        bump_generation(*get_ancestor_paths(parent.path, parent.steplen))
+        for page in pages:
+            if page.live:
+                page_published.send(sender=type(page), instance=page, revision=None)
+    return pages
+
+
+def _is_current_draft(page):
+    """
+    Whether the page's row already holds its latest content (it has no revisions, or
+    none since it was last published), so publishing it only needs to update its flags.
+    """
+    if page.latest_revision_created_at is None:
+        return True
+    return page.last_published_at is not None and (
+        page.latest_revision_created_at <= page.last_published_at
+    )
+
+
+def bulk_publish(pages):
+    """
+    Publishes a batch of pages in a single transaction, invalidating cached listings
+    once. Pages whose row holds their latest content are published with one UPDATE;
+    others have their latest revision published. page_published is sent for each page.
+
+    :param pages: Specific page instances
+    :return: Number of pages published
+    """
+    pending = [page for page in pages if not page.live or page.has_unpublished_changes]
+    current = [page for page in pending if _is_current_draft(page)]
+    revised = [page for page in pending if not _is_current_draft(page)]
+    now = timezone.now()
+
+    with coalesce_generations():
+        with transaction.atomic():
+            Page.objects.filter(pk__in=[page.pk for page in current]).update(
+                live=True,
+                has_unpublished_changes=False,
+                expired=False,
+                first_published_at=Coalesce("first_published_at", Value(now)),
+                last_published_at=now,
+            )
+            for page in current:
+                page.live, page.has_unpublished_changes, page.expired = True, False, False
+                page.first_published_at = page.first_published_at or now
+                page.last_published_at = now
+                page_published.send(sender=type(page), instance=page, revision=None)
+            for page in revised:
+                page.get_latest_revision().publish()
+    return len(pending)
+
+
+def bulk_unpublish(pages):
+    """
+    Unpublishes a batch of pages with one UPDATE in a single transaction, invalidating
+    cached listings once. page_unpublished is sent for each page.
+
+    :param pages: Specific page instances
+    :return: Number of pages unpublished
+    """
+    live = [page for page in pages if page.live]
+    ids = [page.pk for page in live]
+
+    with coalesce_generations():
+        with transaction.atomic():
+            Page.objects.filter(pk__in=ids).update(
+                live=False, has_unpublished_changes=True, live_revision=None
+            )
+            PageRevision.objects.filter(page_id__in=ids).update(approved_go_live_at=None)
+            for page in live:
+                page.live, page.has_unpublished_changes, page.live_revision = False, True, None
+                page_unpublished.send(sender=type(page), instance=page)
+    return len(live)
+
+
+def bulk_move(pages, target):
+    """
+    Moves a batch of pages without children to the end of target's children in a single
+    transaction, with one UPDATE of their tree paths rather than a treebeard move each,
+    invalidating cached listings once. Pages already under target, that can't exist
+    under it, or whose slug is taken there are left where they are.
+
+    :param pages: Page instances
+    :param target: New parent page
+    :return: Number of pages moved
+    """
+    candidates = [
+        page
+        for page in pages
+        if not page.numchild
+        and page.path[: -page.steplen] != target.path
+        and type(page).can_exist_under(target)
+    ]
+    if not candidates:
+        return 0
+
+    with coalesce_generations():
+        with transaction.atomic():
+            target = Page.objects.select_for_update().get(pk=target.pk)
+            slugs = {page.slug for page in candidates}
+            taken = set(
+                Page.objects.child_of(target).filter(slug__in=slugs).values_list("slug", flat=True)
+            )
+            movable = []
+            for page in candidates:
+                if page.slug not in taken:
+                    taken.add(page.slug)
+                    movable.append(page)
+            if not movable:
+                return 0
+
+            paths = allocate_child_paths(target, len(movable))
+            old_parents = Counter(page.path[: -page.steplen] for page in movable)
+            url_paths = ["{}{}/".format(target.url_path, page.slug) for page in movable]
+            Page.objects.filter(pk__in=[page.pk for page in movable]).update(
+                path=Case(
+                    *[When(pk=page.pk, then=Value(path)) for page, path in zip(movable, paths)],
+                    output_field=CharField(),
+                ),
+                url_path=Case(
+                    *[When(pk=page.pk, then=Value(url)) for page, url in zip(movable, url_paths)],
+                    output_field=CharField(),
+                ),
+                depth=target.depth + 1,
+            )
+            for parent_path, count in old_parents.items():
+                Page.objects.filter(path=parent_path).update(numchild=F("numchild") - count)
+            Page.objects.filter(pk=target.pk).update(numchild=F("numchild") + len(movable))
+
+            for page, path, url_path in zip(movable, paths, url_paths):
+                page.path, page.depth, page.url_path = path, target.depth + 1, url_path
+                bump_generation(*get_sitemap_keys(page.pk))
+            for parent_path in old_parents:
+                bump_generation(*get_ancestor_paths(parent_path, target.steplen))
+            bump_generation(*get_ancestor_paths(target.path, target.steplen))
+    return len(movable)
+
+
+# Bulk operations by name, each taking a batch of pages and returning the number changed
+BULK_OPERATIONS = {"publish": bulk_publish, "unpublish": bulk_unpublish, "move": bulk_move}
+
+# Whether a user may apply each bulk operation to a page, given the page's
+# PagePermissionTester and the operation's keyword arguments
+BULK_PERMISSIONS = {
+    "publish": lambda permissions: permissions.can_publish(),
+    "unpublish": lambda permissions: permissions.can_unpublish(),
+    "move": lambda permissions, target: permissions.can_move_to(target),
+}
+
+
+def get_permitted_pages(action, pages, user, **kwargs):
+    """
+    Returns the pages a user may apply a bulk operation to, checking the permissions of
+    every page with a single query.
+
+    :param action: Name of the operation in BULK_OPERATIONS
+    :param pages: Page instances
+    :param user: User applying the operation
+    :param kwargs: Keyword arguments of the operation
+    :return: List of pages
+    """
+    permissions = UserPagePermissionsProxy(user)
+    check = BULK_PERMISSIONS[action]
+    return [page for page in pages if check(permissions.for_page(page), **kwargs)]
+
+
+def run_in_batches(action, queryset, batch_size=100, user=None, **kwargs):
+    """
+    Applies a bulk operation to the pages of a queryset, batch_size pages at a time in ID
+    order, each batch in its own transaction. Given a user, the pages they aren't allowed
+    to change are skipped.
+
+    :param action: Name of the operation in BULK_OPERATIONS
+    :param queryset: Queryset of specific pages
+    :param batch_size: Number of pages per batch
+    :param user: User applying the operation, None to skip permission checks
+    :param kwargs: Keyword arguments of the operation
+    :return: Iterator of (pages in the batch, pages changed, pages not permitted) tuples,
+        after each batch
+    """
+    operation = BULK_OPERATIONS[action]
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        permitted = batch
+        if user is not None:
+            permitted = get_permitted_pages(action, batch, user, **kwargs)
+        changed = operation(permitted, **kwargs) if permitted else 0
+        yield len(batch), changed, len(batch) - len(permitted)
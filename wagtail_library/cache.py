@@ -0,0 +1,136 @@
+# -*- coding:utf8 -*-
+"""Cache helpers"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+
+from wagtail_library.conf import get_setting
+
+
+KEY_PREFIX = "wagtail_library"
+
+# Generation bumps collected by coalesce_generations, per thread
+_coalesced = threading.local()
+
+
+def get_cache():
+    """
+    Returns the cache backend configured for wagtail_library.
+
+    :return: Django cache backend
+    """
+    return caches[get_setting("CACHE")]
+
+
+def make_key(*parts):
+    """
+    Builds a cache key from the given parts.
+
+    :param parts: Values to join into the key
+    :return: Cache key string
+    """
+    return ":".join([KEY_PREFIX] + [str(part) for part in parts])
+
+
+def hash_value(value):
+    """
+    Returns a short, stable digest of the given value for use in cache keys.
+
+    :param value: Any value with a deterministic repr
+    :return: Hex digest string
+    """
+    return hashlib.md5(repr(value).encode("utf-8")).hexdigest()
+
+
+def hash_queryset(queryset):
+    """
+    Returns a digest of the SQL (and parameters) the given queryset would run.
+
+    :param queryset: Django queryset
+    :return: Hex digest string
+    """
+    return hash_value(queryset.query.sql_with_params())
+
+
+def _initial_generation():
+    """
+    Generation counters start from the current time in milliseconds, so a counter that
+    has been evicted never restarts at a value that was already used.
+    """
+    return int(time.time() * 1000)
+
+
+def get_generation(path):
+    """
+    Returns the current generation counter of the page with the given tree path.
+
+    Cached values derived from a page's children include the generation in their keys,
+    so bumping it invalidates all of them at once.
+
+    :param path: Treebeard path of the page
+    :return: Integer generation
+    """
+    cache = get_cache()
+    key = make_key("generation", path)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key, _initial_generation())
+    return generation
+
+
+def get_ancestor_paths(path, steplen):
+    """
+    Returns the tree paths of a page and all its ancestors, whose cached listings may
+    include the page when they list their descendants.
+
+    :param path: Treebeard path of the page
+    :param steplen: Length of each step of treebeard paths
+    :return: List of treebeard paths, from the page up to the root
+    """
+    return [path[:end] for end in range(len(path), 0, -steplen)]
+
+
+@contextmanager
+def coalesce_generations():
+    """
+    Collects the generation bumps made in the block and applies them once at its end,
+    so a batch of changes to pages sharing ancestors invalidates each listing once.
+    Enter it outside the batch's transaction, so listings are invalidated after it
+    commits.
+    """
+    if getattr(_coalesced, "paths", None) is not None:
+        yield
+        return
+    _coalesced.paths = set()
+    try:
+        yield
+    finally:
+        paths, _coalesced.paths = _coalesced.paths, None
+        bump_generation(*paths)
+
+
+def bump_generation(*paths):
+    """
+    Increments the generation counters of the pages with the given tree paths, or
+    collects them inside coalesce_generations.
+
+    :param paths: Treebeard paths of the pages
+    """
+    coalesced = getattr(_coalesced, "paths", None)
+    if coalesced is not None:
+        coalesced.update(paths)
+        return
+    cache = get_cache()
+    for path in set(paths):
+        key = make_key("generation", path)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
@@ -0,0 +1,56 @@
+# -*- coding:utf8 -*-
+"""Settings for wagtail_library, each overridable with a WAGTAIL_LIBRARY_ prefixed setting."""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Maximum number of characters of attachment text stored for search
+    "ATTACHMENT_TEXT_MAX_LENGTH": 100000,
+    # Number of threads (or processes, with run_in_process_pool) running background tasks
+    # in each web process
+    "BACKGROUND_WORKERS": 1,
+    # Number of items above which bulk actions in the admin run as a background task
+    "BULK_INLINE_LIMIT": 100,
+    # Alias of the cache backend used for counts, generations and rendered output
+    "CACHE": "default",
+    # Store attachments under the SHA-256 digest of their content, sharing identical files
+    "CONTENT_ADDRESSED_STORAGE": False,
+    # Seconds to keep cached child counts for
+    "COUNT_CACHE_TIMEOUT": 60 * 60,
+    # Bytes read at a time when streaming attachment downloads
+    "DOWNLOAD_CHUNK_SIZE": 64 * 1024,
+    # Seconds between flushes of the download counts buffered by each process
+    "DOWNLOAD_FLUSH_INTERVAL": 60,
+    # Number of children fetched from the database at a time by JSON exports
+    "EXPORT_CHUNK_SIZE": 2000,
+    # Bytes read at a time when hashing attachments
+    "HASH_CHUNK_SIZE": 64 * 1024,
+    # Maximum width and height in pixels of attachment previews
+    "PREVIEW_SIZE": 320,
+    # PostgreSQL text search configuration used for library item search vectors and queries
+    "SEARCH_CONFIG": "english",
+    # Hand downloads off to the web server: None, "x-accel-redirect" or "x-sendfile"
+    "SENDFILE_BACKEND": None,
+    # URL prefix of the internal nginx location serving MEDIA_ROOT, for X-Accel-Redirect
+    "SENDFILE_URL_PREFIX": "/protected/",
+    # Range of page IDs listed by each chunk of the library sitemap
+    "SITEMAP_CHUNK_SIZE": 10000,
+    # Seconds after which a stage of serving a listing is logged as slow; None disables it
+    "SLOW_STAGE_THRESHOLD": None,
+    # Dotted path of a callable taking a task and its arguments, to run tasks in a queue,
+    # or "wagtail_library.tasks.run_in_process_pool" to run them in worker processes
+    "TASK_RUNNER": None,
+}
+
+
+def get_setting(name):
+    """
+    Returns the value of a wagtail_library setting.
+
+    :param name: Setting name without the WAGTAIL_LIBRARY_ prefix
+    :return: Configured value or the default
+    """
+    return getattr(settings, "WAGTAIL_LIBRARY_{}".format(name), DEFAULTS[name])
@@ -0,0 +1,135 @@
+# -*- coding:utf8 -*-
+"""Buffered download counters"""
+
+from __future__ import unicode_literals
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.db import models, transaction
+
+from wagtail_library.conf import get_setting
+from wagtail_library.tasks import run_in_background
+
+
+# Number of items updated by each UPDATE statement when flushing counts
+FLUSH_BATCH_SIZE = 500
+
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+# ID of the process the flusher thread was started in, as threads don't survive forks
+_flusher_pid = None
+
+
+def record_download(page):
+    """
+    Counts a download of the library item's attachment.
+
+    Downloads are counted in memory and flushed to the database in the background every
+    WAGTAIL_LIBRARY_DOWNLOAD_FLUSH_INTERVAL seconds, so popular items don't make every
+    download wait for a lock on their row.
+
+    :param page: Library detail page
+    """
+    if _flusher_pid != os.getpid():
+        start_flusher()
+    with _buffer_lock:
+        _buffer[(page._meta.label, page.pk)] += 1
+    flush_if_due()
+
+
+def flush_if_due():
+    """Flushes the buffer in the background if the flush interval has elapsed."""
+    global _last_flush
+    with _buffer_lock:
+        if time.monotonic() - _last_flush < get_setting("DOWNLOAD_FLUSH_INTERVAL"):
+            return
+        counts = _take_buffer()
+        _last_flush = time.monotonic()
+    if counts:
+        run_in_background(flush_download_counts, counts)
+
+
+def start_flusher():
+    """
+    Starts the thread flushing the buffer of this process every flush interval, so the
+    counts of a process serving no more downloads aren't held back until it exits.
+    """
+    global _flusher_pid
+    with _buffer_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    thread = threading.Thread(
+        target=_flush_periodically, args=(threading.Event(),), name="wagtail-library-downloads"
+    )
+    thread.daemon = True
+    thread.start()
+
+
+def _flush_periodically(stopped):
+    """
+    Flushes the buffer whenever it's due, until stopped is set. Run by the flusher thread.
+
+    :param stopped: threading.Event
+    """
+    while not stopped.wait(max(get_setting("DOWNLOAD_FLUSH_INTERVAL"), 1)):
+        flush_if_due()
+
+
+def _take_buffer():
+    """
+    Empties the buffer, returning its counts. Callers hold the buffer lock.
+
+    :return: List of [model label, page ID, downloads] lists, which stay picklable and
+        JSON serialisable for task queues
+    """
+    counts = [[label, pk, count] for (label, pk), count in sorted(_buffer.items())]
+    _buffer.clear()
+    return counts
+
+
+def flush_buffer():
+    """
+    Writes the downloads counted by this process to the database straight away,
+    e.g. before it exits.
+    """
+    with _buffer_lock:
+        counts = _take_buffer()
+    flush_download_counts(counts)
+
+
+def flush_download_counts(counts):
+    """
+    Adds downloads to the download counts of library items, with one UPDATE per model and
+    batch of items rather than one per download. Rows are locked in ID order first, so
+    concurrent flushes can't deadlock.
+
+    :param counts: List of [model label, page ID, downloads] lists
+    """
+    by_model = {}
+    for label, pk, count in counts:
+        by_model.setdefault(label, []).append((pk, count))
+
+    for label, items in sorted(by_model.items()):
+        model = apps.get_model(label)
+        for start in range(0, len(items), FLUSH_BATCH_SIZE):
+            end = start + FLUSH_BATCH_SIZE
+            batch = items[start:end]
+            increment = models.Case(
+                *[models.When(pk=pk, then=models.Value(count)) for pk, count in batch],
+                default=models.Value(0),
+                output_field=models.PositiveIntegerField(),
+            )
+            queryset = model._default_manager.filter(pk__in=[pk for pk, count in batch])
+            with transaction.atomic():
+                list(queryset.select_for_update().order_by("pk").values_list("pk", flat=True))
+                queryset.update(download_count=models.F("download_count") + increment)
+
+
+atexit.register(flush_buffer)
@@ -0,0 +1,95 @@
+# -*- coding:utf8 -*-
+"""Attachment text extraction"""
+
+from __future__ import unicode_literals
+
+import io
+import logging
+from html import unescape
+
+from django.utils.html import strip_tags
+
+from wagtail_library.conf import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+def extract_plain_text(data):
+    """Decodes a plain text document."""
+    return data.decode("utf-8", errors="replace")
+
+
+def extract_html_text(data):
+    """Returns the text of an HTML document."""
+    return unescape(strip_tags(extract_plain_text(data).replace("<", " <")))
+
+
+def extract_pdf_text(data):
+    """Returns the text of a PDF document, using pdfminer.six if it's installed."""
+    try:
+        from pdfminer.high_level import extract_text_to_fp
+    except ImportError:
+        logger.debug("pdfminer.six isn't installed, PDF text can't be extracted")
+        return ""
+    output = io.StringIO()
+    extract_text_to_fp(io.BytesIO(data), output)
+    return output.getvalue()
+
+
+# Text extractors, keyed by MIME type. Each takes the file's bytes and returns its text.
+EXTRACTORS = {
+    "application/pdf": extract_pdf_text,
+    "text/csv": extract_plain_text,
+    "text/html": extract_html_text,
+    "text/markdown": extract_plain_text,
+    "text/plain": extract_plain_text,
+}
+
+
+def can_extract_text(mime_type):
+    """
+    Whether text can be extracted from files of the MIME type.
+
+    :param mime_type: MIME type of the file
+    :return: Boolean
+    """
+    return mime_type in EXTRACTORS
+
+
+def extract_text(data, mime_type, max_length=None):
+    """
+    Extracts the text of a document, with whitespace collapsed and truncated to
+    max_length characters. This only works on bytes, so it can run in another process.
+
+    :param data: Contents of the file
+    :param mime_type: MIME type of the file
+    :param max_length: Maximum length of the text, defaults to ATTACHMENT_TEXT_MAX_LENGTH
+    :return: Extracted text, empty if the type isn't supported or the file can't be parsed
+    """
+    if max_length is None:
+        max_length = get_setting("ATTACHMENT_TEXT_MAX_LENGTH")
+    extractor = EXTRACTORS.get(mime_type)
+    if extractor is None:
+        return ""
+    try:
+        text = extractor(data)
+    except Exception:
+        logger.warning("Unable to extract text from a %s document", mime_type, exc_info=True)
+        return ""
+    # PostgreSQL text can't hold NUL characters
+    return " ".join(text.replace("\x00", " ").split())[:max_length]
+
+
+def read_attachment(field_file):
+    """
+    Reads the whole attachment, closing it afterwards.
+
+    :param field_file: FieldFile of the attachment
+    :return: Bytes
+    """
+    field_file.open("rb")
+    try:
+        return field_file.read()
+    finally:
+        field_file.close()
@@ -0,0 +1,108 @@
+# -*- coding:utf8 -*-
+"""Listing facets"""
+
+from __future__ import unicode_literals
+
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, Concat
+
+
+class Facet(object):
+    """
+    A way of narrowing a listing by the values of an expression, e.g. the year or type
+    of the children, with a count of the children for each value.
+    """
+
+    # Annotation holding the facet name and value, and the count, in facet count queries
+    value_alias = "_facet_value"
+    count_alias = "_facet_count"
+
+    def __init__(self, name, expression, label=None, many=False, ordering="-count"):
+        """
+        :param name: Querystring parameter of the facet, mustn't contain a colon
+        :param expression: Field lookup (e.g. "tags__name") or expression giving the values
+        :param label: Human readable name, defaults to the name
+        :param many: Whether children can have several values (many-to-many lookups)
+        :param ordering: Order of the options: "count", "-count", "value" or "-value"
+        """
+        self.name = name
+        self.expression = expression
+        self.label = label or name.capitalize()
+        self.many = many
+        self.ordering = ordering
+
+    def get_expression(self):
+        """
+        Returns the facet values as text, so they can be compared with querystring values.
+
+        :return: Expression
+        """
+        expression = F(self.expression) if isinstance(self.expression, str) else self.expression
+        return Cast(expression, CharField())
+
+    def filter(self, queryset, values):
+        """
+        Filters the queryset to children with any of the values.
+
+        :param queryset: Queryset of children
+        :param values: Selected values
+        :return: Queryset
+        """
+        alias = "_facet_{}".format(self.name)
+        if self.many:
+            # Filtering through a join would repeat children having several of the values
+            matches = (
+                queryset.model._default_manager.annotate(**{alias: self.get_expression()})
+                .filter(**{"{}__in".format(alias): values})
+                .values("pk")
+            )
+            return queryset.filter(pk__in=matches)
+        return queryset.annotate(**{alias: self.get_expression()}).filter(
+            **{"{}__in".format(alias): values}
+        )
+
+    def get_count_queryset(self, queryset):
+        """
+        Returns a queryset counting the children for each value, as "name:value" strings.
+
+        :param queryset: Queryset of children
+        :return: Values queryset
+        """
+        return (
+            queryset.order_by()
+            .annotate(**{self.value_alias: Concat(Value(self.name + ":"), self.get_expression())})
+            .values(self.value_alias)
+            .annotate(**{self.count_alias: Count("pk")})
+            .values_list(self.value_alias, self.count_alias)
+        )
+
+    def sort_options(self, options):
+        """
+        Sorts (value, count) options by the facet's ordering.
+
+        :param options: List of (value, count) tuples
+        :return: Sorted list
+        """
+        key = self.ordering.lstrip("-")
+        index = 1 if key == "count" else 0
+        return sorted(options, key=lambda option: option[index], reverse=self.ordering[0] == "-")
+
+
+def count_facets(facets, get_queryset):
+    """
+    Counts the children for each value of every facet in a single query.
+
+    :param facets: List of Facet instances
+    :param get_queryset: Callable returning the queryset of children to count for a facet
+    :return: Dict of facet name to a list of (value, count) tuples
+    """
+    counts = {facet.name: [] for facet in facets}
+    if not facets:
+        return counts
+    querysets = [facet.get_count_queryset(get_queryset(facet)) for facet in facets]
+    union = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    for facet_value, count in union:
+        name, _, value = facet_value.partition(":")
+        if value:
+            counts[name].append((value, count))
+    return counts
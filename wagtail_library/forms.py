@@ -0,0 +1,44 @@
+# -*- coding:utf8 -*-
+"""wagtail_library admin forms"""
+
+from __future__ import unicode_literals
+
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+from wagtail.core.models import Page
+
+from wagtail_library.abstract_models import AbstractLibraryIndex
+
+
+class BulkActionForm(forms.Form):
+    """Chooses a bulk operation and the children of an index it applies to."""
+
+    action = forms.ChoiceField(
+        label=_("Action"),
+        choices=[("publish", _("Publish")), ("unpublish", _("Unpublish")), ("move", _("Move"))],
+    )
+    target = forms.ModelChoiceField(
+        label=_("Move to"), queryset=Page.objects.none(), required=False
+    )
+    ids = forms.ModelMultipleChoiceField(queryset=Page.objects.none(), required=False)
+    all_matching = forms.BooleanField(label=_("Apply to every matching item"), required=False)
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialization code
+
+        :param children: Queryset of the children matching the filter
+        """
+        children = kwargs.pop("children")
+        super(BulkActionForm, self).__init__(*args, **kwargs)
+        self.fields["ids"].queryset = children
+        self.fields["target"].queryset = Page.objects.type(AbstractLibraryIndex).order_by("path")
+
+    def clean(self):
+        """Checks the items and, for moves, the target were chosen."""
+        cleaned_data = super(BulkActionForm, self).clean()
+        if not cleaned_data.get("ids") and not cleaned_data.get("all_matching"):
+            raise forms.ValidationError(_("Select items, or apply to every matching item."))
+        if cleaned_data.get("action") == "move" and not cleaned_data.get("target"):
+            self.add_error("target", _("Choose where to move the items."))
+        return cleaned_data
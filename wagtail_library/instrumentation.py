@@ -0,0 +1,133 @@
+# -*- coding:utf8 -*-
+"""Timing and query counts of the stages of rendering library listings."""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from django.db import connection
+from django.dispatch import Signal
+
+from wagtail_library.conf import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+# Sent after each instrumented stage, e.g. to record it in a metrics system
+stage_finished = Signal(providing_args=["page", "stage", "duration", "queries", "request"])
+
+# Innermost stage being measured in each thread
+_active = threading.local()
+
+
+def instrumentation_enabled():
+    """
+    Whether stages are measured: only when something receives stage_finished or a slow
+    stage threshold is set, so listings aren't slowed down otherwise.
+
+    :return: Boolean
+    """
+    return bool(stage_finished.receivers) or get_setting("SLOW_STAGE_THRESHOLD") is not None
+
+
+class Stage(object):
+    """
+    Context manager measuring the wall time and number of queries of a stage, then
+    sending stage_finished and logging a warning if it exceeded SLOW_STAGE_THRESHOLD.
+
+    Stages measured within another are left out of its time and queries, so stages never
+    overlap, and share its request unless given their own.
+    """
+
+    def __init__(self, sender, name, request=None):
+        """
+        :param sender: Page being rendered
+        :param name: Name of the stage, e.g. "count" or "render"
+        :param request: HttpRequest instance
+        """
+        self.sender = sender
+        self.name = name
+        self.request = request
+        self.queries = 0
+        self.duration = None
+        self.parent = None
+        self.nested_duration = 0
+        self.nested_queries = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        """Database execute wrapper counting the queries run during the stage."""
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.parent = getattr(_active, "stage", None)
+        if self.request is None and self.parent is not None:
+            self.request = self.parent.request
+        _active.stage = self
+        self.wrapper = connection.execute_wrapper(self.count_query)
+        self.wrapper.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.started
+        self.wrapper.__exit__(exc_type, exc_value, traceback)
+        _active.stage = self.parent
+        self.duration = duration - self.nested_duration
+        self.queries -= self.nested_queries
+        if self.parent is not None:
+            # The enclosing stage counted the queries too, and its time includes ours
+            self.parent.nested_duration += duration
+            self.parent.nested_queries += self.queries + self.nested_queries
+        if exc_type is None:
+            self.report()
+
+    def report(self):
+        """Sends stage_finished and logs the stage if it was slow."""
+        stage_finished.send(
+            sender=type(self.sender),
+            page=self.sender,
+            stage=self.name,
+            duration=self.duration,
+            queries=self.queries,
+            request=self.request,
+        )
+        threshold = get_setting("SLOW_STAGE_THRESHOLD")
+        if threshold is not None and self.duration >= threshold:
+            logger.warning(
+                "Slow %s stage of %s: %.1fms, %d queries",
+                self.name,
+                self.sender,
+                self.duration * 1000,
+                self.queries,
+            )
+
+
+class NullStage(object):
+    """Stand-in for Stage when instrumentation is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+def measure_stage(sender, name, request=None):
+    """
+    Returns a context manager measuring a stage, or a no-op one if instrumentation is
+    disabled.
+
+    :param sender: Page being rendered
+    :param name: Name of the stage
+    :param request: HttpRequest instance, defaults to that of the enclosing stage
+    :return: Stage or NullStage instance
+    """
+    if instrumentation_enabled():
+        return Stage(sender, name, request=request)
+    return NULL_STAGE
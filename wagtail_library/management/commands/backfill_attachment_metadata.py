@@ -0,0 +1,82 @@
+# -*- coding:utf8 -*-
+"""Backfills denormalised attachment metadata."""
+
+from __future__ import unicode_literals
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from wagtail_library.attachments import get_file_metadata
+from wagtail_library.utils import get_detail_models
+
+
+class Command(BaseCommand):
+    """Stores the size, MIME type, extension and SHA-256 of existing attachments."""
+
+    help = "Stores the size, MIME type, extension and SHA-256 of library item attachments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Number of items updated per transaction"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of attachments hashed in parallel"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            dest="all",
+            help="Recalculate the metadata of every item, not only items missing it",
+        )
+
+    @staticmethod
+    def read_metadata(page):
+        """Returns the attachment metadata of the page, or None if it can't be read."""
+        try:
+            return get_file_metadata(page.attachment)
+        except (IOError, OSError):
+            return None
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        started = time.time()
+        updated = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for model in get_detail_models():
+                queryset = model.objects.exclude(attachment="").only("pk", "attachment")
+                if not options["all"]:
+                    queryset = queryset.filter(attachment_sha256="")
+
+                last_pk = 0
+                while True:
+                    batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+
+                    with transaction.atomic():
+                        for page, metadata in zip(batch, executor.map(self.read_metadata, batch)):
+                            if metadata is None:
+                                failed += 1
+                                self.stderr.write("Unable to read {}".format(page.attachment.name))
+                                continue
+                            model.objects.filter(pk=page.pk).update(
+                                attachment_size=metadata["size"],
+                                attachment_mime_type=metadata["mime_type"],
+                                attachment_extension=metadata["extension"],
+                                attachment_sha256=metadata["sha256"],
+                            )
+                            updated += 1
+
+                    elapsed = time.time() - started
+                    self.stdout.write(
+                        "{} updated, {} failed ({:.1f} items/s)".format(
+                            updated, failed, (updated + failed) / max(elapsed, 0.001)
+                        )
+                    )
+
+        self.stdout.write("Done: {} updated, {} failed".format(updated, failed))
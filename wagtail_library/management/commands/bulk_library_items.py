@@ -0,0 +1,79 @@
+# -*- coding:utf8 -*-
+"""Publishes, unpublishes or moves library items in bulk."""
+
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from wagtail.core.models import Page
+
+from wagtail_library.abstract_models import AbstractLibraryIndex
+from wagtail_library.bulk import BULK_OPERATIONS, run_in_batches
+
+
+class Command(BaseCommand):
+    """Applies a bulk operation to the children of an index, in batched transactions."""
+
+    help = "Publishes, unpublishes or moves the children of a library index in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=sorted(BULK_OPERATIONS), help="Operation to apply")
+        parser.add_argument("index", type=int, help="ID of the index whose children are changed")
+        parser.add_argument(
+            "--filter",
+            default="",
+            help="Listing querystring selecting the children, e.g. 'type=pdf&q=report'",
+        )
+        parser.add_argument("--ids", help="Comma separated IDs of the children to change")
+        parser.add_argument("--target", type=int, help="ID of the page to move the children to")
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Number of items changed per transaction"
+        )
+
+    def get_page(self, pk):
+        """Returns the specific page with the given ID."""
+        try:
+            return Page.objects.get(pk=pk).specific
+        except Page.DoesNotExist:
+            raise CommandError("Page {} does not exist".format(pk))
+
+    def handle(self, *args, **options):
+        index = self.get_page(options["index"])
+        if not isinstance(index, AbstractLibraryIndex):
+            raise CommandError("Page {} isn't a library index".format(index.pk))
+
+        kwargs = {}
+        if options["action"] == "move":
+            if options["target"] is None:
+                raise CommandError("Use --target to choose where to move the items")
+            kwargs["target"] = self.get_page(options["target"])
+
+        ids = None
+        if options["ids"]:
+            try:
+                ids = [int(pk) for pk in options["ids"].split(",")]
+            except ValueError:
+                raise CommandError("--ids must be comma separated page IDs")
+
+        children = index.get_bulk_children(options["filter"], ids=ids)
+        started = time.time()
+        processed = changed = 0
+
+        for batch_size, batch_changed, denied in run_in_batches(
+            options["action"], children, batch_size=options["batch_size"], **kwargs
+        ):
+            processed += batch_size
+            changed += batch_changed
+            elapsed = time.time() - started
+            self.stdout.write(
+                "{} processed, {} changed ({:.1f} items/s)".format(
+                    processed, changed, processed / max(elapsed, 0.001)
+                )
+            )
+
+        self.stdout.write(
+            "Done: {} {}, {} skipped".format(
+                changed, options["action"].rstrip("e") + "ed", processed - changed
+            )
+        )
@@ -0,0 +1,120 @@
+# -*- coding:utf8 -*-
+"""Moves existing attachments to content-addressed storage."""
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from wagtail_library.blobs import (
+    blob_name,
+    delete_unreferenced,
+    get_attachment_models,
+    is_blob_name,
+    replace_references,
+)
+
+
+class Command(BaseCommand):
+    """
+    Stores every attachment under the SHA-256 digest of its content, so identical files
+    are shared, and deletes the files nothing references anymore.
+    """
+
+    help = "Moves attachments to content-addressed storage, removing duplicate files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Number of library items loaded at a time"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            dest="dry_run",
+            help="Report what would be done without changing anything",
+        )
+
+    def deduplicate(self, page, dry_run):
+        """
+        Moves the attachment of the page to its content-addressed name.
+
+        :return: Number of bytes freed by removing a duplicate, or None if the attachment
+            couldn't be read
+        """
+        attachment = page.attachment
+        if not page.attachment_sha256:
+            page.update_attachment_metadata()
+            if not page.attachment_sha256:
+                return None
+            if not dry_run:
+                type(page)._default_manager.filter(pk=page.pk).update(
+                    **{name: getattr(page, name) for name in page.attachment_metadata_fields}
+                )
+
+        old_name = attachment.name
+        new_name = attachment.field.generate_filename(
+            page, blob_name(page.attachment_sha256, page.attachment_extension)
+        )
+        # Dry runs don't store anything, so duplicates are recognised by their digests
+        duplicate = page.attachment_sha256 in self.digests or attachment.storage.exists(new_name)
+        self.digests.add(page.attachment_sha256)
+        self.replaced.add(old_name)
+        if dry_run:
+            return (page.attachment_size or 0) if duplicate else 0
+
+        if not attachment.storage.exists(new_name):
+            try:
+                attachment.open("rb")
+                try:
+                    new_name = attachment.storage.save(new_name, attachment)
+                finally:
+                    attachment.close()
+            except (IOError, OSError):
+                return None
+
+        with transaction.atomic():
+            replace_references(old_name, new_name)
+        if (
+            delete_unreferenced(attachment.storage, {old_name: page.attachment_sha256})
+            and duplicate
+        ):
+            return page.attachment_size or 0
+        return 0
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        moved = failed = freed = 0
+        # Digests and names of the files handled during this run
+        self.digests, self.replaced = set(), set()
+
+        for model in get_attachment_models():
+            queryset = model._default_manager.exclude(attachment="").defer(
+                "attachment_text", "search_vector"
+            )
+            last_pk = 0
+            while True:
+                batch = list(
+                    queryset.filter(pk__gt=last_pk).order_by("pk")[: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                for page in batch:
+                    name = page.attachment.name
+                    # Items sharing a file already handled were updated along with it
+                    if is_blob_name(name) or name in self.replaced:
+                        continue
+                    result = self.deduplicate(page, dry_run)
+                    if result is None:
+                        failed += 1
+                        self.stderr.write("Unable to read {}".format(page.attachment.name))
+                        continue
+                    moved += 1
+                    freed += result
+
+        self.stdout.write(
+            "Done: {} moved, {} failed, {} bytes freed{}".format(
+                moved, failed, freed, " (dry run)" if dry_run else ""
+            )
+        )
@@ -0,0 +1,93 @@
+# -*- coding:utf8 -*-
+"""Extracts the text of attachments in bulk."""
+
+from __future__ import unicode_literals
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from wagtail_library.conf import get_setting
+from wagtail_library.extraction import EXTRACTORS, extract_text, read_attachment
+from wagtail_library.utils import get_detail_models
+
+
+class Command(BaseCommand):
+    """Extracts and stores the text of library item attachments for search."""
+
+    help = "Extracts and stores the text of library item attachments for search."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Number of attachments read into memory and updated per transaction",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of processes extracting text"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            dest="all",
+            help="Extract the text of every attachment, not only new or replaced ones",
+        )
+
+    def read_batch(self, batch):
+        """Returns the pages of the batch that could be read, with their attachments."""
+        pages, contents = [], []
+        for page in batch:
+            try:
+                contents.append(read_attachment(page.attachment))
+            except (IOError, OSError):
+                self.stderr.write("Unable to read {}".format(page.attachment.name))
+                continue
+            pages.append(page)
+        return pages, contents
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        max_length = get_setting("ATTACHMENT_TEXT_MAX_LENGTH")
+        started = time.time()
+        extracted = failed = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            for model in get_detail_models():
+                queryset = model.objects.exclude(attachment="").filter(
+                    attachment_mime_type__in=list(EXTRACTORS)
+                )
+                if not options["all"]:
+                    queryset = queryset.exclude(attachment_text_sha256=F("attachment_sha256"))
+
+                last_pk = 0
+                while True:
+                    batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+
+                    pages, contents = self.read_batch(batch)
+                    failed += len(batch) - len(pages)
+                    texts = executor.map(
+                        extract_text,
+                        contents,
+                        [page.attachment_mime_type for page in pages],
+                        [max_length] * len(pages),
+                    )
+                    with transaction.atomic():
+                        for page, text in zip(pages, texts):
+                            page.store_attachment_text(text)
+                            extracted += 1
+
+                    elapsed = time.time() - started
+                    self.stdout.write(
+                        "{} extracted, {} failed ({:.1f} items/s)".format(
+                            extracted, failed, (extracted + failed) / max(elapsed, 0.001)
+                        )
+                    )
+
+        self.stdout.write("Done: {} extracted, {} failed".format(extracted, failed))
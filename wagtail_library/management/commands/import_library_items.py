@@ -0,0 +1,194 @@
+# -*- coding:utf8 -*-
+"""Imports library items in bulk."""
+
+from __future__ import unicode_literals
+
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+from wagtail.core.models import Page
+
+from wagtail_library.abstract_models import AbstractLibraryDetail
+from wagtail_library.bulk import bulk_create_children
+
+
+def read_manifest(source):
+    """
+    Reads the items to import from a directory, a CSV file or a JSON file.
+
+    Every file in a directory becomes an item titled after the file name. CSV and JSON
+    manifests list items with a title, an optional file (relative to the manifest), an
+    optional slug and values for any other field of the model.
+
+    :param source: Path of the directory or manifest
+    :return: List of dicts
+    """
+    if os.path.isdir(source):
+        return [
+            {"title": os.path.splitext(name)[0], "file": os.path.join(source, name)}
+            for name in sorted(os.listdir(source))
+            if os.path.isfile(os.path.join(source, name))
+        ]
+
+    with open(source, newline="") as handle:
+        if source.lower().endswith(".json"):
+            items = json.load(handle)
+        else:
+            items = list(csv.DictReader(handle))
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    for item in items:
+        if item.get("file"):
+            item["file"] = os.path.join(base_dir, item["file"])
+    return items
+
+
+def assign_slugs(items):
+    """
+    Gives every item a slug, unique within the manifest. Slugs only depend on the
+    order of the manifest, so they identify the same items when an import is rerun.
+
+    :param items: List of dicts
+    """
+    seen = set()
+    for item in items:
+        base = item.get("slug") or slugify(item["title"]) or "item"
+        slug, suffix = base, 1
+        while slug in seen:
+            suffix += 1
+            slug = "{}-{}".format(base, suffix)
+        seen.add(slug)
+        item["slug"] = slug
+
+
+class Command(BaseCommand):
+    """Creates library items under an index page from a directory or manifest."""
+
+    help = "Creates library items under an index page from a directory, CSV or JSON manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument("index", type=int, help="ID of the parent index page")
+        parser.add_argument("source", help="Directory of attachments, or CSV/JSON manifest")
+        parser.add_argument(
+            "--model", help="Item model as app_label.ModelName, needed if the index allows several"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Number of items created per transaction"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of attachments uploaded in parallel"
+        )
+        parser.add_argument(
+            "--draft", action="store_true", dest="draft", help="Create the items unpublished"
+        )
+
+    def get_model(self, parent, label):
+        """Returns the item model to create, checking it's a library detail model."""
+        if label:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError("Unknown model {}".format(label))
+        else:
+            models = [
+                model
+                for model in getattr(parent, "get_child_models", list)()
+                if issubclass(model, AbstractLibraryDetail)
+            ]
+            if len(models) != 1:
+                raise CommandError("Use --model to choose the model of the items")
+            model = models[0]
+
+        if not issubclass(model, AbstractLibraryDetail):
+            raise CommandError("{} isn't a library detail model".format(model.__name__))
+        return model
+
+    def build_page(self, model, item, live):
+        """
+        Returns an unsaved page for the item with its attachment uploaded to storage,
+        or None if the attachment can't be read.
+        """
+        fields = {key: value for key, value in item.items() if key not in ("title", "slug", "file")}
+        page = model(
+            title=item["title"],
+            slug=item["slug"],
+            live=live,
+            has_unpublished_changes=not live,
+            **fields,
+        )
+        # Bulk inserts skip save(), so the search vector is inserted with the page
+        page.search_vector = page.get_search_vector()
+        if item.get("file"):
+            try:
+                with open(item["file"], "rb") as handle:
+                    page.attachment = File(handle, name=os.path.basename(item["file"]))
+                    page.update_attachment_metadata()
+                    page.store_attachment_blob()
+                    if not page.attachment._committed:
+                        page.attachment.save(page.attachment.name, page.attachment.file, save=False)
+            except (IOError, OSError):
+                return None
+        return page
+
+    def handle(self, *args, **options):
+        try:
+            parent = Page.objects.get(pk=options["index"]).specific
+        except Page.DoesNotExist:
+            raise CommandError("Page {} does not exist".format(options["index"]))
+        model = self.get_model(parent, options["model"])
+
+        items = read_manifest(options["source"])
+        field_names = {field.name for field in model._meta.concrete_fields}
+        unknown = {key for item in items for key in item} - field_names - {"file"}
+        if unknown:
+            raise CommandError("Unknown fields: {}".format(", ".join(sorted(unknown))))
+        assign_slugs(items)
+
+        batch_size = options["batch_size"]
+        live = not options["draft"]
+        started = time.time()
+        imported = skipped = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for start in range(0, len(items), batch_size):
+                end = start + batch_size
+                batch = items[start:end]
+                # Items imported before an interrupted run are recognised by their slugs
+                existing = set(
+                    Page.objects.child_of(parent)
+                    .filter(slug__in=[item["slug"] for item in batch])
+                    .values_list("slug", flat=True)
+                )
+                batch = [item for item in batch if item["slug"] not in existing]
+                skipped += len(existing)
+
+                pages = []
+                build = partial(self.build_page, model, live=live)
+                for item, page in zip(batch, executor.map(build, batch)):
+                    if page is None:
+                        failed += 1
+                        self.stderr.write("Unable to read {}".format(item["file"]))
+                        continue
+                    pages.append(page)
+
+                bulk_create_children(parent, pages)
+                imported += len(pages)
+
+                elapsed = time.time() - started
+                self.stdout.write(
+                    "{} imported, {} skipped, {} failed ({:.1f} items/s)".format(
+                        imported, skipped, failed, (imported + failed) / max(elapsed, 0.001)
+                    )
+                )
+
+        self.stdout.write(
+            "Done: {} imported, {} skipped, {} failed".format(imported, skipped, failed)
+        )
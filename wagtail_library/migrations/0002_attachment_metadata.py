@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 08:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0001_initial")]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_extension",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_mime_type",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_size",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 08:56
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from wagtail_library.conf import get_setting
+
+
+# Builds the search vectors of existing live items in a single statement
+BACKFILL_SQL = """
+UPDATE wagtail_library_librarydetail AS detail
+SET search_vector =
+    setweight(to_tsvector(%s::regconfig, page.title), 'A')
+    || setweight(to_tsvector(%s::regconfig, regexp_replace(detail.body, '<[^>]+>', ' ', 'g')), 'B')
+FROM wagtailcore_page AS page
+WHERE page.id = detail.page_ptr_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0002_attachment_metadata")]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarydetail",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="librarydetail",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="wagtail_library_search_gin"
+            ),
+        ),
+        migrations.RunSQL(
+            [(BACKFILL_SQL, [get_setting("SEARCH_CONFIG")] * 2)], migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 08:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0003_search_vector")]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_text_sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
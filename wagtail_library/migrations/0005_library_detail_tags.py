@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 09:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import modelcluster.contrib.taggit
+import modelcluster.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("taggit", "0002_auto_20150616_2121"),
+        ("wagtail_library", "0004_attachment_text"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryDetailTag",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "content_object",
+                    modelcluster.fields.ParentalKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tagged_items",
+                        to="wagtail_library.LibraryDetail",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="wagtail_library_librarydetailtag_items",
+                        to="taggit.Tag",
+                    ),
+                ),
+            ],
+            options={"abstract": False},
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="tags",
+            field=modelcluster.contrib.taggit.ClusterTaggableManager(
+                blank=True,
+                help_text="A comma-separated list of tags.",
+                through="wagtail_library.LibraryDetailTag",
+                to="taggit.Tag",
+                verbose_name="Tags",
+            ),
+        ),
+    ]
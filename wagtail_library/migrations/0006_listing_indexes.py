@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Listings filter children by their parent's path (see wagtail_library.query.children_of)
+# and live status. Indexing the sort key after those lets PostgreSQL read the children of an
+# index in order, instead of sorting them all. The path gives a stable order.
+PARENT_PATH = "(SUBSTRING(path, 1, LENGTH(path) - 4))"
+
+LISTING_INDEXES = {
+    "wagtail_library_listing_path": "path",
+    "wagtail_library_listing_published": "first_published_at, path",
+    "wagtail_library_listing_title": "title, path",
+}
+
+
+def create_index(name, columns):
+    """Returns the operation creating a listing index without locking wagtailcore_page."""
+    return migrations.RunSQL(
+        "CREATE INDEX CONCURRENTLY {} ON wagtailcore_page ({}, live, {})".format(
+            name, PARENT_PATH, columns
+        ),
+        "DROP INDEX CONCURRENTLY IF EXISTS {}".format(name),
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Indexes can't be created concurrently inside a transaction
+    atomic = False
+
+    dependencies = [("wagtail_library", "0005_library_detail_tags")]
+
+    operations = [create_index(name, columns) for name, columns in sorted(LISTING_INDEXES.items())]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 09:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0006_listing_indexes")]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarydetail",
+            name="download_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        )
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 09:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0007_download_count")]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_preview",
+            field=models.FileField(blank=True, editable=False, upload_to="previews"),
+        ),
+        migrations.AddField(
+            model_name="librarydetail",
+            name="attachment_preview_sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
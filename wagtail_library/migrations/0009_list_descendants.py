@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 09:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0008_attachment_preview")]
+
+    operations = [
+        migrations.AddField(
+            model_name="libraryindex",
+            name="list_descendants",
+            field=models.BooleanField(
+                default=False,
+                help_text="List the items of every library index below this one, not only its own.",
+            ),
+        )
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Indexes listing their descendants filter pages by path prefix (see
+# wagtail_library.query.descendants_of). The unique index on the path can't answer LIKE
+# prefix conditions unless the database uses the C collation, this one always can.
+class Migration(migrations.Migration):
+
+    # Indexes can't be created concurrently inside a transaction
+    atomic = False
+
+    dependencies = [("wagtail_library", "0009_list_descendants")]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY wagtail_library_descendants "
+            "ON wagtailcore_page (path varchar_pattern_ops)",
+            "DROP INDEX CONCURRENTLY IF EXISTS wagtail_library_descendants",
+        )
+    ]
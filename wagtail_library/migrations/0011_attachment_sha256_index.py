@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-18 09:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("wagtail_library", "0010_descendants_index")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="librarydetail",
+            name="attachment_sha256",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        )
+    ]
@@ -3,10 +3,18 @@
 
 from __future__ import unicode_literals
 
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+from django.db.models.functions import ExtractYear
+from django.utils.translation import ugettext_lazy as _
+from modelcluster.contrib.taggit import ClusterTaggableManager
+from modelcluster.fields import ParentalKey
+from taggit.models import TaggedItemBase
 from wagtail.admin.edit_handlers import FieldPanel
 from wagtail.core.fields import RichTextField
 
 from wagtail_library import abstract_models
+from wagtail_library.facets import Facet
 
 
 class LibraryIndex(abstract_models.AbstractLibraryIndex):
@@ -15,14 +23,46 @@ class LibraryIndex(abstract_models.AbstractLibraryIndex):
     body = RichTextField()
 
     content_panels = abstract_models.AbstractLibraryIndex.content_panels + [FieldPanel("body")]
-    subpage_types = ["wagtail_library.LibraryDetail"]
+    # Indexes can be nested into sections, rolled up by indexes listing their descendants
+    subpage_types = ["wagtail_library.LibraryDetail", "wagtail_library.LibraryIndex"]
+    facets = [
+        Facet("year", ExtractYear("first_published_at"), label=_("Year"), ordering="-value"),
+        Facet("type", "attachment_extension", label=_("File type")),
+        Facet("tag", "tags__name", label=_("Tag"), many=True),
+    ]
+    # Each ordering has a matching index, see migration 0006_listing_indexes, except the
+    # download counts which are indexed on their own
+    sort_options = [
+        ("newest", _("Newest"), ["-first_published_at"]),
+        ("oldest", _("Oldest"), ["first_published_at"]),
+        ("title", _("Title"), ["title"]),
+        ("popular", _("Most downloaded"), ["-download_count"]),
+    ]
+
+
+class LibraryDetailTag(TaggedItemBase):
+    """Tag of a library item."""
+
+    content_object = ParentalKey(
+        "wagtail_library.LibraryDetail", on_delete=models.CASCADE, related_name="tagged_items"
+    )
 
 
 class LibraryDetail(abstract_models.AbstractLibraryDetail):
     """Library item detail page."""
 
     body = RichTextField()
+    tags = ClusterTaggableManager(through=LibraryDetailTag, blank=True)
 
-    content_panels = abstract_models.AbstractLibraryDetail.content_panels + [FieldPanel("body")]
+    content_panels = abstract_models.AbstractLibraryDetail.content_panels + [
+        FieldPanel("body"),
+        FieldPanel("tags"),
+    ]
     parent_page_types = ["wagtail_library.LibraryIndex"]
     subpage_types = []
+    search_vector_fields = [("title", "A"), ("body", "B"), ("attachment_text", "C")]
+
+    class Meta(object):
+        """Django model meta options."""
+
+        indexes = [GinIndex(fields=["search_vector"], name="wagtail_library_search_gin")]
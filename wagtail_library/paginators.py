@@ -0,0 +1,319 @@
+# -*- coding:utf8 -*-
+"""Paginators"""
+
+from __future__ import unicode_literals
+
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from wagtail_library.cache import get_cache, hash_queryset
+from wagtail_library.conf import get_setting
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that keeps the result of its COUNT query in the cache.
+
+    Counts are stored under `cache_prefix` plus a digest of the queryset SQL, so each
+    combination of filters gets its own entry. AbstractLibraryIndex passes a prefix that
+    includes the index generation, which is bumped whenever a child is published,
+    unpublished, moved or deleted.
+    """
+
+    # Use the database planner's row estimate instead of COUNT(*) for result sets at
+    # least this large. Only supported on PostgreSQL; None disables estimates.
+    estimate_threshold = None
+
+    def __init__(self, object_list, per_page, cache_prefix=None, cache_timeout=None, **kwargs):
+        """
+        :param object_list: Queryset or iterable to paginate
+        :param per_page: Number of items per page
+        :param cache_prefix: Cache key prefix; counts are not cached when None
+        :param cache_timeout: Seconds to cache counts for, defaults to the
+            WAGTAIL_LIBRARY_COUNT_CACHE_TIMEOUT setting
+        :param kwargs: Passed through to Django's paginator
+        """
+        super(CachedCountPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.cache_prefix = cache_prefix
+        if cache_timeout is None:
+            cache_timeout = get_setting("COUNT_CACHE_TIMEOUT")
+        self.cache_timeout = cache_timeout
+
+    @cached_property
+    def count(self):
+        """Return the total number of objects, from the cache where possible."""
+        if self.cache_prefix is None or not hasattr(self.object_list, "query"):
+            return self.get_count()
+
+        cache = get_cache()
+        key = "{}:{}".format(self.cache_prefix, hash_queryset(self.object_list))
+        count = cache.get(key)
+        if count is None:
+            count = self.get_count()
+            cache.set(key, count, self.cache_timeout)
+        return count
+
+    def get_count(self):
+        """
+        Count the objects, using the planner estimate for large result sets if enabled.
+
+        :return: Exact or estimated number of objects
+        """
+        if self.estimate_threshold is not None:
+            estimate = self.get_estimated_count()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super(CachedCountPaginator, self).count
+
+    def get_estimated_count(self):
+        """
+        Ask PostgreSQL's planner how many rows the queryset is expected to return.
+
+        :return: Estimated row count, or None if estimates aren't available
+        """
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) {}".format(sql), params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """
+    Cached count paginator that trusts PostgreSQL's row estimate for large listings.
+
+    The page count of a very large index is then approximate, but no longer requires a
+    full COUNT(*) over its children.
+    """
+
+    estimate_threshold = 10000
+
+
+class KeysetPage(Sequence):
+    """A single page of results returned by the KeysetPaginator."""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Keyset page of {} items>".format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(object):
+    """
+    Paginator that seeks to a position in the ordered queryset instead of using OFFSET.
+
+    Pages are addressed by opaque cursors rather than page numbers, so every page
+    costs the same regardless of how deep into the listing it is, and no COUNT query
+    is required. The queryset is ordered by `ordering` (defaulting to the queryset's
+    own ordering), with the primary key appended as a tie breaker when the last
+    ordering field is not unique. NULL values sort as PostgreSQL sorts them: after
+    every other value in ascending order.
+    """
+
+    cursor_based = True
+
+    def __init__(self, object_list, per_page, ordering=None):
+        """
+        :param object_list: Queryset to paginate
+        :param per_page: Number of items per page
+        :param ordering: Iterable of field names, optionally prefixed with "-"
+        """
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = self._get_ordering(ordering)
+
+    def _get_ordering(self, ordering):
+        """
+        Normalise the ordering into a tuple of (field name, descending) pairs.
+
+        :param ordering: Iterable of field names or None
+        :return: Tuple of (name, descending) tuples
+        """
+        query = self.object_list.query
+        if ordering is None:
+            ordering = query.order_by or self.object_list.model._meta.ordering or ()
+
+        normalised = []
+        for name in ordering:
+            descending = name.startswith("-")
+            normalised.append((name.lstrip("-"), descending))
+
+        if not normalised or not self._is_unique(normalised[-1][0]):
+            normalised.append(("pk", normalised[-1][1] if normalised else False))
+        return tuple(normalised)
+
+    def _get_field(self, name):
+        """Return the model field for the given name, or None for annotations."""
+        opts = self.object_list.model._meta
+        if name == "pk":
+            return opts.pk
+        try:
+            return opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def _get_output_field(self, name):
+        """Return the field converting cursor values for the given name, None if unknown."""
+        field = self._get_field(name)
+        if field is None and name in self.object_list.query.annotations:
+            field = self.object_list.query.annotations[name].output_field
+        return field
+
+    def _is_unique(self, name):
+        field = self._get_field(name)
+        return field is not None and field.unique
+
+    def _order_by(self, reverse=False):
+        """Return the order_by arguments, optionally reversed."""
+        return [
+            "{}{}".format("-" if descending != reverse else "", name)
+            for name, descending in self.ordering
+        ]
+
+    def _get_values(self, obj):
+        """Return the ordering key values of the given object."""
+        return [getattr(obj, name) for name, _ in self.ordering]
+
+    def encode_cursor(self, obj, forward):
+        """
+        Build an opaque cursor pointing just past (or just before) the given object.
+
+        :param obj: Model instance at the edge of a page
+        :param forward: True if the cursor points to the items after obj
+        :return: URL safe cursor string
+        """
+        payload = json.dumps([int(forward), self._get_values(obj)], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        Decode a cursor created by encode_cursor.
+
+        :param cursor: Cursor string
+        :return: Tuple of (forward, values)
+        :raises PageNotAnInteger: if the cursor is not valid
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            forward, raw_values = json.loads(base64.urlsafe_b64decode(padded).decode("utf-8"))
+            if len(raw_values) != len(self.ordering):
+                raise ValueError("Cursor does not match the ordering")
+            values = []
+            for (name, _), value in zip(self.ordering, raw_values):
+                field = self._get_output_field(name)
+                values.append(value if field is None or value is None else field.to_python(value))
+        except (
+            TypeError,
+            ValueError,
+            ValidationError,
+            binascii.Error,
+            UnicodeError,
+            AttributeError,
+        ):
+            raise PageNotAnInteger("That cursor is not valid")
+        return bool(forward), values
+
+    @staticmethod
+    def _beyond(name, greater, value):
+        """
+        Filter for rows whose value is strictly greater/less than value, NULLs being greatest.
+
+        :return: Q object or None if no row can match
+        """
+        if value is None:
+            return None if greater else Q(**{"{}__isnull".format(name): False})
+        if greater:
+            return Q(**{"{}__gt".format(name): value}) | Q(**{"{}__isnull".format(name): True})
+        return Q(**{"{}__lt".format(name): value})
+
+    def _seek_filter(self, values, forward):
+        """
+        Build the filter selecting every row after (or before) the given key values.
+
+        :param values: Ordering key values of the edge row
+        :param forward: True to select rows after the edge row
+        :return: Q object
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            beyond = self._beyond(name, forward != descending, value)
+            if beyond is not None:
+                condition |= equal & beyond
+            if value is None:
+                equal &= Q(**{"{}__isnull".format(name): True})
+            else:
+                equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the page of results identified by the cursor.
+
+        :param cursor: Cursor string; empty values (or 1) address the first page
+        :return: KeysetPage instance
+        :raises PageNotAnInteger: if the cursor is not valid
+        """
+        if cursor in (None, "", 1, "1"):
+            forward, values = True, None
+        else:
+            forward, values = self.decode_cursor(str(cursor))
+
+        queryset = self.object_list.order_by(*self._order_by(reverse=not forward))
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, forward))
+        items = list(queryset[: self.per_page + 1])
+
+        has_more = len(items) > self.per_page
+        items = items[: self.per_page]
+        if not forward:
+            items.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(items[-1], forward=True)
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(items[0], forward=False)
+        return KeysetPage(items, self, next_cursor, previous_cursor)
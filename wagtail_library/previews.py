@@ -0,0 +1,79 @@
+# -*- coding:utf8 -*-
+"""Attachment preview images"""
+
+from __future__ import unicode_literals
+
+import io
+import logging
+
+from PIL import Image
+
+from wagtail_library.conf import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+def open_image(data):
+    """Opens an image with Pillow."""
+    return Image.open(io.BytesIO(data))
+
+
+def open_pdf_first_page(data):
+    """Renders the first page of a PDF document, using pdf2image if it's installed."""
+    try:
+        from pdf2image import convert_from_bytes
+    except ImportError:
+        logger.debug("pdf2image isn't installed, PDF previews can't be rendered")
+        return None
+    pages = convert_from_bytes(data, first_page=1, last_page=1)
+    return pages[0] if pages else None
+
+
+# Preview renderers, keyed by MIME type. Each takes the file's bytes and returns a Pillow
+# image of its first page, or None.
+RENDERERS = {
+    "application/pdf": open_pdf_first_page,
+    "image/gif": open_image,
+    "image/jpeg": open_image,
+    "image/png": open_image,
+    "image/webp": open_image,
+}
+
+
+def can_render_preview(mime_type):
+    """
+    Whether previews can be rendered for files of the MIME type.
+
+    :param mime_type: MIME type of the file
+    :return: Boolean
+    """
+    return mime_type in RENDERERS
+
+
+def render_preview(data, mime_type, size=None):
+    """
+    Renders a JPEG preview of the first page of a document, fitting within a square of
+    size pixels. This only works on bytes, so it can run in another process.
+
+    :param data: Contents of the file
+    :param mime_type: MIME type of the file
+    :param size: Maximum width and height of the preview, defaults to PREVIEW_SIZE
+    :return: JPEG bytes, or None if the type isn't supported or the file can't be read
+    """
+    if size is None:
+        size = get_setting("PREVIEW_SIZE")
+    renderer = RENDERERS.get(mime_type)
+    if renderer is None:
+        return None
+    try:
+        image = renderer(data)
+        if image is None:
+            return None
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=85)
+    except Exception:
+        logger.warning("Unable to render a preview of a %s document", mime_type, exc_info=True)
+        return None
+    return output.getvalue()
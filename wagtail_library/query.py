@@ -0,0 +1,149 @@
+# -*- coding:utf8 -*-
+"""Queryset helpers"""
+
+from __future__ import unicode_literals
+
+import operator
+from collections import defaultdict
+from functools import reduce
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import CharField, Q
+from django.db.models.functions import Length, Substr
+from django.db.models.query import BaseIterable
+
+
+def _chunks(iterable, size):
+    """Yields lists of up to size items from the iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def existing_fields(model, fields):
+    """
+    Returns the names in fields that exist on the model, for only() on models that
+    may not have all of them.
+
+    :param model: Model class
+    :param fields: Iterable of field names
+    :return: List of field names
+    """
+    existing = []
+    for name in fields:
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        existing.append(name)
+    return existing
+
+
+def parent_path(steplen):
+    """
+    Returns an expression giving the path of a page's parent.
+
+    :param steplen: Length of each step of treebeard paths
+    :return: Expression
+    """
+    return Substr("path", 1, Length("path") - steplen, output_field=CharField())
+
+
+def children_of(queryset, page):
+    """
+    Filters the queryset to the children of the page by comparing their parent's path,
+    rather than by path prefix and depth like treebeard, so that indexes on the parent
+    path can also provide the listing's order.
+
+    :param queryset: Queryset of pages
+    :param page: Parent page
+    :return: Queryset
+    """
+    return queryset.annotate(parent_path=parent_path(page.steplen)).filter(parent_path=page.path)
+
+
+def descendants_of(queryset, paths, steplen):
+    """
+    Filters the queryset to the pages below any of the pages with the given paths, with
+    one path prefix condition each, so the whole listing is a single query.
+
+    :param queryset: Queryset of pages
+    :param paths: Treebeard paths of the ancestor pages
+    :param steplen: Length of each step of treebeard paths
+    :return: Queryset
+    """
+    conditions = [Q(path__startswith=path, depth__gt=len(path) // steplen) for path in paths]
+    if not conditions:
+        return queryset.none()
+    return queryset.filter(reduce(operator.or_, conditions))
+
+
+def specific_listing_iterator(queryset, fields=None, chunk_size=None):
+    """
+    Iterates the specific instances of the pages in a queryset, in its order, with one
+    query per content type (per chunk). Unlike Wagtail's specific(), the specific
+    instances can be restricted to the given fields, and annotations on the queryset
+    are copied onto them.
+
+    :param queryset: Queryset of generic pages
+    :param fields: Names of the fields to load, None loads every field
+    :param chunk_size: Number of pages to load at a time, None loads them all at once
+    """
+    annotations = list(queryset.query.annotation_select)
+    rows = queryset.values_list("pk", "content_type", *annotations)
+    if chunk_size:
+        rows = _chunks(rows.iterator(chunk_size=chunk_size), chunk_size)
+    else:
+        rows = [rows]
+
+    for chunk in rows:
+        pks_by_type = defaultdict(list)
+        for row in chunk:
+            pks_by_type[row[1]].append(row[0])
+
+        pages_by_type = {}
+        for content_type_id, pks in pks_by_type.items():
+            # Content types are cached by ID, so this will not run any queries.
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            pages = (model or queryset.model)._default_manager.filter(pk__in=pks)
+            if fields is not None:
+                pages = pages.only(*existing_fields(pages.model, fields))
+            pages_by_type[content_type_id] = {page.pk: page for page in pages}
+
+        for row in chunk:
+            page = pages_by_type[row[1]][row[0]]
+            for name, value in zip(annotations, row[2:]):
+                setattr(page, name, value)
+            yield page
+
+
+class SpecificListingIterable(BaseIterable):
+    """Iterable yielding specific pages, see specific_listing_iterator."""
+
+    fields = None
+
+    def __iter__(self):
+        chunk_size = self.chunk_size if self.chunked_fetch else None
+        return specific_listing_iterator(self.queryset, self.fields, chunk_size=chunk_size)
+
+
+def specific_listing(queryset, fields=None):
+    """
+    Returns a copy of the queryset that yields specific page instances.
+
+    :param queryset: Queryset of generic pages
+    :param fields: Names of the fields to load on the specific instances
+    :return: Queryset
+    """
+    clone = queryset._chain()
+    clone._iterable_class = SpecificListingIterable
+    if fields is not None:
+        clone._iterable_class = type(
+            str("SpecificListingIterable"), (SpecificListingIterable,), {"fields": tuple(fields)}
+        )
+    return clone
@@ -0,0 +1,79 @@
+# -*- coding:utf8 -*-
+"""Signal handlers keeping cached listing data up to date."""
+
+from __future__ import unicode_literals
+
+from django.db.models.signals import post_delete, post_save
+from wagtail.core.models import Page
+from wagtail.core.signals import page_published, page_unpublished
+
+from wagtail_library.abstract_models import AbstractLibraryDetail
+from wagtail_library.blobs import delete_unreferenced_on_commit, is_blob_name
+from wagtail_library.cache import bump_generation, get_ancestor_paths
+from wagtail_library.sitemaps import get_sitemap_keys
+from wagtail_library.tasks import (
+    extract_attachment_text,
+    generate_attachment_preview,
+    run_in_background,
+)
+
+
+def get_affected_paths(page):
+    """
+    Returns the tree paths whose cached listings are affected by a change to the page:
+    the page itself, its parent and its other ancestors, which may list their descendants.
+
+    :param page: Page instance
+    :return: List of treebeard paths
+    """
+    return get_ancestor_paths(page.path, page.steplen)
+
+
+def invalidate_page(instance, **kwargs):
+    """Bump the generations affected by a published, unpublished or deleted page."""
+    if isinstance(instance, Page) and instance.path:
+        bump_generation(*get_sitemap_keys(instance.pk) + get_affected_paths(instance))
+
+
+def invalidate_created_page(instance, created, raw=False, **kwargs):
+    """Bump the generations affected by a newly created page."""
+    if created and not raw:
+        invalidate_page(instance)
+
+
+def extract_published_attachment_text(instance, **kwargs):
+    """Extracts the text of a newly published attachment in the background."""
+    if isinstance(instance, AbstractLibraryDetail) and instance.attachment_text_outdated():
+        run_in_background(extract_attachment_text, instance._meta.label, instance.pk)
+
+
+def generate_published_attachment_preview(instance, **kwargs):
+    """Renders a preview of a newly published attachment in the background."""
+    if isinstance(instance, AbstractLibraryDetail) and instance.attachment_preview_outdated():
+        run_in_background(generate_attachment_preview, instance._meta.label, instance.pk)
+
+
+def delete_unreferenced_blob(instance, **kwargs):
+    """
+    Deletes the content-addressed attachment of a deleted library item once the deletion
+    is committed, unless other items or their pending revisions still reference it.
+    """
+    if isinstance(instance, AbstractLibraryDetail) and is_blob_name(instance.attachment.name):
+        delete_unreferenced_on_commit(
+            instance.attachment.storage, instance.attachment.name, instance.attachment_sha256
+        )
+
+
+def register_signal_handlers():
+    """Connects the signal handlers, called when the app is ready."""
+    page_published.connect(invalidate_page, dispatch_uid="wagtail_library_page_published")
+    page_published.connect(
+        extract_published_attachment_text, dispatch_uid="wagtail_library_extract_text"
+    )
+    page_published.connect(
+        generate_published_attachment_preview, dispatch_uid="wagtail_library_generate_preview"
+    )
+    page_unpublished.connect(invalidate_page, dispatch_uid="wagtail_library_page_unpublished")
+    post_save.connect(invalidate_created_page, dispatch_uid="wagtail_library_page_created")
+    post_delete.connect(invalidate_page, dispatch_uid="wagtail_library_page_deleted")
+    post_delete.connect(delete_unreferenced_blob, dispatch_uid="wagtail_library_blob_deleted")
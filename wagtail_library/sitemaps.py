@@ -0,0 +1,199 @@
+# -*- coding:utf8 -*-
+"""Sitemaps of library pages"""
+
+from __future__ import unicode_literals
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.utils.functional import cached_property
+from wagtail.contrib.sitemaps import Sitemap
+from wagtail.core.models import Page
+
+from wagtail_library.cache import get_cache, get_generation, make_key
+from wagtail_library.conf import get_setting
+from wagtail_library.utils import get_detail_models, get_index_models
+
+
+# Generation key of the numbers of the sitemap chunks listing at least one page
+SITEMAP_CHUNKS_KEY = "sitemap:chunks"
+
+
+def get_sitemap_chunk(pk):
+    """
+    Returns the number of the sitemap chunk listing the page with the given ID.
+
+    :param pk: Page ID
+    :return: Chunk number, starting from 1
+    """
+    return pk // get_setting("SITEMAP_CHUNK_SIZE") + 1
+
+
+def get_sitemap_chunk_key(pk):
+    """
+    Returns the generation key of the sitemap chunk listing the page with the given ID,
+    to bump when the page is published, unpublished, moved or deleted.
+
+    :param pk: Page ID
+    :return: Generation key
+    """
+    return "sitemap:{}:{}".format(get_setting("SITEMAP_CHUNK_SIZE"), get_sitemap_chunk(pk))
+
+
+def get_sitemap_keys(pk):
+    """
+    Returns the generation keys to bump when the page with the given ID is published,
+    unpublished, moved or deleted: those of its sitemap chunk and of the chunk numbers.
+
+    :param pk: Page ID
+    :return: List of generation keys
+    """
+    return [get_sitemap_chunk_key(pk), SITEMAP_CHUNKS_KEY]
+
+
+class ChunkPaginator(Paginator):
+    """
+    Numbers the chunks of a LibrarySitemap listing at least one page, so the sitemap index
+    doesn't link to empty ones: sitemap page n lists the nth of them.
+    """
+
+    def __init__(self, chunk_numbers):
+        """
+        :param chunk_numbers: Ordered numbers of the chunks listing at least one page
+        """
+        super(ChunkPaginator, self).__init__(chunk_numbers, 1)
+
+    def get_chunk_number(self, page):
+        """
+        Returns the number of the chunk listed by a sitemap page.
+
+        :param page: Sitemap page number, as given in the querystring
+        :return: Chunk number, or None if no chunk lists a page
+        """
+        number = self.validate_number(page)
+        return self.object_list[number - 1] if self.object_list else None
+
+
+class LibrarySitemap(Sitemap):
+    """
+    Sitemap of the library index and detail pages of the site, split into chunks of
+    fixed ranges of page IDs, each read with a single range scan. Chunks without any
+    library page of the site are left out.
+
+    Chunk boundaries never move as pages are added, so each chunk is cached until a page
+    in its range is published, unpublished, moved or deleted.
+    """
+
+    # Seconds to cache chunks for, which also catches URL changes of ancestor pages
+    cache_timeout = 24 * 60 * 60
+
+    def get_page_models(self):
+        """
+        Returns the page models listed in the sitemap.
+
+        :return: List of page models
+        """
+        return get_index_models() + get_detail_models()
+
+    def items(self):
+        """
+        Returns the live, public library pages of the site, with the fields needed for
+        their sitemap entries.
+
+        :return: Queryset of pages
+        """
+        content_types = ContentType.objects.get_for_models(*self.get_page_models()).values()
+        return (
+            Page.objects.live()
+            .public()
+            .descendant_of(self.get_wagtail_site().root_page, inclusive=True)
+            .filter(content_type__in=content_types)
+            .only("url_path", "last_published_at", "latest_revision_created_at")
+        )
+
+    def get_chunk_numbers(self):
+        """
+        Returns the numbers of the chunks listing at least one page, read with a single
+        query and cached until a library page is published, unpublished, moved or deleted.
+
+        :return: Ordered list of chunk numbers
+        """
+        chunk_size = get_setting("SITEMAP_CHUNK_SIZE")
+        cache = get_cache()
+        key = make_key(
+            "sitemap-chunks",
+            self.get_wagtail_site().pk,
+            chunk_size,
+            get_generation(SITEMAP_CHUNKS_KEY),
+        )
+        numbers = cache.get(key)
+        if numbers is None:
+            numbers = list(
+                self.items()
+                .annotate(chunk=F("pk") / chunk_size + 1)
+                .order_by("chunk")
+                .values_list("chunk", flat=True)
+                .distinct()
+            )
+            cache.set(key, numbers, self.cache_timeout)
+        return numbers
+
+    @cached_property
+    def paginator(self):
+        """Returns the paginator numbering the chunks."""
+        return ChunkPaginator(self.get_chunk_numbers())
+
+    def get_chunk(self, number):
+        """
+        Returns the sitemap entries of a chunk, ordered by page ID.
+
+        :param number: Chunk number
+        :return: List of dicts with location and lastmod keys
+        """
+        chunk_size = get_setting("SITEMAP_CHUNK_SIZE")
+        first = (number - 1) * chunk_size
+        pages = self.items().filter(pk__gte=first, pk__lt=first + chunk_size).order_by("pk")
+        return [
+            {
+                "location": page.get_full_url(self.request),
+                "lastmod": self.lastmod(page),
+                "changefreq": None,
+                "priority": "",
+            }
+            for page in pages
+        ]
+
+    def get_chunk_cache_key(self, number):
+        """
+        Returns the cache key of a chunk's entries, which includes the chunk's generation.
+
+        :param number: Chunk number
+        :return: Cache key
+        """
+        chunk_size = get_setting("SITEMAP_CHUNK_SIZE")
+        generation = get_generation(get_sitemap_chunk_key((number - 1) * chunk_size))
+        return make_key("sitemap", self.get_wagtail_site().pk, chunk_size, number, generation)
+
+    def _urls(self, page, protocol, domain):
+        """
+        Returns the entries of a chunk, from the cache where possible.
+
+        :param page: Sitemap page number, as given in the querystring
+        :param protocol: Unused, locations come from Wagtail's site root paths
+        :param domain: Unused, locations come from Wagtail's site root paths
+        :return: List of dicts
+        """
+        number = self.paginator.get_chunk_number(page)
+        if number is None:
+            return []
+        cache = get_cache()
+        key = self.get_chunk_cache_key(number)
+        urls = cache.get(key)
+        if urls is None:
+            urls = self.get_chunk(number)
+            cache.set(key, urls, self.cache_timeout)
+
+        lastmods = [url["lastmod"] for url in urls]
+        if lastmods and None not in lastmods:
+            self.latest_lastmod = max(lastmods)
+        return urls
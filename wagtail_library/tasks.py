@@ -0,0 +1,180 @@
+# -*- coding:utf8 -*-
+"""Background tasks"""
+
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from wagtail.core.models import Page
+
+from wagtail_library.bulk import run_in_batches
+from wagtail_library.conf import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the executor running background tasks in this process, creating it once."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting("BACKGROUND_WORKERS"))
+        return _executor
+
+
+def get_pool():
+    """
+    Returns the pool of processes running background tasks for this process, creating it
+    once. Workers are spawned rather than forked, so they don't share the database
+    connections or locks of the web process, and set Django up from DJANGO_SETTINGS_MODULE
+    before unpickling tasks. Spawning runs sys.executable, which embedded servers like
+    uWSGI and mod_wsgi may not point at a Python interpreter.
+
+    :return: multiprocessing.Pool instance
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("spawn")
+            _pool = context.Pool(get_setting("BACKGROUND_WORKERS"), initializer=django.setup)
+            atexit.register(close_pool)
+        return _pool
+
+
+def close_pool():
+    """Waits for the background tasks queued in this process to finish, e.g. before it exits."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def _run_in_background(task, *args):
+    """Runs the task, logging any error and releasing the worker's database connection."""
+    try:
+        task(*args)
+    except Exception:
+        logger.exception("Background task %s failed", task.__name__)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(task, *args):
+    """
+    Runs the task outside of the current request once the transaction commits.
+
+    Tasks run in a thread pool of the web process by default. Set
+    WAGTAIL_LIBRARY_TASK_RUNNER to the dotted path of a callable taking the task and
+    its arguments to hand them to a task queue or run_in_process_pool instead; arguments
+    are kept picklable.
+
+    :param task: Module level function
+    :param args: Positional arguments for the task
+    """
+    runner = get_setting("TASK_RUNNER")
+    if runner is not None:
+        transaction.on_commit(lambda: import_string(runner)(task, *args))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_background, task, *args))
+
+
+def run_in_process_pool(task, *args):
+    """
+    Task runner running tasks in a pool of worker processes started by the web process, so
+    CPU bound text extraction and preview rendering don't hold the GIL of the threads
+    serving requests. Each web process starts its own workers, and tasks still queued when
+    it is killed or recycled are lost; a task queue is more robust in production.
+
+    :param task: Module level function
+    :param args: Picklable positional arguments for the task
+    """
+    get_pool().apply_async(_run_in_background, (task,) + args)
+
+
+def extract_attachment_text(model_label, pk):
+    """
+    Extracts the text of a library item's attachment and updates its search vector.
+
+    :param model_label: Label of the page model, e.g. "wagtail_library.LibraryDetail"
+    :param pk: Primary key of the page
+    """
+    model = apps.get_model(model_label)
+    try:
+        page = model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        return
+    if page.attachment_text_outdated():
+        page.update_attachment_text()
+
+
+def generate_attachment_preview(model_label, pk):
+    """
+    Stores a preview image of a library item's attachment.
+
+    :param model_label: Label of the page model, e.g. "wagtail_library.LibraryDetail"
+    :param pk: Primary key of the page
+    """
+    model = apps.get_model(model_label)
+    try:
+        page = model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        return
+    if page.attachment_preview_outdated():
+        page.update_attachment_preview()
+
+
+def apply_bulk_action(action, index_id, user_id, query="", ids=None, target_id=None):
+    """
+    Applies a bulk operation to the children of a library index in batches, skipping the
+    pages the user isn't allowed to change, and logs the outcome.
+
+    :param action: Name of the operation in wagtail_library.bulk.BULK_OPERATIONS
+    :param index_id: ID of the index
+    :param user_id: ID of the user applying the operation
+    :param query: Querystring of the listing filters selecting the children
+    :param ids: IDs of the selected children, None selects every match
+    :param target_id: ID of the page to move the children to
+    """
+    try:
+        index = Page.objects.get(pk=index_id).specific
+        user = get_user_model()._default_manager.get(pk=user_id)
+        kwargs = {}
+        if target_id is not None:
+            kwargs["target"] = Page.objects.get(pk=target_id).specific
+    except ObjectDoesNotExist:
+        return
+
+    processed = changed = denied = 0
+    children = index.get_bulk_children(query, ids=ids)
+    for batch_size, batch_changed, batch_denied in run_in_batches(
+        action, children, user=user, **kwargs
+    ):
+        processed += batch_size
+        changed += batch_changed
+        denied += batch_denied
+    logger.info(
+        "Bulk %s of %s: %d of %d items changed, %d not permitted",
+        action,
+        index,
+        changed,
+        processed,
+        denied,
+    )
@@ -0,0 +1,28 @@
+# -*- coding:utf8 -*-
+"""Utilities"""
+
+from __future__ import unicode_literals
+
+from django.apps import apps
+
+
+def get_detail_models():
+    """
+    Returns every concrete library detail model.
+
+    :return: List of AbstractLibraryDetail subclasses
+    """
+    from wagtail_library.abstract_models import AbstractLibraryDetail
+
+    return [model for model in apps.get_models() if issubclass(model, AbstractLibraryDetail)]
+
+
+def get_index_models():
+    """
+    Returns every concrete library index model.
+
+    :return: List of AbstractLibraryIndex subclasses
+    """
+    from wagtail_library.abstract_models import AbstractLibraryIndex
+
+    return [model for model in apps.get_models() if issubclass(model, AbstractLibraryIndex)]
@@ -0,0 +1,218 @@
+# -*- coding:utf8 -*-
+"""wagtail_library views"""
+
+from __future__ import unicode_literals
+
+import mimetypes
+import os
+import re
+from calendar import timegm
+from urllib.parse import quote
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.cache import get_conditional_response
+
+from wagtail_library.conf import get_setting
+
+
+RANGE_RE = re.compile(r"^\s*bytes=(\d*)-(\d*)\s*$")
+
+COMPRESSED_CONTENT_TYPES = {
+    "bzip2": "application/x-bzip",
+    "gzip": "application/gzip",
+    "xz": "application/x-xz",
+}
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a requested byte range lies outside the file."""
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range from a Range header.
+
+    Multiple ranges and malformed headers are ignored (None is returned), in which
+    case the whole file should be served.
+
+    :param header: Value of the Range header
+    :param size: Size of the file in bytes
+    :return: Tuple of (first byte, last byte) or None
+    :raises RangeNotSatisfiable: if the range lies outside the file
+    """
+    match = RANGE_RE.match(header or "")
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if not suffix or not size:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+
+    first = int(first)
+    last = int(last) if last else size - 1
+    if first >= size:
+        raise RangeNotSatisfiable
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def content_disposition(filename):
+    """
+    Builds an attachment Content-Disposition header value for the filename.
+
+    :param filename: Name to suggest to the client
+    :return: Header value
+    """
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        return "attachment; filename*=UTF-8''{}".format(quote(filename))
+    return 'attachment; filename="{}"'.format(filename.replace('"', ""))
+
+
+def is_cacheable_request(request):
+    """
+    Whether the response to the request may be shared with other visitors.
+    Only anonymous GET and HEAD requests outside of preview are cacheable.
+
+    :param request: HttpRequest instance
+    :return: Boolean
+    """
+    if request.method not in ("GET", "HEAD") or getattr(request, "is_preview", False):
+        return False
+    user = getattr(request, "user", None)
+    return user is None or not user.is_authenticated
+
+
+def serve_conditionally(request, serve, etag=None, last_modified=None):
+    """
+    Answers conditional requests with 304 Not Modified before serving the page, and adds
+    the validators to successful responses.
+
+    :param request: HttpRequest instance
+    :param serve: Callable returning the response, only called if the page changed
+    :param etag: Entity tag of the page, unquoted
+    :param last_modified: Modification datetime of the page
+    :return: HttpResponse instance
+    """
+    if etag is not None:
+        etag = quote_etag(etag)
+    if last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    response = serve()
+    if response.status_code == 200:
+        if etag is not None:
+            response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _read_range(field_file, first, length, chunk_size):
+    """Yields length bytes of the file starting at first, chunk_size bytes at a time."""
+    try:
+        field_file.open("rb")
+        field_file.seek(first)
+        remaining = length
+        while remaining > 0:
+            data = field_file.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        field_file.close()
+
+
+def _range_allowed(request, etag, last_modified):
+    """Checks the If-Range precondition, which must match the current validators."""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if etag is not None and if_range == etag:
+        return True
+    return last_modified is not None and parse_http_date_safe(if_range) == last_modified
+
+
+def serve_attachment(request, field_file, size=None, etag=None, last_modified=None, filename=None):
+    """
+    Serves a stored file as a download.
+
+    Conditional requests are answered with 304 Not Modified, single byte ranges with
+    206 Partial Content. The transfer can be handed off to the front-end server by setting
+    WAGTAIL_LIBRARY_SENDFILE_BACKEND to "x-accel-redirect" (nginx) or "x-sendfile"
+    (Apache, lighttpd); otherwise the file is streamed in chunks.
+
+    :param request: HttpRequest instance
+    :param field_file: FieldFile to serve
+    :param size: Size of the file in bytes, read from the storage if not given
+    :param etag: Entity tag of the file, unquoted
+    :param last_modified: Modification datetime of the file
+    :param filename: Name suggested to the client, defaults to the stored name
+    :return: HttpResponse instance
+    """
+    if etag is not None:
+        etag = quote_etag(etag)
+    if last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    filename = filename or os.path.basename(field_file.name)
+    content_type, encoding = mimetypes.guess_type(filename)
+    # Compressed files are downloaded as they are, not decoded by the client
+    content_type = COMPRESSED_CONTENT_TYPES.get(encoding, content_type)
+    content_type = content_type or "application/octet-stream"
+    backend = get_setting("SENDFILE_BACKEND")
+
+    if backend == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        url = get_setting("SENDFILE_URL_PREFIX") + quote(field_file.name)
+        response["X-Accel-Redirect"] = url
+    elif backend == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = field_file.path
+    else:
+        if size is None:
+            size = field_file.size
+        try:
+            byte_range = None
+            if _range_allowed(request, etag, last_modified):
+                byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */{}".format(size)
+            return response
+
+        first, last = byte_range or (0, size - 1)
+        length = last - first + 1 if size else 0
+        if request.method == "HEAD":
+            response = HttpResponse(content_type=content_type)
+        else:
+            chunks = _read_range(field_file, first, length, get_setting("DOWNLOAD_CHUNK_SIZE"))
+            response = StreamingHttpResponse(chunks, content_type=content_type)
+        if byte_range is not None:
+            response.status_code = 206
+            response["Content-Range"] = "bytes {}-{}/{}".format(first, last, size)
+        response["Content-Length"] = str(length)
+        response["Accept-Ranges"] = "bytes"
+
+    response["Content-Disposition"] = content_disposition(filename)
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
@@ -0,0 +1,37 @@
+# -*- coding:utf8 -*-
+"""Wagtail admin hooks"""
+
+from __future__ import unicode_literals
+
+from django.conf.urls import url
+from django.urls import reverse
+from django.utils.translation import ugettext_lazy as _
+from wagtail.admin import widgets
+from wagtail.core import hooks
+
+from wagtail_library import admin_views
+from wagtail_library.abstract_models import AbstractLibraryIndex
+
+
+@hooks.register("register_admin_urls")
+def register_admin_urls():
+    """Adds the bulk actions view to the admin."""
+    return [
+        url(
+            r"^wagtail_library/(?P<index_id>\d+)/bulk/$",
+            admin_views.bulk_actions,
+            name="wagtail_library_bulk_actions",
+        )
+    ]
+
+
+@hooks.register("register_page_listing_more_buttons")
+def page_listing_more_buttons(page, page_perms, is_parent=False):
+    """Links library indexes to their bulk actions."""
+    if issubclass(page.specific_class, AbstractLibraryIndex) and page_perms.can_publish_subpage():
+        yield widgets.Button(
+            _("Bulk actions"),
+            reverse("wagtail_library_bulk_actions", args=[page.pk]),
+            attrs={"title": _("Publish, unpublish or move items in bulk")},
+            priority=60,
+        )